@@ -1,213 +1,70 @@
-from lexico import lexic
+from etac_ir import (ADD, COPY, DECL, FUNCTION_OPCODES, GOTO, IF_FALSE, IF_TRUE, IN, LABEL, LOW, NO_OPERAND, NOT, OUT,
+                     EtacIR, render)
+from ll1 import load_table, stream_interner
+from symbol_table import SymbolTable
+from syntax_tree import Visitor, build_tree
+from token_store import Interner, MappedTokenStream, decode_error
 import sys
 
-# Get the contents of the file
-def read_file(filepath):
+# Map the file for streaming, its tokens are scanned while parsing
+def open_file(filepath):
     try:
-        with open(filepath, 'r') as file:
-            return file.readlines()
+        return MappedTokenStream(filepath)
     except FileNotFoundError:
         return None
 
-# Define the parsing table (from the previous step)
-parsing_table = {
-    'program_start': {
-        'start': ['start', 'char_esq', 'code', 'end', 'ponto-virgula', 'char_dir']
-    },
-
-    'code': {
-        'int': ['stmt', 'code'],
-        'float': ['stmt', 'code'],
-        'bool': ['stmt', 'code'],
-        'id': ['stmt', 'code'],
-        'if': ['stmt', 'code'],
-        'while': ['stmt', 'code'],
-        'for': ['stmt', 'code'],
-        'in': ['stmt', 'code'],
-        'out': ['stmt', 'code'],
-        'end': ['vazio'],
-        'char_dir': ['char_dir'],
-        'else': ['stmt', 'code']
-    },
-
-    'stmt': {
-        'int': ['declaration'],
-        'float': ['declaration'],
-        'bool': ['declaration'],
-        'id': ['command'],
-        'if': ['command'],
-        'else': ['command'],
-        'while': ['command'],
-        'for': ['command'],
-        'in': ['command'],
-        'out': ['command']
-    },
-
-    'declaration': {
-        'int': ['type', 'variable'],
-        'float': ['type', 'variable'],
-        'bool': ['type', 'variable']
-    },
-
-    'type': {
-        'int': ['int'],
-        'float': ['float'],
-        'bool': ['bool']
-    },
-
-    'variable': {
-        'id': ['identifier', 'ponto-virgula']
-    },
-
-    'command': {
-        'id': ['identifier_command'],
-        'if': ['control_command'],
-        'while': ['control_command'],
-        'for': ['control_command'],
-        'in': ['io_command', 'ponto-virgula'],
-        'out': ['io_command', 'ponto-virgula'],
-        'else': ['control_command']
-    },
-
-    'identifier_command': {
-        'id': ['identifier', 'associacao', 'expression', 'ponto-virgula']
-    },
-
-    'control_command': {
-        'if': ['if', 'par_esq', 'identifier', 'par_dir', 'char_esq', 'code'],
-        'while': ['while', 'par_esq', 'identifier', 'par_dir', 'char_esq', 'code'],
-        'for': ['for', 'par_esq', 'identifier', 'par_dir', 'char_esq', 'code'],
-        'else': ['else', 'char_esq', 'code']
-    },
-
-    'function': {
-        'high': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'low': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'equal': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'add': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'sub': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'div': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'mul': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'and': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'or': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'not': ['function_name', 'par_esq', 'argument_list', 'par_dir']
-    },
-
-    'argument_list': {
-        'num_int': ['expression', 'argument_tail'],
-        'num_float': ['expression', 'argument_tail'],
-        'nim_sin_int': ['expression', 'argument_tail'],
-        'nim_sin_float': ['expression', 'argument_tail'],
-        'true': ['expression', 'argument_tail'],
-        'false': ['expression', 'argument_tail'],
-        'id': ['expression', 'argument_tail'],
-        'high': ['expression', 'argument_tail'],
-        'low': ['expression', 'argument_tail'],
-        'equal': ['expression', 'argument_tail'],
-        'add': ['expression', 'argument_tail'],
-        'sub': ['expression', 'argument_tail'],
-        'div': ['expression', 'argument_tail'],
-        'mul': ['expression', 'argument_tail'],
-        'and': ['expression', 'argument_tail'],
-        'or': ['expression', 'argument_tail'],
-        'not': ['expression', 'argument_tail']
-    },
-
-    'argument_tail': {
-        'virgula': ['virgula', 'argument_list'],
-        'par_dir': ['vazio']
-    },
-
-    'expression': {
-        'num_int': ['num_int'],
-        'num_float': ['num_float'],
-        'nim_sin_int': ['nim_sin_int'],
-        'nim_sin_float': ['nim_sin_float'],
-        'true': ['true'],
-        'false': ['false'],
-        'id': ['identifier'],
-        'high': ['function'],
-        'low': ['function'],
-        'equal': ['function'],
-        'add': ['function'],
-        'sub': ['function'],
-        'div': ['function'],
-        'mul': ['function'],
-        'and': ['function'],
-        'or': ['function'],
-        'not': ['function']
-    },
-
-    'identifier': {
-        'id': ['id']
-    },
-
-    'function_name': {
-        'high': ['high'],
-        'low': ['low'],
-        'equal': ['equal'],
-        'add': ['add'],
-        'sub': ['sub'],
-        'div': ['div'],
-        'mul': ['mul'],
-        'and': ['and'],
-        'or': ['or'],
-        'not': ['not']
-    },
-
-    'io_command': {
-        'in': ['in', 'par_esq', 'identifier', 'par_dir'],
-        'out': ['out', 'par_esq', 'identifier', 'par_dir']
-    }
-}
+# LL(1) table generated from gramatica.txt, loaded from its compiled artifact
+table = load_table()
+parsing_table = table.parsing_table
 
-class SemanticAnalyzer:
+class SemanticAnalyzer(Visitor):
     FUNCTION_ARG_COUNTS = {
         'ADD': 2, 'SUB': 2, 'MUL': 2, 'DIV': 2,
         'AND': 2, 'OR': 2, 'NOT': 1,
         'HIGH': 2, 'LOW': 2, 'EQUAL': 2
     }
 
-    def __init__(self):
-        self.scope_stack = [{}]
-        self.current_decl_type = None
+    def __init__(self, interner=None):
+        self.interner = interner if interner is not None else Interner()
+        self.symbols = SymbolTable()        # Interned symbol ids to types, by scope
         self.type_stack = []  # (type, is_variable, value)
-        self.function_stack = []
-        self.assignment_target = None
-        self.in_assignment = False
-        self.control_stack = []
-        self.in_loop_init = False
-        self.etac_code = []
-        self.temp_counter = 0
+        self.control_stack = []             # Structures the current statement is in
+        self.last_if = None                 # Flag of the unpaired IF of the current block
+        self.open_if = None                 # Flag of the last IF, until an ELSE follows
+        self.ir = EtacIR(self.interner)
+
+    # ETAC text of the code generated so far
+    @property
+    def etac_code(self):
+        return render(self.ir)
 
     # Helper methods
     def new_temp(self):
-        temp = f"t{self.temp_counter}"
-        self.temp_counter += 1
-        return temp
+        return self.ir.temp()
 
     # Scope management
     def enter_scope(self):
-        self.scope_stack.append({})
+        self.symbols.enter_scope()
 
     def exit_scope(self):
-        if len(self.scope_stack) > 1:
-            self.scope_stack.pop()
+        self.symbols.exit_scope()
 
     # Variable declaration/checking
-    def declare_variable(self, name, var_type):
-        if name in self.scope_stack[-1]:
-            raise Exception(f"Variable '{name}' already declared")
-        self.scope_stack[-1][name] = var_type
+    def declare_variable(self, symbol, var_type):
+        if self.symbols.declared_here(symbol):
+            raise Exception(f"Variable '{self.interner.names[symbol]}' already declared")
+        # Each declaration has its own operand, uses find it in the table
+        variable = self.ir.declare_variable(symbol)
+        self.symbols.declare(symbol, var_type, variable)
         # Generate ETAC declaration
         default_values = {'int': '0', 'float': '0.0', 'bool': 'false'}
-        self.etac_code.append(f"{name}: {var_type} = {default_values[var_type]}")
+        self.ir.emit(DECL, var_type, variable, self.ir.constant(default_values[var_type]))
 
-    def get_variable_type(self, name):
-        for scope in reversed(self.scope_stack):
-            if name in scope:
-                return scope[name]
-        raise Exception(f"Undefined variable '{name}'")
+    def get_variable_type(self, symbol):
+        entry = self.symbols.find(symbol)
+        if entry is not None:
+            return entry[1]
+        raise Exception(f"Undefined variable '{self.interner.names[symbol]}'")
 
     # Type checking
     def check_conversion(self, target_type, source_type):
@@ -223,19 +80,6 @@ class SemanticAnalyzer:
 
     # Function handling
     def handle_function_call(self, function_name):
-        function_operators = {
-            'ADD': '+',
-            'SUB': '-',
-            'MUL': '*',
-            'DIV': '/',
-            'LOW': '<',
-            'HIGH': '>',
-            'EQUAL': '==',
-            'AND': 'and',
-            'OR': 'or',
-            'NOT': 'not' 
-        }
-        
         expected_args = self.FUNCTION_ARG_COUNTS.get(function_name, 0)
         args = []
         
@@ -273,29 +117,17 @@ class SemanticAnalyzer:
 
         # Generate ETAC code with special NOT handling
         temp_var = self.new_temp()
-        
-        if function_name in function_operators:
-            operator = function_operators[function_name]
-            arg_values = [arg[2] for arg in args]
-            
-            if function_name == 'NOT':
-                # Unary operator formatting
-                self.etac_code.append(f"{temp_var}: bool = {operator} {arg_values[0]}")
-            else:
-                # Binary operator formatting
-                if len(arg_values) == 2:
-                    
-                    if return_type == 'bool':
-                        self.etac_code.append(f"{temp_var}: bool = {arg_values[0]} {operator} {arg_values[1]}")
-                    elif return_type == 'float':
-                        self.etac_code.append(f"{temp_var}: f64 = {arg_values[0]} {operator} {arg_values[1]}")
-                    elif return_type == 'int':
-                        self.etac_code.append(f"{temp_var}: i32 = {arg_values[0]} {operator} {arg_values[1]}")
-                else:
-                    raise Exception(f"Invalid arguments for {function_name}")
+        op = FUNCTION_OPCODES[function_name]
+        arg_values = [arg[2] for arg in args]
+
+        if op == NOT:
+            # Unary operator
+            self.ir.emit(NOT, return_type, temp_var, arg_values[0])
+        elif len(arg_values) == 2:
+            # Binary operator
+            self.ir.emit(op, return_type, temp_var, arg_values[0], arg_values[1])
         else:
-            args_str = ', '.join([arg[2] for arg in args])
-            self.etac_code.append(f"{temp_var} = {function_name}({args_str})")
+            raise Exception(f"Invalid arguments for {function_name}")
 
         self.type_stack.append((return_type, False, temp_var))
 
@@ -307,114 +139,156 @@ class SemanticAnalyzer:
         if struct_type == 'for' and var_type != 'int':
             raise Exception(f"FOR loop variable must be int, got {var_type}")
 
-# Define non-terminals
-non_terminals = set(parsing_table.keys())
-
-# Input tokens
-file_path = sys.argv[1]
-code = read_file(file_path)
-input_tokens = lexic(code)
-
-# Extract the terminals from the input tokens
-input_terminals = [token[1] for token in input_tokens] + ["$"]  # Add end marker
-
-# Initialize the stack
-stack = ["$", "program_start"]
-
-# Initialize the input pointer
-input_pointer = 0
-
-# LL(1) Parsing Algorithm
+    # Like semantico, values left on the type stack do not outlive their
+    # top-level statement
+    def visit_statement(self, node):
+        self.visit(node)
+        self.type_stack.clear()
+
+    # ETAC generation as a pass over the syntax tree, in source order
+    def visit_block(self, body):
+        last_if = self.last_if
+        self.last_if = None
+        self.enter_scope()
+        for statement in body:
+            yield statement
+        self.exit_scope()
+        self.last_if = last_if
+
+    def visit_Decl(self, node):
+        self.declare_variable(node.symbol, node.type)
+
+    # Values go on the type stack as (type, is_variable, operand)
+    def visit_Name(self, node):
+        var_type = self.get_variable_type(node.symbol)
+        self.type_stack.append((var_type, True, self.symbols.find(node.symbol)[2]))
+
+    def visit_Literal(self, node):
+        value = node.value.lower() if node.type == 'bool' else node.value
+        self.type_stack.append((node.type, False, self.ir.constant(value)))
+
+    def visit_Assign(self, node):
+        self.visit(node.target)
+        target_type, _, target_var = self.type_stack.pop()
+        yield node.value
+        source_type, _, source_val = self.type_stack.pop()
+        self.check_conversion(target_type, source_type)
+        self.ir.emit(COPY, target_type, target_var, source_val)
+
+    def visit_Call(self, node):
+        for argument in node.args:
+            yield argument
+        self.handle_function_call(node.function)
+
+    # Control structures reserve a temporary. IF keeps its condition in it,
+    # so the ELSE that follows it in the same block (other statements may
+    # come in between) branches on the value the IF saw. As in semantico,
+    # an ELSE is valid while the last IF or ELSE seen is an IF and its own
+    # block has an IF no ELSE took yet, whose flag has always been written
+    # by then.
+    def visit_If(self, node):
+        flag = self.new_temp()
+        self.open_if = flag
+        self.control_stack.append(('if', flag))
+        self.visit(node.condition)
+        condition_type, _, condition = self.type_stack[-1]
+        end = self.ir.label()
+        self.ir.emit(COPY, condition_type, flag, condition)
+        self.ir.emit(IF_FALSE, None, end, flag)
+        yield from self.visit_block(node.body)
+        self.control_stack.pop()
+        self.ir.emit(LABEL, None, end)
+        self.last_if = flag
+
+    def visit_Else(self, node):
+        if self.open_if is None or self.last_if is None:
+            raise Exception("ELSE without matching IF")
+        flag = self.last_if
+        self.last_if = None
+        self.open_if = None
+        end = self.ir.label()
+        self.ir.emit(IF_TRUE, None, end, flag)
+        yield from self.visit_block(node.body)
+        self.ir.emit(LABEL, None, end)
+
+    # The condition is tested again before every iteration
+    def visit_While(self, node):
+        self.control_stack.append(('while', self.new_temp()))
+        start = self.ir.label()
+        end = self.ir.label()
+        self.ir.emit(LABEL, None, start)
+        self.visit(node.condition)
+        _, _, condition = self.type_stack[-1]
+        self.ir.emit(IF_FALSE, None, end, condition)
+        yield from self.visit_block(node.body)
+        self.control_stack.pop()
+        self.ir.emit(GOTO, None, start)
+        self.ir.emit(LABEL, None, end)
+
+    # FOR(n) runs its block while its temporary, counting from 0, is
+    # below n
+    def visit_For(self, node):
+        counter = self.new_temp()
+        self.control_stack.append(('for', counter))
+        self.visit(node.variable)
+        _, _, limit = self.type_stack[-1]
+        test = self.new_temp()
+        start = self.ir.label()
+        end = self.ir.label()
+        self.ir.emit(COPY, 'int', counter, self.ir.constant('0'))
+        self.ir.emit(LABEL, None, start)
+        self.ir.emit(LOW, 'bool', test, counter, limit)
+        self.ir.emit(IF_FALSE, None, end, test)
+        yield from self.visit_block(node.body)
+        self.control_stack.pop()
+        self.ir.emit(ADD, 'int', counter, counter, self.ir.constant('1'))
+        self.ir.emit(GOTO, None, start)
+        self.ir.emit(LABEL, None, end)
+
+    def visit_In(self, node):
+        self.visit(node.name)
+        var_type, _, variable = self.type_stack[-1]
+        self.ir.emit(IN, var_type, variable)
+
+    def visit_Out(self, node):
+        self.visit(node.name)
+        var_type, _, variable = self.type_stack[-1]
+        self.ir.emit(OUT, var_type, NO_OPERAND, variable)
+
+# Parse the tokens into a syntax tree and generate the ETAC of every
+# statement as soon as it is parsed, returns the analyzer of a successful
+# run. The tree is only kept, in analyzer.tree, with keep_tree; otherwise
+# each statement is dropped once translated. Errors are raised with the
+# position (line, or source offset for token stores) they were found at.
+def analyze(input_tokens, keep_tree=False):
+    analyzer = SemanticAnalyzer(stream_interner(input_tokens))
+    tree = build_tree(input_tokens, analyzer.interner, analyzer.visit_statement, keep_tree)
+    analyzer.tree = tree if keep_tree else None
+    return analyzer
+
+# Check the tokens and report the result
 def parse(input_tokens):
-    input_terminals = [token[1] for token in input_tokens] + ["$"]
-    input_pointer = 0
-    stack = ["$", "program_start"]
-    analyzer = SemanticAnalyzer()
-
-    while stack:
-        top = stack[-1]
-        current_input = input_terminals[input_pointer] if input_pointer < len(input_terminals) else "$"
-        current_lexeme = input_tokens[input_pointer][0] if input_pointer < len(input_tokens) else None
-
-        # Terminal handling
-        if top == current_input:
-            # Handle semantic actions
-            if top == 'char_esq':
-                analyzer.enter_scope()
-            elif top == 'char_dir':
-                analyzer.exit_scope()
-            elif top in ['int', 'float', 'bool']:
-                analyzer.current_decl_type = top
-            elif top == 'id':
-                if analyzer.current_decl_type:
-                    analyzer.declare_variable(current_lexeme, analyzer.current_decl_type)
-                    analyzer.current_decl_type = None
-                else:
-                    var_type = analyzer.get_variable_type(current_lexeme)
-                    analyzer.type_stack.append((var_type, True, current_lexeme))
-            elif top == 'associacao':
-                analyzer.in_assignment = True
-                analyzer.assignment_target = analyzer.type_stack.pop()
-            elif top == 'ponto-virgula':
-                if analyzer.in_assignment:
-                    source_type, _, source_val = analyzer.type_stack.pop()
-                    target_type, _, target_var = analyzer.assignment_target
-                    analyzer.check_conversion(target_type, source_type)
-                    analyzer.etac_code.append(f"{target_var} = {source_val}")
-                    analyzer.in_assignment = False
-            elif top in ['num_int', 'nim_sin_int']:
-                analyzer.type_stack.append(('int', False, current_lexeme))  # Add value
-            elif top in ['num_float', 'nim_sin_float']:
-                analyzer.type_stack.append(('float', False, current_lexeme))  # Add value
-            elif top in ['true', 'false']:
-                analyzer.type_stack.append(('bool', False, current_lexeme.lower()))  # Add value
-            elif top in ['high', 'low', 'equal', 'add', 'sub', 'div', 'mul', 'and', 'or', 'not']:
-                analyzer.function_stack.append(top.upper())
-            elif top == 'par_dir' and analyzer.function_stack:
-                analyzer.handle_function_call(analyzer.function_stack.pop())
-
-            # Handle control structures
-            if top == 'while':
-                analyzer.control_stack.append(('while', analyzer.new_temp()))
-            elif top == 'for':
-                analyzer.control_stack.append(('for', analyzer.new_temp()))
-            elif top == 'if':
-                analyzer.control_stack.append(('if', analyzer.new_temp()))
-
-            # Stack operations
-            stack.pop()
-            input_pointer += 1
-
-        # Non-terminal handling
-        elif top in parsing_table:
-            production = parsing_table[top].get(current_input, None)
-            if not production:
-                raise Exception(f"Syntax error: Unexpected {current_input}")
-            stack.pop()
-            for symbol in reversed(production):
-                if symbol != 'vazio':
-                    stack.append(symbol)
-        else:
-            raise Exception(f"Syntax error: Unexpected {current_input}")
-
-    # Final validation and output
-    if input_pointer == len(input_terminals) and not stack:
-        print("Compilation successful!\n")
-        print("Generated ETAC Code:")
-        for line in analyzer.etac_code:
-            print(line)
-    else:
-        print("Compilation failed")
-
+    analyzer = analyze(input_tokens)
+    print("Compilation successful!\n")
+    print("Generated ETAC Code:")
+    for line in analyzer.etac_code:
+        print(line)
+    return analyzer
+
+# Main execution
 if __name__ == "__main__":
     file_path = sys.argv[1]
-    code = read_file(file_path)
-    if not code:
+    try:
+        tokens = open_file(file_path)
+    except UnicodeDecodeError as e:
+        print(decode_error(file_path, e))
+        sys.exit(1)
+    if tokens is None:
         print("File not found")
         sys.exit(1)
-    input_tokens = lexic(code)
-    try:
-        parse(input_tokens)
-    except Exception as e:
-        print(f"Semantic Error: {e}")
-        sys.exit(1)
\ No newline at end of file
+    with tokens:
+        try:
+            parse(tokens)
+        except Exception as e:
+            print(f"Semantic Error: {e}")
+            sys.exit(1)
\ No newline at end of file
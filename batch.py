@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from compile_cache import DEFAULT_CACHE_SIZE, CompileCache
+from compiler import compile_source
+from ll1 import load_table
+
+# Cache of the current process, when the batch uses one
+worker_cache = None
+
+# Runs once in every worker process, so the parse table is loaded before
+# the first compile instead of during it
+def warm_worker(cache_dir=None, cache_size=DEFAULT_CACHE_SIZE):
+    global worker_cache
+    load_table()
+    if cache_dir is not None:
+        worker_cache = CompileCache(cache_dir, cache_size)
+
+# All .j files under a directory, or the given files as they are
+def collect_sources(inputs):
+    paths = []
+    for name in inputs:
+        if os.path.isdir(name):
+            for directory, _, files in os.walk(name):
+                paths.extend(os.path.join(directory, file) for file in files if file.endswith('.j'))
+        else:
+            paths.append(name)
+    return sorted(paths)
+
+# Where the ETAC of a source goes: next to it, or mirrored under output
+def etac_path(path, root, output):
+    target = os.path.splitext(path)[0] + '.etac'
+    if output is None:
+        return target
+    return os.path.join(output, os.path.relpath(target, root))
+
+# Compile one file and write its ETAC, returns its report entry
+def run_job(job):
+    path, target, check, optimize = job
+    cache = None
+    if worker_cache is None:
+        result = compile_source(path=path, check=check, optimize=optimize)
+    else:
+        hits = worker_cache.hits
+        result = worker_cache.compile(path=path, check=check, optimize=optimize)
+        cache = 'hit' if worker_cache.hits > hits else 'miss'
+    entry = {
+        'file': path,
+        'status': 'ok' if result.success else 'error',
+        'cache': cache,
+        'diagnostics': [
+            {'phase': phase, 'line': line, 'message': message}
+            for phase, line, message in result.diagnostics
+        ],
+        'etac': None,
+        'instructions': result.instruction_counts
+    }
+    if result.etac_code:
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        with open(target, 'w') as file:
+            file.write('\n'.join(result.etac_code) + '\n')
+        entry['etac'] = target
+    return entry
+
+# run_job, timed. Anything it raises fails only its own file, as an
+# 'internal' diagnostic, so the rest of the batch and its report go on.
+def compile_job(job):
+    start = time.perf_counter()
+    try:
+        entry = run_job(job)
+    except Exception as error:
+        entry = {
+            'file': job[0],
+            'status': 'error',
+            'cache': None,
+            'diagnostics': [{'phase': 'internal', 'line': None, 'message': f"{type(error).__name__}: {error}"}],
+            'etac': None,
+            'instructions': None
+        }
+    entry['time'] = time.perf_counter() - start
+    return entry
+
+# Compile every path on a pool of warm worker processes and aggregate one
+# report. Jobs are handed out in chunks to keep the IPC cost per file low.
+# With a cache_dir unchanged sources are read back from the compile cache,
+# which is trimmed to cache_size once all jobs are done. optimize=True
+# optimizes the ETAC and totals its size before and after.
+def compile_batch(paths, workers=None, output=None, check=True, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE,
+                  optimize=False):
+    workers = workers or os.cpu_count() or 1
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else '.'
+    jobs = [(path, etac_path(os.path.abspath(path), root, output), check, optimize) for path in paths]
+    chunksize = max(1, len(jobs) // (workers * 8))
+
+    start = time.perf_counter()
+    if workers == 1:
+        warm_worker(cache_dir, cache_size)
+        entries = [compile_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=warm_worker,
+                                 initargs=(cache_dir, cache_size)) as executor:
+            entries = list(executor.map(compile_job, jobs, chunksize=chunksize))
+
+    cache = None
+    if cache_dir is not None:
+        # Workers only count hits and misses, evictions happen here
+        store = CompileCache(cache_dir, cache_size)
+        size = store.evict()
+        cache = {
+            'hits': sum(1 for entry in entries if entry['cache'] == 'hit'),
+            'misses': sum(1 for entry in entries if entry['cache'] == 'miss'),
+            'evictions': store.evictions,
+            'size': size
+        }
+    wall_time = time.perf_counter() - start
+
+    instructions = None
+    if optimize:
+        counts = [entry['instructions'] for entry in entries if entry['instructions']]
+        instructions = {'before': sum(count[0] for count in counts), 'after': sum(count[1] for count in counts)}
+
+    compiled = sum(1 for entry in entries if entry['status'] == 'ok')
+    return {
+        'summary': {
+            'files': len(entries),
+            'ok': compiled,
+            'failed': len(entries) - compiled,
+            'workers': workers,
+            'wall_time': wall_time,
+            'compile_time': sum(entry['time'] for entry in entries),
+            'cache': cache,
+            'instructions': instructions
+        },
+        'files': entries
+    }
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile many JAL programs in parallel")
+    parser.add_argument('inputs', nargs='+', help="directories to search for .j files, or files")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('-o', '--output', default=None, help="directory for the ETAC files (default: next to each source)")
+    parser.add_argument('--report', default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument('--no-check', action='store_true', help="skip the semantico checks")
+    parser.add_argument('--cache', default=None, metavar='DIR', help="reuse results of unchanged sources from this cache")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help="cache size cap in bytes")
+    parser.add_argument('-O', dest='optimize', action='store_true', help="optimize the ETAC")
+    args = parser.parse_args()
+
+    report = compile_batch(collect_sources(args.inputs), args.workers, args.output, not args.no_check,
+                           args.cache, args.cache_size, args.optimize)
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    summary = report['summary']
+    print(f"{summary['ok']}/{summary['files']} compiled in {summary['wall_time']:.2f}s "
+          f"with {summary['workers']} workers", file=sys.stderr)
+    if summary['cache'] is not None:
+        cache = summary['cache']
+        print(f"cache: {cache['hits']} hits, {cache['misses']} misses, {cache['evictions']} evictions, "
+              f"{cache['size']} bytes", file=sys.stderr)
+    if summary['instructions'] is not None:
+        instructions = summary['instructions']
+        print(f"optimized {instructions['before']} -> {instructions['after']} ETAC instructions", file=sys.stderr)
+    sys.exit(0 if summary['failed'] == 0 else 1)
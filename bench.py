@@ -0,0 +1,398 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import ETAC
+import semantico
+from incremental import CheckedDocument, LexedDocument
+from lexico import lexers, lexic_regex, terminal_ids
+from ll1 import drive, stream_interner
+from syntax_tree import build_tree
+from token_store import Interner, MappedTokenStore, TokenStore
+
+# Declarations and statement block repeated to build large programs
+HEADER = [
+    "START{\n",
+    "    INT var1;\n",
+    "    FLOAT var2;\n",
+    "    BOOL var3;\n",
+]
+
+BLOCK = [
+    "    # generated block\n",
+    "    var1 = 1;\n",
+    "    var2 = -0.5;\n",
+    "    var3 = TRUE;\n",
+    "    var2 = DIV(var2, 2.0);\n",
+    "    var3 = AND(HIGH(var1, 2.5), NOT(var3));\n",
+    "    OUT(var2);\n",
+]
+
+FOOTER = [
+    "    END;\n",
+    "}\n",
+]
+
+# Block of the suite programs, with every control structure
+SUITE_BLOCK = [
+    "    # generated block\n",
+    "    var1 = ADD(var1, 7);\n",
+    "    var2 = DIV(var2, 2.0);\n",
+    "    var3 = HIGH(var1, 10);\n",
+    "    IF(var3){\n",
+    "        var1 = SUB(var1, 10);\n",
+    "        var2 = MUL(var2, 1.5);\n",
+    "    } ELSE {\n",
+    "        var2 = ADD(var2, 0.25);\n",
+    "    }\n",
+    "    WHILE(var3){\n",
+    "        var3 = FALSE;\n",
+    "    }\n",
+    "    FOR(var1){\n",
+    "        var2 = ADD(var2, 1.0);\n",
+    "    }\n",
+    "    OUT(var2);\n",
+]
+
+# Fixed corpus of the suite: program name to SUITE_BLOCK repeats
+SUITE_PROGRAMS = {'small': 10, 'medium': 500, 'large': 5000}
+
+SUITE_PHASES = ['lex', 'parse', 'check', 'etac']
+
+BASELINE_VERSION = 1
+
+# Build a valid program of roughly size_mb megabytes as a list of lines
+def make_program(size_mb):
+    block_size = sum(len(line) for line in BLOCK)
+    repeat = max(1, int(size_mb * 1024 * 1024 / block_size))
+    return HEADER + BLOCK * repeat + FOOTER
+
+# Best wall time of a few runs
+def best_time(function, argument, rounds):
+    best = None
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = function(argument)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def bench_lexer(args):
+    code = make_program(args.size)
+    size = sum(len(line) for line in code)
+    print(f"Input: {size / (1024 * 1024):.2f} MB, {len(code)} lines")
+
+    results = {}
+    for name, lexer in lexers.items():
+        elapsed, tokens = best_time(lexer, code, args.rounds)
+        results[name] = tokens
+        print(f"{name:>8}: {len(tokens)} tokens in {elapsed:.3f}s, {len(tokens) / elapsed:,.0f} tokens/sec")
+
+    reference = results.pop('classic')
+    for name, tokens in results.items():
+        if tokens != reference:
+            raise Exception(f"Lexer '{name}' output differs from classic lexic")
+
+# Memory held by the result of function(argument)
+def allocated(function, argument):
+    tracemalloc.start()
+    result = function(argument)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+# Run a parse with its printed report discarded
+def quiet_parse(tokens):
+    with contextlib.redirect_stdout(io.StringIO()):
+        semantico.parse(tokens)
+
+# The LL(1) loop alone, with no action on the terminals
+def bare_drive(tokens):
+    drive(semantico.table, tokens, [], stream_interner(tokens))
+
+def bench_tokens(args):
+    code = make_program(args.size)
+    source = ''.join(code)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.j', delete=False) as file:
+        file.write(source)
+    try:
+        list_size, token_list = allocated(lexic_regex, code)
+        store_size, _ = allocated(TokenStore, source)
+        mapped_size, _ = allocated(MappedTokenStore, file.name)
+        count = len(token_list)
+        print(f"Tuple list:   {list_size / count:6.1f} bytes/token")
+        print(f"Token store:  {store_size / count:6.1f} bytes/token")
+        print(f"Mapped store: {mapped_size / count:6.1f} bytes/token (file mapped, not copied)")
+
+        inputs = [
+            ('tuple list', lexic_regex, code),
+            ('token store', TokenStore, source),
+            ('mapped store', MappedTokenStore, file.name)
+        ]
+        for name, build, argument in inputs:
+            lex_time, tokens = best_time(build, argument, args.rounds)
+            drive_time, _ = best_time(bare_drive, tokens, args.rounds)
+            parse_time, _ = best_time(quiet_parse, tokens, args.rounds)
+            print(f"{name:>12}: build {lex_time:.3f}s, drive {drive_time:.3f}s, semantico.parse {parse_time:.3f}s, "
+                  f"{count / (lex_time + parse_time):,.0f} tokens/sec overall")
+    finally:
+        os.unlink(file.name)
+
+# Original LL(1) loop over the dict-of-dicts table, returns expansions
+def expand_dict_table(terminals):
+    parsing_table = semantico.parsing_table
+    stack = ["$", "program_start"]
+    input_pointer = 0
+    expansions = 0
+    while stack:
+        top = stack[-1]
+        current_input = terminals[input_pointer]
+        if top == current_input:
+            stack.pop()
+            input_pointer += 1
+        elif top in parsing_table:
+            production = parsing_table[top].get(current_input)
+            if not production:
+                raise Exception(f"Syntax error: Unexpected {current_input}")
+            stack.pop()
+            for symbol in reversed(production):
+                if symbol != 'vazio':
+                    stack.append(symbol)
+            expansions += 1
+        else:
+            raise Exception(f"Syntax error: Unexpected {current_input}")
+    return expansions
+
+# Same loop over the dense integer table
+def expand_dense_table(terminals):
+    table = semantico.table
+    rows = table.rows
+    stack = [table.end, table.start]
+    input_pointer = 0
+    expansions = 0
+    while stack:
+        top = stack[-1]
+        current_input = terminals[input_pointer]
+        if top == current_input:
+            stack.pop()
+            input_pointer += 1
+        elif rows[top] is not None:
+            production = rows[top][current_input]
+            if production is None:
+                raise Exception(f"Syntax error: Unexpected {current_input}")
+            stack.pop()
+            stack.extend(production)
+            expansions += 1
+        else:
+            raise Exception(f"Syntax error: Unexpected {current_input}")
+    return expansions
+
+def bench_parser(args):
+    tokens = lexic_regex(make_program(args.size))
+    names = [token[1] for token in tokens] + ["$"]
+    ids = [terminal_ids[name] for name in names]
+
+    for label, loop, terminals in [('dict table', expand_dict_table, names), ('dense table', expand_dense_table, ids)]:
+        elapsed, expansions = best_time(loop, terminals, args.rounds)
+        print(f"{label:>11}: {expansions} expansions in {elapsed:.3f}s, {expansions / elapsed:,.0f} expansions/sec")
+
+# Latency of a one-line edit against re-lexing the whole file, at growing
+# file sizes. The edit cost should not grow with the file.
+def bench_relex(args):
+    for repeat in [100, 1000, 10000]:
+        code = HEADER + BLOCK * repeat + FOOTER
+        document = LexedDocument(code)
+        middle = len(code) // 2
+        edits = [[(middle, middle + 1, ["    var1 = 2;\n"])], [(middle, middle + 1, [code[middle - 1]])]]
+
+        start = time.perf_counter()
+        for index in range(args.rounds * 100):
+            document.edit(edits[index % 2])
+        edit_time = (time.perf_counter() - start) / (args.rounds * 100)
+        full_time, tokens = best_time(lexic_regex, document.lines, args.rounds)
+
+        if list(document.tokens()) != tokens:
+            raise Exception("Incremental tokens differ from a full re-lex")
+        print(f"{len(code):>7} lines: edit {edit_time * 1e6:8.1f} us, full re-lex {full_time * 1e3:8.2f} ms")
+
+# Re-check after a one-line edit near the end of the file, against running
+# semantico over the whole file again
+def bench_recheck(args):
+    for repeat in [100, 1000, 10000]:
+        code = HEADER + BLOCK * repeat + FOOTER
+        document = CheckedDocument(code)
+        line = len(code) - 10
+        edits = [[(line, line + 1, ["    var1 = 2;\n"])], [(line, line + 1, [code[line - 1]])]]
+
+        start = time.perf_counter()
+        reparsed = 0
+        for index in range(args.rounds * 100):
+            document.edit(edits[index % 2])
+            reparsed += document.reparsed
+        edit_time = (time.perf_counter() - start) / (args.rounds * 100)
+        full_time, _ = best_time(semantico.analyze, lexic_regex(document.lines), args.rounds)
+
+        if document.error is not None:
+            raise Exception(f"Unexpected error {document.error}")
+        print(f"{len(code):>7} lines: edit {edit_time * 1e6:8.1f} us ({reparsed / (args.rounds * 100):.0f} lines parsed), "
+              f"full check {full_time * 1e3:8.2f} ms")
+
+# Runs of the phases of one suite program, each on the previous one's
+# output: lexic, the bare LL(1) loop, semantico over the syntax tree and
+# ETAC generation over it
+def suite_runs(code):
+    tokens = lexic_regex(code)
+    interner = Interner()
+    tree = build_tree(tokens, interner)
+
+    def check(program):
+        semantico.SemanticAnalyzer(interner).visit(program)
+
+    def generate(program):
+        ETAC.SemanticAnalyzer(interner).visit(program)
+
+    return {
+        'lex': (lexic_regex, code),
+        'parse': (lambda tokens: drive(semantico.table, tokens, [], Interner()), tokens),
+        'check': (check, tree),
+        'etac': (generate, tree)
+    }, tokens
+
+# Peak memory traced while function(argument) runs
+def peak_memory(function, argument):
+    tracemalloc.start()
+    try:
+        function(argument)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+# Measures every phase on every program of the corpus: best time, tokens
+# (and for the parser productions) per second, and peak memory
+def run_suite(rounds):
+    results = {}
+    for name, repeat in SUITE_PROGRAMS.items():
+        code = HEADER + SUITE_BLOCK * repeat + FOOTER
+        runs, tokens = suite_runs(code)
+        productions = expand_dense_table([terminal_ids[token[1]] for token in tokens] + [terminal_ids['$']])
+        phases = {}
+        for phase in SUITE_PHASES:
+            function, argument = runs[phase]
+            seconds, _ = best_time(function, argument, rounds)
+            phases[phase] = {
+                'seconds': seconds,
+                'tokens_per_sec': len(tokens) / seconds,
+                'peak_bytes': peak_memory(function, argument)
+            }
+        phases['parse']['productions_per_sec'] = productions / phases['parse']['seconds']
+        results[name] = {'lines': len(code), 'tokens': len(tokens), 'productions': productions, 'phases': phases}
+    return results
+
+# Phases slower, or using more memory, than the baseline by more than
+# threshold, as (program, phase, metric, baseline, current)
+def regressions(baseline, results, threshold):
+    found = []
+    for name, program in results.items():
+        base_program = baseline['results'].get(name)
+        if base_program is None or base_program['tokens'] != program['tokens']:
+            continue
+        for phase, measured in program['phases'].items():
+            base = base_program['phases'].get(phase)
+            if base is None:
+                continue
+            for metric in ('seconds', 'peak_bytes'):
+                if measured[metric] > base[metric] * (1 + threshold):
+                    found.append((name, phase, metric, base[metric], measured[metric]))
+    return found
+
+def bench_suite(args):
+    results = run_suite(args.rounds)
+    for name, program in results.items():
+        print(f"{name}: {program['lines']} lines, {program['tokens']} tokens, {program['productions']} productions")
+        for phase, measured in program['phases'].items():
+            rate = f"{measured['tokens_per_sec']:>12,.0f} tokens/sec"
+            if 'productions_per_sec' in measured:
+                rate += f", {measured['productions_per_sec']:,.0f} productions/sec"
+            print(f"  {phase:>6}: {measured['seconds'] * 1e3:9.2f} ms {rate}, "
+                  f"peak {measured['peak_bytes'] / 1024:,.0f} KB")
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'version': BASELINE_VERSION, 'python': platform.python_version(), 'rounds': args.rounds,
+                       'results': results}, file, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        if baseline.get('version') != BASELINE_VERSION:
+            raise Exception(f"{args.baseline} is not a version {BASELINE_VERSION} baseline")
+        found = regressions(baseline, results, args.threshold)
+        for name, phase, metric, before, after in found:
+            print(f"REGRESSION {name}/{phase} {metric}: {before:.6g} -> {after:.6g} ({after / before - 1:+.0%})")
+        if found:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+# Time per variable lookup in both analyzers at growing nesting depths.
+# Every scope declares a variable of its own, and the one looked up is
+# declared in the outermost scope, as far as it can be from the lookups.
+def bench_scopes(args):
+    lookups = 100000
+    for depth in [1, 100, 10000]:
+        times = []
+        for analyzer_class in (semantico.SemanticAnalyzer, ETAC.SemanticAnalyzer):
+            interner = Interner()
+            analyzer = analyzer_class(interner)
+            symbol = interner.intern('var0')
+            analyzer.declare_variable(symbol, 'int')
+            for level in range(1, depth):
+                analyzer.enter_scope()
+                analyzer.declare_variable(interner.intern(f"var{level}"), 'float')
+
+            def lookup(count):
+                get_variable_type = analyzer.get_variable_type
+                for _ in range(count):
+                    get_variable_type(symbol)
+
+            elapsed, _ = best_time(lookup, lookups, args.rounds)
+            times.append(elapsed / lookups)
+            for _ in range(1, depth):
+                analyzer.exit_scope()
+            left = {name: [entry[:2] for entry in stack] for name, stack in analyzer.symbols.entries.items()}
+            if left != {symbol: [(1, 'int')]}:
+                raise Exception("Closing the scopes left declarations behind")
+        print(f"depth {depth:>5}: semantico {times[0] * 1e9:6.1f} ns, ETAC {times[1] * 1e9:6.1f} ns per lookup")
+
+benchmarks = {
+    'suite': bench_suite,
+    'scopes': bench_scopes,
+    'lexer': bench_lexer,
+    'tokens': bench_tokens,
+    'parser': bench_parser,
+    'relex': bench_relex,
+    'recheck': bench_recheck
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JAL compiler benchmarks")
+    parser.add_argument('benchmark', choices=sorted(benchmarks))
+    parser.add_argument('--size', type=float, default=4, help="input size in MB")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--save', default=None, metavar='FILE', help="suite: store the results as a JSON baseline")
+    parser.add_argument('--baseline', default=None, metavar='FILE',
+                        help="suite: compare against this baseline and fail on regressions")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="suite: allowed slowdown or memory growth, as a fraction (default 0.10)")
+    args = parser.parse_args()
+    benchmarks[args.benchmark](args)
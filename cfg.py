@@ -0,0 +1,77 @@
+import sys
+
+from etac_ir import GOTO, JUMPS, LABEL, render_instruction
+
+# Instructions start to end - 1 of an EtacIR, entered only at start and
+# left only after its last instruction. Successors and predecessors are
+# block indexes.
+class BasicBlock:
+    __slots__ = ('index', 'start', 'end', 'successors', 'predecessors')
+
+    def __init__(self, index, start, end):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.successors = []
+        self.predecessors = []
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"BasicBlock({self.index}, {self.start}:{self.end}, successors={self.successors})"
+
+# Split an EtacIR into basic blocks and link them. A block starts at the
+# first instruction, at every label and after every jump. Returns the
+# blocks in instruction order, the entry block first.
+def build_cfg(ir):
+    ops = ir.ops
+    count = len(ops)
+    leaders = {0} if count else set()
+    for index in range(count):
+        op = ops[index]
+        if op == LABEL:
+            leaders.add(index)
+        elif op in JUMPS and index + 1 < count:
+            leaders.add(index + 1)
+
+    starts = sorted(leaders)
+    blocks = [BasicBlock(number, start, end)
+              for number, (start, end) in enumerate(zip(starts, starts[1:] + [count]))]
+    label_blocks = {ir.dests[block.start]: block.index for block in blocks if ops[block.start] == LABEL}
+
+    for block in blocks:
+        last = ops[block.end - 1]
+        if last in JUMPS:
+            block.successors.append(label_blocks[ir.dests[block.end - 1]])
+        if last != GOTO and block.index + 1 < len(blocks):
+            fallthrough = block.index + 1
+            if fallthrough not in block.successors:
+                block.successors.append(fallthrough)
+        for successor in block.successors:
+            blocks[successor].predecessors.append(block.index)
+    return blocks
+
+# Blocks reachable from the entry block
+def reachable(blocks):
+    seen = set()
+    pending = [0] if blocks else []
+    while pending:
+        index = pending.pop()
+        if index not in seen:
+            seen.add(index)
+            pending.extend(blocks[index].successors)
+    return seen
+
+# Print the basic blocks of a file's ETAC
+if __name__ == "__main__":
+    from compiler import compile_source
+
+    result = compile_source(path=sys.argv[1], check=False)
+    for phase, line, message in result.diagnostics:
+        print(f"{phase} error at {line}: {message}")
+    if result.ir is not None and not result.diagnostics:
+        for block in build_cfg(result.ir):
+            print(f"B{block.index} -> {', '.join(f'B{successor}' for successor in block.successors) or 'exit'}")
+            for index in range(block.start, block.end):
+                print(f"    {render_instruction(result.ir, index)}")
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import pickle
+
+from compiler import CompileResult, compile_source
+from ll1 import GRAMMAR_PATH, grammar_key
+from token_store import decode_error
+
+# Bumped whenever the pickled entry layout changes
+CACHE_FORMAT = 3
+
+# Modules whose code decides what a compile produces
+COMPILER_MODULES = ['lexico.py', 'token_store.py', 'll1.py', 'syntax_tree.py', 'symbol_table.py', 'semantico.py',
+                    'ETAC.py', 'etac_ir.py', 'cfg.py', 'optimizer.py', 'liveness.py', 'regalloc.py', 'compiler.py']
+
+DEFAULT_CACHE_DIR = '.jal_cache'
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+# Computed once per process
+version_digest = None
+
+# Hash of the grammar and the compiler sources, so editing either one
+# invalidates every cached result
+def compiler_version():
+    global version_digest
+    if version_digest is None:
+        digest = hashlib.sha256(f"{CACHE_FORMAT}\n".encode())
+        with open(GRAMMAR_PATH, 'r') as file:
+            digest.update(grammar_key(file.read()).encode())
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in COMPILER_MODULES:
+            with open(os.path.join(directory, name), 'rb') as file:
+                digest.update(file.read())
+        version_digest = digest.hexdigest()
+    return version_digest
+
+# On-disk cache of compile results, addressed by the hash of the source bytes
+# and the compiler version. Each entry is one pickle holding the tokens, the
+# diagnostics, the ETAC code and the optimizer's instruction counts. Reads refresh the entry's mtime, and evict()
+# removes the least recently used entries until the cache fits in max_size.
+class CompileCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, data, check, optimize=False):
+        digest = hashlib.sha256(compiler_version().encode())
+        digest.update(b'check\n' if check else b'no-check\n')
+        digest.update(b'optimize\n' if optimize else b'no-optimize\n')
+        digest.update(data)
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as file:
+                tokens, diagnostics, etac_code, instruction_counts = pickle.load(file)
+            os.utime(path)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+        return CompileResult(tokens, diagnostics, etac_code, instruction_counts=instruction_counts)
+
+    # Written atomically, a failed write only costs the next run a compile
+    def put(self, key, result):
+        path = self.entry_path(key)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temporary, 'wb') as file:
+                pickle.dump((result.tokens, result.diagnostics, result.etac_code, result.instruction_counts), file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+
+    # Same as compile_source, answered from the cache when the source bytes
+    # were compiled before by this compiler version
+    def compile(self, source=None, path=None, check=True, optimize=False):
+        if (source is None) == (path is None):
+            raise Exception("compile takes either source or path")
+        if path is not None:
+            try:
+                with open(path, 'rb') as file:
+                    data = file.read()
+            except OSError:
+                # Let compile_source report the input error
+                return compile_source(path=path, check=check, optimize=optimize)
+        else:
+            data = source.encode()
+
+        key = self.key(data, check, optimize)
+        result = self.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        try:
+            source = data.decode()
+        except UnicodeDecodeError as error:
+            # Reported like compile_source does, and never cached
+            return CompileResult([], [('input', None, decode_error(path, error))], [])
+        result = compile_source(source=source, check=check, optimize=optimize)
+        self.put(key, result)
+        return result
+
+    # (mtime, size, path) of every entry, oldest first
+    def entries(self):
+        found = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return found
+        for name in names:
+            if not name.endswith('.pickle'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_mtime, stat.st_size, path))
+        found.sort()
+        return found
+
+    # Drop least recently used entries until the cache fits in max_size
+    def evict(self):
+        entries = self.entries()
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+            self.evictions += 1
+        return size
+
+    def counters(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,36 @@
+import json
+import sys
+
+# Counts the variable lookups of a SemanticAnalyzer (either one) and how
+# deep in its scope stack each was found: 1 is the innermost scope, an
+# undefined variable counts every scope. The counting wrapper replaces
+# get_variable_type on the instance only, other analyzers keep the plain
+# method.
+class ScopeLookups:
+    def __init__(self, analyzer):
+        self.lookups = 0
+        self.depth_total = 0
+        self.depth_max = 0
+        lookup = analyzer.get_variable_type
+
+        def counted_lookup(symbol):
+            symbols = analyzer.symbols
+            entry = symbols.find(symbol)
+            depth = symbols.depth - entry[0] + 1 if entry is not None else symbols.depth
+            self.lookups += 1
+            self.depth_total += depth
+            if depth > self.depth_max:
+                self.depth_max = depth
+            return lookup(symbol)
+        analyzer.get_variable_type = counted_lookup
+
+    def as_dict(self):
+        return {
+            'scope_lookups': self.lookups,
+            'scope_depth_mean': self.depth_total / self.lookups if self.lookups else 0.0,
+            'scope_depth_max': self.depth_max
+        }
+
+def write_stats(stats, file=sys.stderr):
+    json.dump(stats, file, indent=2)
+    file.write('\n')
@@ -0,0 +1,242 @@
+import argparse
+import sys
+import time
+
+import ETAC
+import compile_stats
+import optimizer
+import regalloc
+import semantico
+from etac_ir import render
+from ll1 import count_parse
+from syntax_tree import build_tree
+from token_store import MappedTokenStore, TokenStore, decode_error
+
+# Compiler phases in the order they run
+PHASES = ['lex', 'parse', 'check', 'etac']
+
+# Outcome of one compile. Diagnostics are (phase, line, message) tuples,
+# line is None when the error was found at the end of the input. tree is
+# the syntax tree of a program that parsed and ir the EtacIR etac_code was
+# rendered from. timings maps each phase that ran to its wall time in
+# seconds, when asked for. instruction_counts is the ETAC size before and
+# after optimization, for optimized compiles, register_stats the
+# Allocation.stats() of compiles that allocated registers and stats the
+# counters of compiles that collected them.
+class CompileResult:
+    def __init__(self, tokens, diagnostics, etac_code, timings=None, tree=None, ir=None, instruction_counts=None,
+                 register_stats=None, stats=None):
+        self.tokens = tokens
+        self.diagnostics = diagnostics
+        self.etac_code = etac_code
+        self.timings = timings
+        self.tree = tree
+        self.ir = ir
+        self.instruction_counts = instruction_counts
+        self.register_stats = register_stats
+        self.stats = stats
+
+    @property
+    def success(self):
+        return not self.diagnostics
+
+# Wrap a pass so the time spent in it is added to timings[phase]
+def timed(visit, timings, phase):
+    clock = time.perf_counter
+
+    def timed_visit(node):
+        start = clock()
+        visit(node)
+        timings[phase] += clock() - start
+    return timed_visit
+
+# Compile JAL source text, or the file at path, without touching any shared
+# state: every call builds its own tokens and analyzers, so calls can run
+# concurrently from several threads. The source is scanned into a
+# TokenStore, a file from its memory mapping into a MappedTokenStore, which
+# becomes result.tokens. Positions in the tree are source offsets that
+# tokens.line() turns into lines, as is done for the diagnostics.
+#
+# The source is lexed once and parsed once into a syntax tree: the
+# semantico checks and the ETAC generator both visit each statement as soon
+# as the parser completes it. ETAC is only kept for programs that pass the
+# checks. check=False skips the
+# semantico checks, stop_after ends the compile after any of PHASES,
+# timings=True records the wall time of each phase, optimize=True runs
+# the optimizer over the ETAC and registers=K allocates its temporaries to
+# K registers.
+#
+# stats=True, or any hooks, collects the phase times and counters of the
+# compile into result.stats (see collect_stats) and calls each hook with
+# them. The counting is set up only then, the phases themselves run the
+# same code either way.
+def compile_source(source=None, path=None, check=True, stop_after='etac', timings=False, optimize=False,
+                   registers=None, stats=False, hooks=()):
+    if (source is None) == (path is None):
+        raise Exception("compile_source takes either source or path")
+    if stop_after not in PHASES:
+        raise Exception(f"Unknown phase '{stop_after}'")
+    if registers is not None and registers < 0:
+        raise Exception("The register count cannot be negative")
+
+    collect = stats or bool(hooks)
+    timings = timings or collect
+    clock = time.perf_counter
+    phase_times = None
+    if timings:
+        phase_times = {phase: 0.0 for phase in PHASES[:PHASES.index(stop_after) + 1] if check or phase != 'check'}
+
+    # Lexical analysis, files are scanned in place
+    diagnostics = []
+    start = clock()
+    errors = []
+    if path is not None:
+        try:
+            tokens = MappedTokenStore(path, errors=errors)
+        except OSError as error:
+            diagnostics.append(('input', None, f"Cannot read {path}: {error.strerror}"))
+            return CompileResult([], diagnostics, [])
+        except UnicodeDecodeError as error:
+            diagnostics.append(('input', None, decode_error(path, error)))
+            return CompileResult([], diagnostics, [])
+    else:
+        tokens = TokenStore(source, errors=errors)
+    for line, character in errors:
+        diagnostics.append(('lexic', line, f"Unexpected character {character!r}"))
+    if timings:
+        phase_times['lex'] = clock() - start
+    scope_lookups = {}
+    stop = None                      # Index of the token a failed parse stopped on
+
+    def finish(result, generated=None):
+        if collect:
+            result.stats = collect_stats(result, stop_after, stop, scope_lookups, generated)
+            for hook in hooks:
+                hook(result.stats)
+        return result
+
+    if stop_after == 'lex':
+        return finish(CompileResult(tokens, diagnostics, [], phase_times))
+
+    # Single parse with the enabled phases visiting its statements
+    interner = tokens.interner
+    generator = None
+    passes = []
+    if check and stop_after in ('check', 'etac'):
+        checker = semantico.SemanticAnalyzer(interner)
+        passes.append(('check', checker.visit_statement))
+        if collect:
+            scope_lookups['check'] = compile_stats.ScopeLookups(checker)
+    if stop_after == 'etac':
+        generator = ETAC.SemanticAnalyzer(interner)
+        passes.append(('etac', generator.visit_statement))
+        if collect:
+            scope_lookups['etac'] = compile_stats.ScopeLookups(generator)
+    if timings:
+        passes = [(phase, timed(visit, phase_times, phase)) for phase, visit in passes]
+
+    def visit(statement):
+        for _, visit_pass in passes:
+            visit_pass(statement)
+
+    start = clock()
+    tree = None
+    try:
+        tree = build_tree(tokens, interner, visit, keep_tree=True)
+    except Exception as error:
+        message = str(error)
+        phase = 'syntax' if message.startswith("Syntax error") else 'semantic'
+        position = getattr(error, 'position', None)
+        if position is not None:
+            position = tokens.line(position)
+        diagnostics.append((phase, position, message))
+        stop = getattr(error, 'token_index', None)
+    if timings:
+        phase_times['parse'] = clock() - start - sum(phase_times[phase] for phase, _ in passes)
+
+    if generator is None or not all(phase == 'lexic' for phase, _, _ in diagnostics):
+        return finish(CompileResult(tokens, diagnostics, [], phase_times, tree))
+    if not optimize and registers is None:
+        return finish(CompileResult(tokens, diagnostics, generator.etac_code, phase_times, tree, generator.ir),
+                      generator.ir)
+
+    ir = generator.ir
+    instruction_counts = None
+    if optimize:
+        start = clock()
+        ir = optimizer.optimize(ir)
+        instruction_counts = (len(generator.ir), len(ir))
+        if timings:
+            phase_times['optimize'] = clock() - start
+    register_stats = None
+    if registers is not None:
+        start = clock()
+        ir, allocation = regalloc.allocate(ir, registers)
+        register_stats = allocation.stats()
+        if timings:
+            phase_times['regalloc'] = clock() - start
+    return finish(CompileResult(tokens, diagnostics, render(ir), phase_times, tree, ir, instruction_counts,
+                                register_stats), generator.ir)
+
+# Stats of a finished compile, as a JSON-ready dict: the phase times, the
+# lexer's lines and tokens, the LL(1) loop's table lookups, stack pushes
+# and pops (replayed by count_parse after the parse, up to the token at
+# index stop a failed parse stopped on), the variable lookups
+# of each analyzer with their scope depth, and the temporaries, labels and
+# lines of the generated ETAC and the lines of the ETAC emitted.
+def collect_stats(result, stop_after, stop, scope_lookups, generated):
+    stats = {
+        'timings': dict(result.timings),
+        'lex': {'lines': result.tokens.line_count(), 'tokens': len(result.tokens)}
+    }
+    if stop_after != 'lex':
+        stats['parse'] = count_parse(semantico.table, result.tokens.kinds, stop)
+    for phase, lookups in scope_lookups.items():
+        stats[phase] = lookups.as_dict()
+    if generated is not None:
+        stats['etac'].update({
+            'temps': generated.temp_count,
+            'labels': generated.label_count,
+            'lines': len(generated),
+            'lines_emitted': len(result.ir)
+        })
+    return stats
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a JAL program to ETAC")
+    parser.add_argument('file')
+    parser.add_argument('--stop-after', choices=PHASES, default='etac', help="last phase to run")
+    parser.add_argument('--no-check', action='store_true', help="skip the semantico checks")
+    parser.add_argument('--timings', action='store_true', help="report the time of each phase")
+    parser.add_argument('-O', dest='optimize', action='store_true', help="optimize the ETAC")
+    parser.add_argument('--registers', type=int, default=None, metavar='K',
+                        help="allocate the temporaries to K registers")
+    parser.add_argument('--stats', nargs='?', const='-', default=None, metavar='FILE',
+                        help="write phase times and counters as JSON to FILE (default: stderr)")
+    args = parser.parse_args()
+
+    result = compile_source(path=args.file, check=not args.no_check, stop_after=args.stop_after,
+                            timings=args.timings, optimize=args.optimize, registers=args.registers,
+                            stats=args.stats is not None)
+    for phase, line, message in result.diagnostics:
+        location = f"{args.file}:{line}" if line is not None else args.file
+        print(f"{location}: {phase} error: {message}")
+    for line in result.etac_code:
+        print(line)
+    if args.timings:
+        for phase, seconds in result.timings.items():
+            print(f"{phase:>8}: {seconds * 1000:.3f} ms", file=sys.stderr)
+    if result.instruction_counts:
+        before, after = result.instruction_counts
+        print(f"optimized {before} -> {after} ETAC instructions", file=sys.stderr)
+    if result.register_stats:
+        regalloc.print_stats(result.register_stats)
+    if result.stats:
+        if args.stats == '-':
+            compile_stats.write_stats(result.stats)
+        else:
+            with open(args.stats, 'w') as file:
+                compile_stats.write_stats(result.stats, file)
+
+    sys.exit(0 if result.success else 1)
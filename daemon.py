@@ -0,0 +1,102 @@
+import argparse
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+from compiler import PHASES, compile_source
+from ll1 import load_table
+from protocol import default_socket_path, recv_frame, send_frame
+
+# Answer one request. Requests are {"op": "compile", "source" or "path",
+# "check", "stop_after", "optimize", "stats"}, {"op": "ping"} or
+# {"op": "shutdown"}. Compiles that collected stats reply with them.
+def handle_request(server, request):
+    op = request.get('op', 'compile')
+    if op == 'ping':
+        return {'status': 'ok', 'pid': os.getpid()}
+    if op == 'shutdown':
+        threading.Thread(target=server.shutdown).start()
+        return {'status': 'ok'}
+    if op != 'compile':
+        return {'status': 'error', 'diagnostics': [['request', None, f"Unknown op '{op}'"]], 'etac': []}
+
+    stop_after = request.get('stop_after', 'etac')
+    if stop_after not in PHASES:
+        return {'status': 'error', 'diagnostics': [['request', None, f"Unknown phase '{stop_after}'"]], 'etac': []}
+    try:
+        result = compile_source(source=request.get('source'), path=request.get('path'),
+                                check=request.get('check', True), stop_after=stop_after,
+                                optimize=request.get('optimize', False), stats=request.get('stats', False))
+    except Exception as error:
+        return {'status': 'error', 'diagnostics': [['request', None, str(error)]], 'etac': []}
+    reply = {
+        'status': 'ok' if result.success else 'error',
+        'diagnostics': result.diagnostics,
+        'etac': result.etac_code
+    }
+    if result.stats is not None:
+        reply['stats'] = result.stats
+    return reply
+
+# One client connection, any number of requests over it
+class CompileHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except Exception as error:
+                send_frame(self.request, {'status': 'error', 'diagnostics': [['request', None, str(error)]], 'etac': []})
+                return
+            if request is None:
+                return
+            send_frame(self.request, handle_request(self.server, request))
+
+class CompileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+# True if a daemon already answers on the socket
+def socket_in_use(path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+def serve(path):
+    if os.path.exists(path):
+        if socket_in_use(path):
+            raise Exception(f"A daemon is already listening on {path}")
+        os.remove(path)
+
+    # Everything a compile needs is loaded before the first request
+    load_table()
+
+    old_umask = os.umask(0o077)
+    try:
+        server = CompileServer(path, CompileHandler)
+    finally:
+        os.umask(old_umask)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Persistent JAL compile daemon")
+    parser.add_argument('--socket', default=default_socket_path(), help="Unix socket to listen on")
+    args = parser.parse_args()
+    try:
+        serve(args.socket)
+    except KeyboardInterrupt:
+        pass
+    except Exception as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,254 @@
+from array import array
+
+# Opcodes
+DECL, COPY, ADD, SUB, MUL, DIV, LOW, HIGH, EQUAL, AND, OR, NOT, LABEL, GOTO, IF_FALSE, IF_TRUE, IN, OUT = range(18)
+OPCODES = ['decl', 'copy', 'add', 'sub', 'mul', 'div', 'low', 'high', 'equal', 'and', 'or', 'not',
+           'label', 'goto', 'if_false', 'if', 'in', 'out']
+
+# Instructions that end a basic block
+JUMPS = {GOTO, IF_FALSE, IF_TRUE}
+
+# JAL function to opcode, and the operator each one is written with
+FUNCTION_OPCODES = {
+    'ADD': ADD, 'SUB': SUB, 'MUL': MUL, 'DIV': DIV,
+    'LOW': LOW, 'HIGH': HIGH, 'EQUAL': EQUAL,
+    'AND': AND, 'OR': OR, 'NOT': NOT
+}
+OPERATORS = {
+    ADD: '+', SUB: '-', MUL: '*', DIV: '/',
+    LOW: '<', HIGH: '>', EQUAL: '==',
+    AND: 'and', OR: 'or', NOT: 'not'
+}
+
+# Value types, as declared and as written on temporaries
+TYPES = ['int', 'float', 'bool']
+TYPE_IDS = {name: index for index, name in enumerate(TYPES)}
+TEMP_TYPES = ['i32', 'f64', 'bool']
+
+# Type of instructions that produce no value
+NO_TYPE = 255
+
+# Operand kinds. Register allocation replaces temporaries with registers
+# and spill slots.
+VARIABLE, TEMP, CONSTANT, LABEL_OPERAND, REGISTER, SLOT = range(6)
+
+NO_OPERAND = -1
+
+# ETAC program stored column-wise: instruction i is ops[i] with result type
+# types[i], writing dests[i] from lefts[i] and rights[i]. Operands are
+# integer ids; operand_values holds the interned symbol id of a variable,
+# the number of a temporary, label, register or spill slot, or the text of
+# a constant. Every declaration of a variable gets its own id, so a
+# declaration shadowing an outer one of the same name does not share its
+# storage, and constants get one id each however often they are used.
+# Declarations after the first of a name are written name_N, N counting
+# them from 1 (JAL names cannot hold an underscore). LABEL, GOTO
+# and the conditional jumps keep their label in dests, and the condition
+# of a jump in lefts. IN reads a value of its type into dests, OUT writes
+# lefts.
+class EtacIR:
+    def __init__(self, interner):
+        self.interner = interner
+        self.ops = array('B')
+        self.types = array('B')
+        self.dests = array('i')
+        self.lefts = array('i')
+        self.rights = array('i')
+        self.operand_kinds = array('B')
+        self.operand_values = []
+        self.declarations = {}       # Symbol id to its number of declarations
+        self.variable_numbers = {}   # Variable operand to its N in name_N
+        self.constant_ids = {}       # Constant text to operand
+        self.register_ids = {}       # Register or slot (kind, number) to operand
+        self.temp_count = 0
+        self.label_count = 0
+
+    def add_operand(self, kind, value):
+        self.operand_kinds.append(kind)
+        self.operand_values.append(value)
+        return len(self.operand_values) - 1
+
+    # New variable operand for a declaration of symbol
+    def declare_variable(self, symbol):
+        operand = self.add_operand(VARIABLE, symbol)
+        number = self.declarations.get(symbol, 0)
+        self.declarations[symbol] = number + 1
+        if number:
+            self.variable_numbers[operand] = number
+        return operand
+
+    def constant(self, text):
+        operand = self.constant_ids.get(text)
+        if operand is None:
+            operand = self.constant_ids[text] = self.add_operand(CONSTANT, text)
+        return operand
+
+    def register(self, kind, number):
+        operand = self.register_ids.get((kind, number))
+        if operand is None:
+            operand = self.register_ids[(kind, number)] = self.add_operand(kind, number)
+        return operand
+
+    # New temporary, numbered in creation order
+    def temp(self):
+        self.temp_count += 1
+        return self.add_operand(TEMP, self.temp_count - 1)
+
+    def label(self):
+        self.label_count += 1
+        return self.add_operand(LABEL_OPERAND, self.label_count - 1)
+
+    def emit(self, op, value_type, dest, left=NO_OPERAND, right=NO_OPERAND):
+        self.append(op, TYPE_IDS[value_type] if value_type is not None else NO_TYPE, dest, left, right)
+
+    # Add an instruction given by its raw column values
+    def append(self, op, type_id, dest, left, right):
+        self.ops.append(op)
+        self.types.append(type_id)
+        self.dests.append(dest)
+        self.lefts.append(left)
+        self.rights.append(right)
+
+    # Empty program sharing this one's operands, for passes that rewrite
+    # the instructions
+    def derive(self):
+        ir = EtacIR(self.interner)
+        ir.operand_kinds = array('B', self.operand_kinds)
+        ir.operand_values = list(self.operand_values)
+        ir.declarations = dict(self.declarations)
+        ir.variable_numbers = dict(self.variable_numbers)
+        ir.constant_ids = dict(self.constant_ids)
+        ir.register_ids = dict(self.register_ids)
+        ir.temp_count = self.temp_count
+        ir.label_count = self.label_count
+        return ir
+
+    def __len__(self):
+        return len(self.ops)
+
+# int values are 32 bit, wrapping around on overflow
+def wrap_i32(value):
+    return ((value + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+# Python value of a constant: True/False for booleans, float if it has a
+# dot and a wrapped int otherwise. Raises ValueError for malformed numbers.
+def constant_value(text):
+    if text == 'true' or text == 'false':
+        return text == 'true'
+    return float(text) if '.' in text else wrap_i32(int(text))
+
+# Value stored into a destination of type type_id. Floats become ints by
+# truncation, raising OverflowError or ValueError for inf and nan.
+def convert(type_id, value):
+    if type_id == TYPE_IDS['int']:
+        return wrap_i32(int(value))
+    if type_id == TYPE_IDS['float']:
+        return float(value)
+    return bool(value)
+
+def constant_text(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return repr(value)
+
+def constant_type(text):
+    if text == 'true' or text == 'false':
+        return TYPE_IDS['bool']
+    return TYPE_IDS['float'] if '.' in text else TYPE_IDS['int']
+
+# Result of an operator on Python values, for an instruction of result type
+# type_id. Arithmetic works in the result type: ints wrap around, int
+# division truncates toward zero, and dividing by zero raises
+# ZeroDivisionError. Comparisons compare numbers as they are.
+def evaluate(op, type_id, left, right=None):
+    if op == NOT:
+        return not left
+    if op == AND:
+        return bool(left and right)
+    if op == OR:
+        return bool(left or right)
+    if op == LOW:
+        return left < right
+    if op == HIGH:
+        return left > right
+    if op == EQUAL:
+        return left == right
+
+    if type_id == TYPE_IDS['int']:
+        left, right = int(left), int(right)
+        if op == DIV:
+            if right == 0:
+                raise ZeroDivisionError("Division by zero")
+            quotient = abs(left) // abs(right)
+            return wrap_i32(quotient if (left < 0) == (right < 0) else -quotient)
+        if op == ADD:
+            return wrap_i32(left + right)
+        if op == SUB:
+            return wrap_i32(left - right)
+        if op == MUL:
+            return wrap_i32(left * right)
+    else:
+        left, right = float(left), float(right)
+    if op == ADD:
+        return left + right
+    if op == SUB:
+        return left - right
+    if op == MUL:
+        return left * right
+    if op == DIV:
+        if right == 0:
+            raise ZeroDivisionError("Division by zero")
+        return left / right
+    raise Exception(f"Cannot evaluate {OPCODES[op]}")
+
+# Name of a variable operand, name_N for shadowing declarations
+def variable_name(ir, operand):
+    name = ir.interner.names[ir.operand_values[operand]]
+    number = ir.variable_numbers.get(operand)
+    return name if number is None else f"{name}_{number}"
+
+# ETAC text of an operand
+def operand_text(ir, operand):
+    kind = ir.operand_kinds[operand]
+    value = ir.operand_values[operand]
+    if kind == VARIABLE:
+        return variable_name(ir, operand)
+    if kind == TEMP:
+        return f"t{value}"
+    if kind == LABEL_OPERAND:
+        return f"L{value}"
+    if kind == REGISTER:
+        return f"r{value}"
+    if kind == SLOT:
+        return f"s{value}"
+    return value
+
+# ETAC text of instruction index
+def render_instruction(ir, index):
+    op = ir.ops[index]
+    left = operand_text(ir, ir.lefts[index]) if ir.lefts[index] != NO_OPERAND else None
+    if op == OUT:
+        return f"out {left}"
+    dest = operand_text(ir, ir.dests[index])
+    if op == IN:
+        return f"in {dest}"
+    if op == DECL:
+        return f"{dest}: {TYPES[ir.types[index]]} = {left}"
+    if op == COPY:
+        return f"{dest} = {left}"
+    if op == LABEL:
+        return f"{dest}:"
+    if op == GOTO:
+        return f"goto {dest}"
+    if op == IF_FALSE:
+        return f"if_false {left} goto {dest}"
+    if op == IF_TRUE:
+        return f"if {left} goto {dest}"
+    if op == NOT:
+        return f"{dest}: bool = not {left}"
+    right = operand_text(ir, ir.rights[index])
+    return f"{dest}: {TEMP_TYPES[ir.types[index]]} = {left} {OPERATORS[op]} {right}"
+
+# The textual ETAC program, one string per instruction
+def render(ir):
+    return [render_instruction(ir, index) for index in range(len(ir))]
@@ -0,0 +1,322 @@
+import argparse
+import random
+import sys
+import time
+
+import semantico
+from lexico import terminals, token_table
+
+# Relative weights of the statement kinds and, for expressions, of calls,
+# variables and literals
+DEFAULT_MIX = {
+    'declaration': 2, 'assignment': 6, 'control': 2, 'io': 1,
+    'call': 3, 'variable': 3, 'literal': 2
+}
+
+STATEMENT_KINDS = ['declaration', 'assignment', 'control', 'io']
+EXPRESSION_KINDS = ['call', 'variable', 'literal']
+
+TYPES = ['int', 'float', 'bool']
+
+# Source text of each terminal, identifiers and numbers come from the
+# generator state
+TEXT = {kind: lexeme for lexeme, kind in token_table}
+TEXT.update({'int': 'INT ', 'float': 'FLOAT ', 'bool': 'BOOL ', 'else': 'ELSE ', 'virgula': ', ',
+             'associacao': ' = '})
+
+# Terminals that end a line
+LINE_ENDS = {'ponto-virgula', 'char_esq', 'char_dir'}
+
+# A nested block: control structure it belongs to and statements left
+class Block:
+    __slots__ = ('kind', 'remaining')
+
+    def __init__(self, kind, remaining):
+        self.kind = kind
+        self.remaining = remaining
+
+# Random JAL programs, derived from the LL(1) table the way the parser reads
+# them: the stack starts at the start symbol, non-terminals are replaced by
+# the production the table has for a chosen lookahead terminal and
+# terminals are written out. Only <code>, <expression> and <argument_tail>
+# need a choice; it is made with the scopes and types SemanticAnalyzer
+# checks, so every program is well typed and only uses declared variables.
+# The programs are compiler inputs, running them may not terminate.
+class Generator:
+    def __init__(self, seed=None, max_depth=4, max_expression_depth=3, block_size=8, mix=None, table=None):
+        self.random = random.Random(seed)
+        self.max_depth = max_depth
+        self.max_expression_depth = max_expression_depth
+        self.block_size = block_size
+        self.mix = dict(DEFAULT_MIX)
+        if mix:
+            for kind in mix:
+                if kind not in DEFAULT_MIX:
+                    raise Exception(f"Unknown mix entry '{kind}', expected one of {', '.join(DEFAULT_MIX)}")
+            self.mix.update(mix)
+        self.table = table if table is not None else semantico.table
+        self.analyzer = semantico.SemanticAnalyzer()
+
+        # Non-terminals with a single production are expanded without a
+        # lookahead, the others through their chooser
+        self.single = {}
+        for non_terminal in self.table.parsing_table:
+            symbol = self.table.symbol_ids[non_terminal]
+            productions = {production for production in self.table.rows[symbol] if production is not None}
+            if len(productions) == 1:
+                self.single[symbol] = productions.pop()
+        self.choosers = {
+            self.table.symbol_ids['code']: self.choose_code,
+            self.table.symbol_ids['expression']: self.choose_expression,
+            self.table.symbol_ids['argument_tail']: self.choose_argument_tail
+        }
+
+    def reset(self, size):
+        self.size = size
+        self.written = 0
+        self.out = []
+        self.indent = 0
+        self.line_start = True
+        self.name = None                 # Next identifier to write
+        self.literal = None              # Next number to write
+        self.visible = {type_name: [] for type_name in TYPES}
+        self.scopes = [[]]               # Types declared in each open scope
+        self.blocks = []
+        self.after_if = False
+        self.last_branch = None          # Last IF or ELSE written
+        self.wanted = []                 # (type, assigned) of the expressions to come
+        self.arguments = []              # Arguments left in each open call
+        self.declared = 0
+
+    # Program source of at least size characters
+    def generate(self, size):
+        self.reset(size)
+        table = self.table
+        rows = table.rows
+        terminal_count = table.terminal_count
+        single = self.single
+        choosers = self.choosers
+        lookahead = None
+        stack = [table.start]
+        while stack:
+            symbol = stack.pop()
+            if symbol < terminal_count:
+                self.write(terminals[symbol])
+                lookahead = None
+                continue
+            production = single.get(symbol)
+            if production is None:
+                if lookahead is None:
+                    lookahead = table.symbol_ids[choosers[symbol]()]
+                production = rows[symbol][lookahead]
+                if production is None:
+                    raise Exception(f"No production of <{table.name(symbol)}> for {terminals[lookahead]}")
+            stack.extend(production)
+        return ''.join(self.out)
+
+    def write(self, kind):
+        if kind == 'id':
+            text = self.name
+        elif kind in ('num_int', 'num_float', 'nim_sin_int', 'nim_sin_float'):
+            text = self.literal
+        else:
+            text = TEXT[kind]
+        if kind == 'char_dir':
+            self.indent -= 1
+        if self.line_start:
+            text = '    ' * self.indent + text
+            self.line_start = False
+        if kind in LINE_ENDS:
+            text += '\n'
+            self.line_start = True
+        if kind == 'char_esq':
+            self.indent += 1
+        self.out.append(text)
+        self.written += len(text)
+
+    def weighted(self, kinds):
+        weights = [self.mix[kind] for kind in kinds]
+        if not any(weights):
+            return kinds[0]
+        return self.random.choices(kinds, weights)[0]
+
+    def declare(self, type_name):
+        self.declared += 1
+        name = f"v{self.declared}"
+        self.visible[type_name].append(name)
+        self.scopes[-1].append(type_name)
+        return name
+
+    def variable(self, type_name):
+        names = self.visible[type_name]
+        return names[self.random.randrange(len(names))]
+
+    # Next statement, closing of the current block or the end of the program
+    def choose_code(self):
+        if self.blocks:
+            block = self.blocks[-1]
+            # Blocks still open once the program is big enough end early
+            if block.remaining == 0 or self.written >= self.size:
+                self.blocks.pop()
+                for type_name in self.scopes.pop():
+                    self.visible[type_name].pop()
+                self.after_if = block.kind == 'if'
+                return 'char_dir'
+            block.remaining -= 1
+        elif self.written >= self.size:
+            return 'end'
+        after_if = self.after_if
+        self.after_if = False
+        return self.choose_statement(after_if)
+
+    def choose_statement(self, after_if):
+        missing = [type_name for type_name in TYPES if not self.visible[type_name]]
+        kinds = list(STATEMENT_KINDS)
+        if missing or len(self.blocks) >= self.max_depth:
+            kinds.remove('control')
+        kind = 'declaration' if missing else self.weighted(kinds)
+
+        if kind == 'declaration':
+            type_name = missing[0] if missing else self.random.choice(TYPES)
+            self.name = self.declare(type_name)
+            return type_name
+        if kind == 'assignment':
+            type_name = self.random.choice(TYPES)
+            self.name = self.variable(type_name)
+            self.wanted.append((type_name, True))
+            return 'id'
+        if kind == 'io':
+            self.name = self.variable(self.random.choice(TYPES))
+            return self.random.choice(['in', 'out'])
+
+        # SemanticAnalyzer takes an ELSE only while the last IF or ELSE
+        # written is an IF, so not after an IF whose block has one
+        control = ['if', 'while', 'for'] + (['else'] if after_if and self.last_branch == 'if' else [])
+        control = self.random.choice(control)
+        if control in ('if', 'else'):
+            self.last_branch = control
+        if control == 'for':
+            self.name = self.variable('int')
+        elif control != 'else':
+            self.name = self.variable('bool')
+        self.blocks.append(Block(control, self.random.randint(1, self.block_size)))
+        self.scopes.append([])
+        return control
+
+    def choose_expression(self):
+        type_name, assigned = self.wanted.pop()
+        kinds = list(EXPRESSION_KINDS)
+        if len(self.arguments) >= self.max_expression_depth:
+            kinds.remove('call')
+        kind = self.weighted(kinds)
+
+        if kind == 'variable':
+            # Only a variable converts between int and float on assignment
+            if assigned and type_name != 'bool':
+                type_name = self.random.choice(['int', 'float'])
+            self.name = self.variable(type_name)
+            return 'id'
+        if kind == 'literal':
+            if type_name == 'bool':
+                return self.random.choice(['true', 'false'])
+            number = str(self.random.randint(1, 999))
+            if type_name == 'float':
+                number += f".{self.random.randint(0, 99)}"
+            # The lexer reads every signed number as nim_sin_float
+            if type_name == 'float' and self.random.random() < 0.25:
+                self.literal = '-' + number
+                return 'nim_sin_float'
+            self.literal = number
+            return 'num_' + type_name
+
+        function, argument_types = self.call(type_name)
+        for argument_type in reversed(argument_types):
+            self.wanted.append((argument_type, False))
+        self.arguments.append(len(argument_types))
+        return function.lower()
+
+    # Function and argument types of a call returning type_name, checked
+    # against the analyzer's own rules
+    def call(self, type_name):
+        choice = self.random.choice
+        if type_name == 'bool':
+            function = choice(['AND', 'OR', 'NOT', 'HIGH', 'LOW', 'EQUAL'])
+            count = self.analyzer.FUNCTION_ARG_COUNTS[function]
+            if function in ('AND', 'OR', 'NOT'):
+                argument_types = ['bool'] * count
+            else:
+                argument_types = [choice(['int', 'float']) for _ in range(count)]
+        else:
+            function = choice(['ADD', 'SUB', 'MUL', 'DIV'])
+            count = self.analyzer.FUNCTION_ARG_COUNTS[function]
+            argument_types = ['int'] * count
+            if type_name == 'float':
+                argument_types = [choice(['int', 'float']) for _ in range(count)]
+                argument_types[self.random.randrange(count)] = 'float'
+        if self.analyzer.check_function_args(function, argument_types) != type_name:
+            raise Exception(f"{function}({', '.join(argument_types)}) does not return {type_name}")
+        return function, argument_types
+
+    # Another argument, or the end of the innermost call
+    def choose_argument_tail(self):
+        self.arguments[-1] -= 1
+        if self.arguments[-1]:
+            return 'virgula'
+        self.arguments.pop()
+        return 'par_dir'
+
+def generate(size, seed=None, **options):
+    return Generator(seed, **options).generate(size)
+
+# Parses name=weight,... into a mix dict
+def parse_mix(text):
+    mix = {}
+    for entry in text.split(','):
+        name, _, weight = entry.partition('=')
+        try:
+            mix[name.strip()] = float(weight)
+        except ValueError:
+            raise Exception(f"Malformed mix entry '{entry}', expected name=weight")
+    return mix
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a large valid JAL program")
+    parser.add_argument('--size', type=float, default=1, help="program size in MB")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--depth', type=int, default=4, help="deepest nesting of control structures")
+    parser.add_argument('--expression-depth', type=int, default=3, help="deepest nesting of function calls")
+    parser.add_argument('--block-size', type=int, default=8, help="most statements in a nested block")
+    parser.add_argument('--mix', default=None,
+                        help="weights as name=weight,... for " + ', '.join(DEFAULT_MIX))
+    parser.add_argument('-o', '--output', default=None, help="write the program here (default: stdout)")
+    parser.add_argument('--check', action='store_true', help="compile the program and report any error")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix) if args.mix else None
+        start = time.perf_counter()
+        generator = Generator(args.seed, args.depth, args.expression_depth, args.block_size, mix)
+        source = generator.generate(int(args.size * 1024 * 1024))
+        elapsed = time.perf_counter() - start
+    except Exception as error:
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            file.write(source)
+    else:
+        sys.stdout.write(source)
+    print(f"{len(source)} characters, {source.count(chr(10))} lines, {generator.declared} variables "
+          f"in {elapsed:.2f}s", file=sys.stderr)
+
+    if args.check:
+        from compiler import compile_source
+
+        result = compile_source(source=source)
+        for phase, line, message in result.diagnostics:
+            print(f"line {line}: {phase} error: {message}", file=sys.stderr)
+        if not result.success:
+            sys.exit(1)
+        print(f"Compiled to {len(result.ir)} ETAC instructions", file=sys.stderr)
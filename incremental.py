@@ -0,0 +1,215 @@
+from lexico import lexic_stream, terminal_ids
+from ll1 import load_table
+from semantico import SemanticAnalyzer
+from syntax_tree import TreeBuilder
+from token_store import Interner
+
+# Tokens of a document kept one list per line. A token never spans lines,
+# so an edit only rescans the lines it touches. Line numbers are not stored
+# with the tokens: they come from the position of the line in the document,
+# which is what makes the lines below an edit shift for free. The code is
+# given as text or as a list of lines.
+class LexedDocument:
+    def __init__(self, code):
+        self.lines = []
+        self.line_tokens = []        # (lexeme, kind) pairs of each line
+        self.line_errors = []        # Unknown characters of each line
+        if isinstance(code, str):
+            code = code.splitlines(True)
+        self.replace(0, 0, list(code))
+
+    # Scan one line into its token pairs and error characters
+    def scan(self, line):
+        errors = []
+        tokens = [(lexeme, kind) for lexeme, kind, _ in lexic_stream((line,), errors)]
+        return tokens, [character for _, character in errors]
+
+    # Replace the old lines [start, end) (0-based) with new_lines
+    def replace(self, start, end, new_lines):
+        scanned = [self.scan(line) for line in new_lines]
+        self.lines[start:end] = new_lines
+        self.line_tokens[start:end] = [tokens for tokens, _ in scanned]
+        self.line_errors[start:end] = [errors for _, errors in scanned]
+
+    # Apply edits given as (start, end, new_lines): the old lines start to
+    # end - 1 (1-based, end == start inserts) become new_lines. All ranges
+    # refer to the document before the edit and must not overlap. Returns
+    # the changed ranges renumbered to the edited document, as (start, end)
+    # pairs in line order.
+    def edit(self, changes):
+        changes = sorted(changes, key=lambda change: (change[0], change[1]))
+        previous_end = 1
+        for start, end, _ in changes:
+            if start < previous_end or end < start or end > len(self.lines) + 1:
+                raise Exception(f"Invalid edit range {start}-{end}")
+            previous_end = end
+
+        # Bottom-up, so the ranges above stay valid while editing
+        for start, end, new_lines in reversed(changes):
+            if isinstance(new_lines, str):
+                new_lines = new_lines.splitlines(True)
+            self.replace(start - 1, end - 1, list(new_lines))
+
+        changed = []
+        shift = 0
+        for start, end, new_lines in changes:
+            count = len(new_lines.splitlines(True)) if isinstance(new_lines, str) else len(new_lines)
+            changed.append((start + shift, start + shift + count))
+            shift += count - (end - start)
+        return changed
+
+    def __len__(self):
+        return len(self.lines)
+
+    # Same (lexeme, kind, line) stream lexic_regex gives for the whole text
+    def tokens(self, first_line=1):
+        line_tokens = self.line_tokens
+        for index in range(first_line - 1, len(line_tokens)):
+            line_num = index + 1
+            for lexeme, kind in line_tokens[index]:
+                yield (lexeme, kind, line_num)
+
+    def errors(self):
+        return [(index + 1, character)
+                for index, characters in enumerate(self.line_errors) if characters
+                for character in characters]
+
+    def text(self):
+        return ''.join(self.lines)
+
+# Minimum number of lines between two parser checkpoints
+CHECKPOINT_INTERVAL = 16
+
+# A LexedDocument that is also kept parsed and checked by semantico.
+# At the start of a line between two top-level statements, the parser state
+# (LL stack, tree builder and analyzer snapshots) is checkpointed in
+# line_checkpoints, which moves with its line like the tokens do. An edit
+# resumes parsing at the last checkpoint before the change, and stops as
+# soon as it reaches a checkpoint of the previous run, past the change,
+# with the same state: from there on the old run is still valid.
+class CheckedDocument(LexedDocument):
+    def __init__(self, code, interval=CHECKPOINT_INTERVAL):
+        self.table = load_table()
+        self.interval = interval
+        self.interner = Interner()
+        self.line_checkpoints = []
+        self.error = None            # (line, message) of a failed check
+        self.reparsed = 0            # Lines parsed by the last edit
+        LexedDocument.__init__(self, code)
+
+        analyzer = SemanticAnalyzer(self.interner)
+        builder = TreeBuilder(analyzer.visit_statement, keep_tree=False)
+        self.start_state = ((self.table.end, self.table.start), builder.snapshot(), analyzer.snapshot())
+        if self.lines:
+            self.line_checkpoints[0] = self.start_state
+        self.reparse(0, self.start_state, len(self.lines) + 1, 0)
+
+    def replace(self, start, end, new_lines):
+        LexedDocument.replace(self, start, end, new_lines)
+        self.line_checkpoints[start:end] = [None] * len(new_lines)
+
+    def edit(self, changes):
+        # Resume from the last checkpoint at or before the first changed line
+        first = min((change[0] for change in changes), default=None)
+        if first is None:
+            return []
+        resume = min(first, len(self.lines)) - 1
+        while resume > 0 and self.line_checkpoints[resume] is None:
+            resume -= 1
+        resume = max(resume, 0)
+        if resume < len(self.lines) and self.line_checkpoints[resume] is not None:
+            state = self.line_checkpoints[resume]
+        else:
+            state = self.start_state
+
+        length = len(self.lines)
+        changed = LexedDocument.edit(self, changes)
+        if resume < len(self.lines):
+            self.line_checkpoints[resume] = state
+        self.reparse(resume, state, changed[-1][1] - 1, len(self.lines) - length)
+        return changed
+
+    # Parse the lines from index on, starting from a checkpoint state. Past
+    # line index resync, a checkpoint equal to the one left there by the
+    # previous run ends the parse early, keeping its error moved by the
+    # shift_lines the edit added.
+    def reparse(self, index, state, resync, shift_lines):
+        stack, builder_state, analyzer_state = state
+        stack = list(stack)
+        analyzer = SemanticAnalyzer(self.interner)
+        analyzer.restore(analyzer_state)
+        builder = TreeBuilder(analyzer.visit_statement, keep_tree=False)
+        builder.restore(builder_state)
+
+        rows = self.table.rows
+        end = self.table.end
+        identifier = terminal_ids['id']
+        intern = self.interner.intern
+        action = builder.shift
+        line_tokens = self.line_tokens
+        checkpoints = self.line_checkpoints
+        interval = self.interval
+
+        last_checkpoint = index
+        first = index
+        old_error = self.error
+        self.error = None
+        try:
+            while index < len(line_tokens):
+                if index != first:
+                    if builder.at_top_level():
+                        old = checkpoints[index]
+                        if index >= resync and old is not None:
+                            state = (tuple(stack), builder.snapshot(), analyzer.snapshot())
+                            if state == old:
+                                # Same state as the old run: its outcome stands
+                                self.reparsed = index - first
+                                if old_error is not None and old_error[0] is not None:
+                                    old_error = (old_error[0] + shift_lines, old_error[1])
+                                self.error = old_error
+                                return
+                        if index - last_checkpoint >= interval:
+                            checkpoints[index] = (tuple(stack), builder.snapshot(), analyzer.snapshot())
+                            last_checkpoint = index
+                        else:
+                            checkpoints[index] = None
+                    else:
+                        checkpoints[index] = None
+
+                line = index + 1
+                for lexeme, kind in line_tokens[index]:
+                    current = terminal_ids[kind]
+                    while True:
+                        top = stack[-1]
+                        if top == current:
+                            action(kind, intern(lexeme) if current == identifier else lexeme, line)
+                            stack.pop()
+                            break
+                        row = rows[top]
+                        production = row[current] if row is not None else None
+                        if production is None:
+                            raise Exception(f"Syntax error: Unexpected {kind}")
+                        stack.pop()
+                        stack.extend(production)
+                index += 1
+
+            # End of input
+            while stack:
+                top = stack[-1]
+                if top == end:
+                    action('$', None, None)
+                    stack.pop()
+                    break
+                row = rows[top]
+                production = row[end] if row is not None else None
+                if production is None:
+                    raise Exception("Syntax error: Unexpected $")
+                stack.pop()
+                stack.extend(production)
+        except Exception as error:
+            if not hasattr(error, 'position'):
+                error.position = index + 1 if index < len(line_tokens) else None
+            self.error = (error.position, str(error))
+            # Checkpoints past the error belong to the old run
+            checkpoints[index + 1:] = [None] * max(0, len(checkpoints) - index - 1)
+        self.reparsed = index - first
@@ -0,0 +1,123 @@
+import os
+import socket
+import sys
+import time
+
+from protocol import default_socket_path, recv_frame, send_frame
+
+DAEMON = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'daemon.py')
+
+USAGE = "usage: jalc.py [--check] [-O] [--stats] [--socket PATH] [--no-spawn] [--shutdown] file"
+
+def connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+# Connect to the daemon, starting it in the background if it is not running
+def connect_or_spawn(path, spawn, timeout=10.0):
+    sock = connect(path)
+    if sock is not None or not spawn:
+        return sock
+
+    # Only paid when the daemon has to be started
+    import subprocess
+    subprocess.Popen([sys.executable, DAEMON, '--socket', path], start_new_session=True,
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        sock = connect(path)
+        if sock is not None:
+            return sock
+    return None
+
+# Send one compile request, retried once in case the daemon was shutting
+# down when we connected
+def compile_remote(options, source):
+    for _ in range(2):
+        sock = connect_or_spawn(options['socket'], options['spawn'])
+        if sock is None:
+            return None
+        try:
+            with sock:
+                send_frame(sock, {'op': 'compile', 'source': source, 'check': options['check'],
+                                  'optimize': options['optimize'], 'stats': options['stats']})
+                reply = recv_frame(sock)
+                if options['shutdown']:
+                    send_frame(sock, {'op': 'shutdown'})
+                    recv_frame(sock)
+        except OSError:
+            time.sleep(0.05)
+            continue
+        if reply is not None:
+            return reply
+    return None
+
+# Command line parsed by hand, argparse alone costs more than a compile
+def parse_args(argv):
+    options = {'check': False, 'optimize': False, 'stats': False, 'socket': default_socket_path(), 'spawn': True, 'shutdown': False, 'file': None}
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument == '--check':
+            options['check'] = True
+        elif argument == '-O':
+            options['optimize'] = True
+        elif argument == '--stats':
+            options['stats'] = True
+        elif argument == '--socket':
+            options['socket'] = next(arguments, None)
+        elif argument == '--no-spawn':
+            options['spawn'] = False
+        elif argument == '--shutdown':
+            options['shutdown'] = True
+        elif options['file'] is None and not argument.startswith('--'):
+            options['file'] = argument
+        else:
+            options['file'] = None
+            break
+    if options['file'] is None or options['socket'] is None:
+        print(USAGE, file=sys.stderr)
+        sys.exit(2)
+    return options
+
+# Thin client for the compile daemon, a drop-in for 'python ETAC.py file.j'
+if __name__ == "__main__":
+    options = parse_args(sys.argv[1:])
+
+    try:
+        with open(options['file'], 'r') as file:
+            source = file.read()
+    except FileNotFoundError:
+        print("File not found")
+        sys.exit(1)
+
+    reply = compile_remote(options, source)
+    if reply is None:
+        print(f"Cannot reach the compile daemon on {options['socket']}", file=sys.stderr)
+        sys.exit(2)
+
+    if 'stats' in reply:
+        import json
+        json.dump(reply['stats'], sys.stderr, indent=2)
+        sys.stderr.write('\n')
+
+    # Same report as ETAC.py
+    failure = None
+    for phase, line, message in reply['diagnostics']:
+        if phase == 'lexic':
+            print("Erro encontrado na linha", line)
+        elif failure is None:
+            failure = message
+    if failure is not None:
+        print(f"Semantic Error: {failure}")
+        sys.exit(1)
+
+    print("Compilation successful!\n")
+    print("Generated ETAC Code:")
+    for line in reply['etac']:
+        print(line)
@@ -1,3 +1,4 @@
+import re
 import sys
 
 # Token Table
@@ -17,7 +18,7 @@ token_table = [
     ("NOT", "not"),
     ("AND", "and"),
     ("OR", "or"),
-    ("IN", "int"),
+    ("IN", "in"),
     ("OUT", "out"),
     ("IF", "if"),
     ("ELSE", "else"),
@@ -37,6 +38,32 @@ token_table = [
 # Symbol list
 symbols = ['(', ')', '{', '}', ',', ';', '=']
 
+# Keyword and symbol lookup, built once instead of per token
+token_dict = dict(token_table)
+
+# Terminal kinds the lexer produces (plus the end marker), indexed by id
+terminals = [sys.intern(kind) for kind in dict.fromkeys(
+    [kind for _, kind in token_table] +
+    ['in', 'id', 'num_int', 'num_float', 'nim_sin_int', 'nim_sin_float', '$']
+)]
+terminal_ids = {kind: index for index, kind in enumerate(terminals)}
+
+# Master pattern for the table-driven scanner, one group per lexical class
+# in the same order lexic tests them
+master_pattern = re.compile(
+    r'(?P<space>\s+)'
+    r'|(?P<comment>#[^\n]*)'
+    r'|(?P<word>[^\W\d_][^\W_]*)'
+    r'|(?P<symbol>[' + ''.join(re.escape(symbol) for symbol in symbols) + r'])'
+    r'|(?P<number>\d[\d.]*)'
+    r'|(?P<signed>-\d[\d.]*)'
+    r'|(?P<dash>-)'
+    r'|(?P<error>.)'
+)
+
+# Same pattern over raw bytes, for scanning memory-mapped files
+master_pattern_bytes = re.compile(master_pattern.pattern.encode())
+
 def keywords_var(count, line, token_list, line_num, token_table):
     
     # Make the table into a dictionary
@@ -173,3 +200,56 @@ def lexic(code):
         line_num += 1
     
     return tokens
+
+
+def lexic_stream(code, errors=None):
+    line_num = 0
+
+    # Same input as lexic, but any iterable of lines (an open file too),
+    # scanned one line at a time and yielded lazily
+    for line in code:
+        line_num += 1
+
+        for match in master_pattern.finditer(line):
+            kind = match.lastgroup
+
+            # Keyword or variable
+            if kind == 'word':
+                lexeme = match.group()
+                yield (lexeme, token_dict.get(lexeme, 'id'), line_num)
+
+            # Symbol
+            elif kind == 'symbol':
+                lexeme = match.group()
+                yield (lexeme, token_dict[lexeme], line_num)
+
+            # Number, float if it has a dot
+            elif kind == 'number':
+                lexeme = match.group()
+                yield (lexeme, 'num_float' if '.' in lexeme else 'num_int', line_num)
+
+            # Signalized number (lexic tags both forms as nim_sin_float)
+            elif kind == 'signed':
+                yield (match.group(), 'nim_sin_float', line_num)
+
+            # Unknown character, collected as (line, character) when an
+            # errors list is given
+            elif kind == 'error':
+                if errors is None:
+                    print("Erro encontrado na linha", line_num)
+                else:
+                    errors.append((line_num, match.group()))
+
+def lexic_regex(code, errors=None):
+    return list(lexic_stream(code, errors))
+
+# Tokens of a file, read line by line while they are consumed
+def read_tokens(filepath, errors=None):
+    with open(filepath, 'r') as file:
+        yield from lexic_stream(file, errors)
+
+# Available scanner engines
+lexers = {
+    'classic': lexic,
+    'regex': lexic_regex
+}
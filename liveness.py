@@ -0,0 +1,119 @@
+import sys
+
+from cfg import build_cfg
+from etac_ir import COPY, DECL, GOTO, IN, JUMPS, LABEL, NOT, OUT, TEMP, render_instruction
+
+# Temporaries instruction index reads and the one it writes (or None)
+def temp_uses(ir, index):
+    op = ir.ops[index]
+    if op == LABEL or op == GOTO:
+        return (), None
+    kinds = ir.operand_kinds
+    if op == IN:
+        operands = ()
+    elif op in JUMPS or op == DECL or op == COPY or op == NOT or op == OUT:
+        operands = (ir.lefts[index],)
+    else:
+        operands = (ir.lefts[index], ir.rights[index])
+    reads = tuple(operand for operand in operands if kinds[operand] == TEMP)
+    if op in JUMPS or op == OUT:
+        return reads, None
+    dest = ir.dests[index]
+    return reads, dest if kinds[dest] == TEMP else None
+
+# Temporaries live on entry to and on exit from each block, by backward
+# dataflow over the control flow graph until nothing changes. Variables
+# are left out, they keep their storage for the whole program.
+def block_liveness(ir, blocks=None):
+    blocks = blocks if blocks is not None else build_cfg(ir)
+    uses = []
+    defs = []
+    for block in blocks:
+        used = set()
+        defined = set()
+        for index in range(block.start, block.end):
+            reads, write = temp_uses(ir, index)
+            used.update(read for read in reads if read not in defined)
+            if write is not None:
+                defined.add(write)
+        uses.append(used)
+        defs.append(defined)
+
+    live_in = [set() for _ in blocks]
+    live_out = [set() for _ in blocks]
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(blocks):
+            index = block.index
+            out = set()
+            for successor in block.successors:
+                out |= live_in[successor]
+            entry = uses[index] | (out - defs[index])
+            if out != live_out[index] or entry != live_in[index]:
+                live_out[index] = out
+                live_in[index] = entry
+                changed = True
+    return live_in, live_out
+
+# Range [start, end] over which each temporary is live, as a dict of temp
+# operand to [start, end]. Instruction i reads at point 2 * i and writes at
+# 2 * i + 1, so a temporary read for the last time by an instruction does
+# not overlap the one it writes. A temporary live across a block boundary
+# covers the whole block, so one live around a loop covers the loop.
+def live_intervals(ir, blocks=None):
+    blocks = blocks if blocks is not None else build_cfg(ir)
+    live_in, live_out = block_liveness(ir, blocks)
+    intervals = {}
+
+    def extend(temp, position):
+        interval = intervals.get(temp)
+        if interval is None:
+            intervals[temp] = [position, position]
+        elif position < interval[0]:
+            interval[0] = position
+        elif position > interval[1]:
+            interval[1] = position
+
+    for block in blocks:
+        for temp in live_in[block.index]:
+            extend(temp, 2 * block.start)
+        for temp in live_out[block.index]:
+            extend(temp, 2 * block.end - 1)
+        for index in range(block.start, block.end):
+            reads, write = temp_uses(ir, index)
+            for temp in reads:
+                extend(temp, 2 * index)
+            if write is not None:
+                extend(write, 2 * index + 1)
+    return intervals
+
+# Most temporaries live at the same point
+def peak_pressure(intervals):
+    events = []
+    for start, end in intervals.values():
+        events.append((start, 1))
+        events.append((end + 1, -1))
+    events.sort()
+    live = peak = 0
+    for _, change in events:
+        live += change
+        peak = max(peak, live)
+    return peak
+
+# Print the ETAC of a file with the temporaries live after each instruction
+if __name__ == "__main__":
+    from compiler import compile_source
+    from etac_ir import operand_text
+
+    result = compile_source(path=sys.argv[1], check=False)
+    for phase, line, message in result.diagnostics:
+        print(f"{phase} error at {line}: {message}")
+    if result.ir is not None and not result.diagnostics:
+        ir = result.ir
+        intervals = live_intervals(ir)
+        for index in range(len(ir)):
+            point = 2 * index + 1
+            live = sorted(operand_text(ir, temp) for temp, (start, end) in intervals.items() if start <= point <= end)
+            print(f"{render_instruction(ir, index):<40} # {' '.join(live)}")
+        print(f"{len(intervals)} temporaries, at most {peak_pressure(intervals)} live at once", file=sys.stderr)
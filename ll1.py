@@ -0,0 +1,393 @@
+import hashlib
+import os
+import pickle
+import sys
+
+from lexico import terminal_ids, terminals
+from token_store import Interner
+
+GRAMMAR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gramatica.txt')
+
+# Bumped whenever the pickled ParseTable layout changes
+CACHE_VERSION = 1
+
+# Tables already loaded by this process, by cache key
+loaded_tables = {}
+
+# Dense integer form of an LL(1) parsing table.
+# Grammar symbols are numbered with the lexer terminal ids first, then the
+# non-terminals in table order. rows[symbol][terminal] is the production to
+# push for a non-terminal, already reversed and without 'vazio', or None on
+# a syntax error; rows[symbol] is None for terminals.
+class ParseTable:
+    def __init__(self, parsing_table, conflicts=()):
+        self.parsing_table = parsing_table
+        self.conflicts = list(conflicts)
+        self.terminal_count = len(terminals)
+        self.symbols = list(terminals) + list(parsing_table)
+        self.symbol_ids = {symbol: index for index, symbol in enumerate(self.symbols)}
+        self.start = self.symbol_ids[next(iter(parsing_table))]
+        self.end = terminal_ids['$']
+
+        self.productions = {}
+        self.rows = [None] * len(self.symbols)
+        for non_terminal, entries in parsing_table.items():
+            row = [None] * self.terminal_count
+            for terminal, production in entries.items():
+                if terminal not in terminal_ids:
+                    raise Exception(f"Unknown terminal '{terminal}' in table entry for {non_terminal}")
+                row[terminal_ids[terminal]] = self.compile_production(production)
+            self.rows[self.symbol_ids[non_terminal]] = row
+
+    def compile_production(self, production):
+        symbols = []
+        for symbol in reversed(production):
+            if symbol == 'vazio':
+                continue
+            if symbol not in self.symbol_ids:
+                raise Exception(f"Unknown grammar symbol '{symbol}'")
+            symbols.append(self.symbol_ids[symbol])
+        compiled = tuple(symbols)
+
+        # Identical right-hand sides share one tuple
+        return self.productions.setdefault(compiled, compiled)
+
+    def name(self, symbol):
+        return self.symbols[symbol]
+
+# Interner the identifiers of a token stream end up in: the store's own, or
+# a fresh one for plain token streams
+def stream_interner(input_tokens):
+    interner = getattr(input_tokens, 'interner', None)
+    return interner if interner is not None else Interner()
+
+# Table-driven LL(1) loop. Tokens are pulled one at a time and every matched
+# terminal is handed to each action as action(name, lexeme, position),
+# identifiers as their symbol id in interner. The position is the token's
+# line, or its source offset for token stores and mapped streams (see
+# token_store), whose line() gives the line. Errors are raised with the
+# position of the lookahead they were found at, unless the action that
+# raised them already gave one.
+def drive(table, input_tokens, actions, interner):
+    if getattr(input_tokens, 'kinds', None) is not None:
+        return drive_store(table, input_tokens, actions)
+
+    # Token streams with an interner hand out terminal ids and interned
+    # symbol ids, plain token streams names of both
+    intern = None
+    if getattr(input_tokens, 'interner', None) is None:
+        intern = interner.intern
+        input_tokens = ((lexeme, terminal_ids[kind], line) for lexeme, kind, line in input_tokens)
+
+    # Pull tokens one at a time, so a generator is never materialised
+    tokens = iter(input_tokens)
+    lookahead = next(tokens, None)
+    rows = table.rows
+    identifier = terminal_ids['id']
+    stack = [table.end, table.start]
+
+    try:
+        while stack:
+            top = stack[-1]
+            if lookahead is None:
+                current_lexeme, current_input = None, table.end
+            else:
+                current_lexeme, current_input, _ = lookahead
+
+            # Terminal handling, actions work on the terminal name
+            if top == current_input:
+                if top == identifier and intern:
+                    current_lexeme = intern(current_lexeme)
+                name = terminals[top]
+                position = lookahead[2] if lookahead is not None else None
+                for action in actions:
+                    action(name, current_lexeme, position)
+
+                stack.pop()
+                lookahead = next(tokens, None)
+
+            # Non-terminal handling, productions come reversed and without vazio
+            elif rows[top] is not None:
+                production = rows[top][current_input]
+                if production is None:
+                    raise Exception(f"Syntax error: Unexpected {terminals[current_input]}")
+                stack.pop()
+                stack.extend(production)
+
+            # Error case
+            else:
+                raise Exception(f"Syntax error: Unexpected {terminals[current_input]}")
+    except Exception as error:
+        if not hasattr(error, 'position'):
+            error.position = lookahead[2] if lookahead is not None else None
+        raise
+
+# drive over the columns of a TokenStore, read by index so no tuple is
+# built per token. Errors also get the index of the token the parse stopped
+# on, as token_index, or None at the end of the input.
+def drive_store(table, store, actions):
+    kinds = store.kinds
+    values = store.values
+    positions = store.positions
+    literals = store.literals
+    count = len(kinds)
+    rows = table.rows
+    end = table.end
+    identifier = terminal_ids['id']
+    stack = [end, table.start]
+    pop = stack.pop
+    push = stack.extend
+    index = 0
+    current_input = kinds[0] if count else end
+
+    try:
+        while stack:
+            top = stack[-1]
+
+            # Non-terminal handling, productions come reversed and without vazio
+            row = rows[top]
+            if row is not None:
+                production = row[current_input]
+                if production is None:
+                    raise Exception(f"Syntax error: Unexpected {terminals[current_input]}")
+                pop()
+                push(production)
+
+            # Terminal handling, identifiers as their symbol id and
+            # literals as their lexeme
+            elif top == current_input:
+                if index < count:
+                    value = values[index]
+                    if top != identifier:
+                        value = literals[value] if value >= 0 else None
+                    position = positions[index]
+                else:
+                    value = position = None
+                name = terminals[top]
+                for action in actions:
+                    action(name, value, position)
+
+                pop()
+                index += 1
+                current_input = kinds[index] if index < count else end
+
+            # Error case
+            else:
+                raise Exception(f"Syntax error: Unexpected {terminals[current_input]}")
+    except Exception as error:
+        if not hasattr(error, 'position'):
+            error.position = positions[index] if index < count else None
+        error.token_index = index if index < count else None
+        raise
+
+# Work drive does on a sequence of terminal ids, counted by replaying its
+# stack moves: table lookups, symbols pushed and symbols popped. Stops
+# where drive would raise a syntax error, or when the token at index stop
+# is matched, for a parse an action stopped there. Kept apart from drive
+# so the parser pays nothing for it.
+def count_parse(table, kinds, stop=None):
+    rows = table.rows
+    stack = [table.end, table.start]
+    lookups = pops = 0
+    pushes = len(stack)
+    kinds = iter(kinds)
+    current = next(kinds, table.end)
+    index = 0
+    while stack:
+        top = stack[-1]
+        if top == current:
+            if index == stop:
+                break
+            stack.pop()
+            pops += 1
+            current = next(kinds, table.end)
+            index += 1
+        elif rows[top] is not None:
+            lookups += 1
+            production = rows[top][current]
+            if production is None:
+                break
+            stack.pop()
+            pops += 1
+            stack.extend(production)
+            pushes += len(production)
+        else:
+            break
+    return {'table_lookups': lookups, 'stack_pushes': pushes, 'stack_pops': pops}
+
+# Read a BNF grammar into {non_terminal: [alternative, ...]} in file order.
+# Each alternative is a list of symbols, empty for vazio.
+def read_grammar(text):
+    grammar = {}
+    current = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if '::=' in line:
+            head, body = line.split('::=', 1)
+            current = head.strip().strip('<>')
+            grammar[current] = []
+        elif line.startswith('|') and current:
+            body = line
+        else:
+            raise Exception(f"Malformed grammar line: {line}")
+
+        for alternative in body.split('|'):
+            symbols = [symbol.strip('<>') for symbol in alternative.split()]
+            if symbols:
+                grammar[current].append([symbol for symbol in symbols if symbol != 'vazio'])
+    return grammar
+
+# FIRST of a sequence of symbols, 'vazio' in it if the sequence can be empty
+def sequence_first(symbols, first):
+    result = set()
+    for symbol in symbols:
+        if symbol not in first:
+            result.add(symbol)
+            return result
+        result |= first[symbol] - {'vazio'}
+        if 'vazio' not in first[symbol]:
+            return result
+    result.add('vazio')
+    return result
+
+def first_sets(grammar):
+    first = {non_terminal: set() for non_terminal in grammar}
+    changed = True
+    while changed:
+        changed = False
+        for non_terminal, alternatives in grammar.items():
+            for alternative in alternatives:
+                symbols = sequence_first(alternative, first)
+                if not symbols <= first[non_terminal]:
+                    first[non_terminal] |= symbols
+                    changed = True
+    return first
+
+def follow_sets(grammar, first, start):
+    follow = {non_terminal: set() for non_terminal in grammar}
+    follow[start].add('$')
+    changed = True
+    while changed:
+        changed = False
+        for non_terminal, alternatives in grammar.items():
+            for alternative in alternatives:
+                for index, symbol in enumerate(alternative):
+                    if symbol not in grammar:
+                        continue
+                    rest = sequence_first(alternative[index + 1:], first)
+                    symbols = rest - {'vazio'}
+                    if 'vazio' in rest:
+                        symbols |= follow[non_terminal]
+                    if not symbols <= follow[symbol]:
+                        follow[symbol] |= symbols
+                        changed = True
+    return follow
+
+# Build the dict-of-dicts LL(1) table and the list of conflicts found.
+# On a conflict the production that consumes input wins over vazio, which
+# is how the block-closing char_dir and END are told apart in <code>.
+def build_table(grammar):
+    start = next(iter(grammar))
+    first = first_sets(grammar)
+    follow = follow_sets(grammar, first, start)
+
+    parsing_table = {non_terminal: {} for non_terminal in grammar}
+    conflicts = []
+    for non_terminal, alternatives in grammar.items():
+        entries = parsing_table[non_terminal]
+        for alternative in alternatives:
+            production = alternative or ['vazio']
+            lookaheads = sequence_first(alternative, first)
+            if 'vazio' in lookaheads:
+                lookaheads = (lookaheads - {'vazio'}) | follow[non_terminal]
+
+            for terminal in sorted(lookaheads):
+                existing = entries.get(terminal)
+                if existing is None:
+                    entries[terminal] = production
+                    continue
+                conflicts.append((non_terminal, terminal, existing, production))
+                if existing == ['vazio']:
+                    entries[terminal] = production
+    return parsing_table, conflicts
+
+def generate_table(text):
+    parsing_table, conflicts = build_table(read_grammar(text))
+    return ParseTable(parsing_table, conflicts)
+
+def report_conflicts(table, out=sys.stdout):
+    for non_terminal, terminal, existing, production in table.conflicts:
+        kept = production if table.parsing_table[non_terminal][terminal] is production else existing
+        print(f"LL(1) conflict in <{non_terminal}> on '{terminal}': "
+              f"{' '.join(existing)} / {' '.join(production)}, kept {' '.join(kept)}", file=out)
+
+# Cache key: grammar text, the terminal numbering baked into the rows and
+# the artifact layout
+def grammar_key(text):
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_VERSION}\n".encode())
+    digest.update(' '.join(terminals).encode())
+    digest.update(b'\n')
+    digest.update(text.encode())
+    return digest.hexdigest()
+
+def artifact_path(path, key):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(path)), '.ll1_cache', f"{stem}.{key[:16]}.pickle")
+
+# Write the compiled table atomically and drop artifacts of older grammars
+def write_artifact(table, artifact):
+    directory = os.path.dirname(artifact)
+    stem = os.path.basename(artifact).split('.')[0]
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temporary = f"{artifact}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as file:
+            pickle.dump(table, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, artifact)
+        for name in os.listdir(directory):
+            stale = os.path.join(directory, name)
+            if name.startswith(stem + '.') and name.endswith('.pickle') and stale != artifact:
+                os.remove(stale)
+    except OSError:
+        # A read-only checkout just rebuilds the table on every start
+        pass
+
+# Compiled table for a grammar file, from the cache when the grammar has
+# not changed since it was built
+def load_table(path=GRAMMAR_PATH):
+    with open(path, 'r') as file:
+        text = file.read()
+    key = grammar_key(text)
+    if key in loaded_tables:
+        return loaded_tables[key]
+
+    artifact = artifact_path(path, key)
+    try:
+        with open(artifact, 'rb') as file:
+            table = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+        table = generate_table(text)
+        write_artifact(table, artifact)
+
+    loaded_tables[key] = table
+    return table
+
+# Regenerate the table, report conflicts and refresh the cached artifact.
+# Run as a script this module is __main__; the table is built through the
+# imported ll1 so the artifact pickles ll1.ParseTable, which load_table
+# can find.
+if __name__ == "__main__":
+    import ll1
+
+    path = sys.argv[1] if len(sys.argv) > 1 else ll1.GRAMMAR_PATH
+    with open(path, 'r') as file:
+        text = file.read()
+    table = ll1.generate_table(text)
+    ll1.report_conflicts(table)
+    artifact = ll1.artifact_path(path, ll1.grammar_key(text))
+    ll1.write_artifact(table, artifact)
+    print(f"{len(table.parsing_table)} non-terminals, {len(table.productions)} productions, "
+          f"{len(table.conflicts)} conflicts resolved -> {artifact}")
@@ -0,0 +1,262 @@
+import sys
+
+from cfg import build_cfg, reachable
+from etac_ir import (COPY, DECL, DIV, GOTO, IF_TRUE, IN, JUMPS, LABEL, NO_OPERAND, NOT, OPERATORS, OUT,
+                     CONSTANT, TEMP, VARIABLE, constant_text, constant_type, constant_value, convert, evaluate,
+                     render)
+
+# Instructions that write their dest, as opposed to labels, jumps and OUT
+def writes(op):
+    return op != LABEL and op != OUT and op not in JUMPS
+
+# IN consumes input and division by zero stops the program, so a division
+# is only removable when it divides by a nonzero constant
+def has_effects(ir, row):
+    if row[0] == IN:
+        return True
+    if row[0] != DIV or ir.operand_kinds[row[4]] != CONSTANT:
+        return row[0] == DIV
+    try:
+        return constant_value(ir.operand_values[row[4]]) == 0
+    except ValueError:
+        return True
+
+# Operands instruction row reads
+def reads(row):
+    op, _, _, left, right = row
+    if op == LABEL or op == GOTO or op == IN:
+        return ()
+    if op in JUMPS or op == DECL or op == COPY or op == NOT or op == OUT:
+        return (left,)
+    return (left, right)
+
+def rows_of(ir):
+    return [[ir.ops[index], ir.types[index], ir.dests[index], ir.lefts[index], ir.rights[index]]
+            for index in range(len(ir))]
+
+def rebuild(ir, rows):
+    optimized = ir.derive()
+    for row in rows:
+        optimized.append(*row)
+    return optimized
+
+# Number of instructions reading each operand
+def use_counts(rows):
+    counts = {}
+    for row in rows:
+        for operand in reads(row):
+            counts[operand] = counts.get(operand, 0) + 1
+    return counts
+
+# Value type of every temporary and variable, from the instructions writing
+# it. Constants get the type their text has.
+def operand_types(rows):
+    types = {}
+    for op, type_id, dest, _, _ in rows:
+        if writes(op):
+            types[dest] = type_id
+    return types
+
+def value_type(ir, types, operand):
+    if ir.operand_kinds[operand] == CONSTANT:
+        return constant_type(ir.operand_values[operand])
+    return types.get(operand)
+
+# Constant operand holding the result of row, or None when it cannot be
+# computed at compile time
+def fold(ir, row):
+    op, type_id, _, left, right = row
+    operands = (left,) if op == NOT else (left, right)
+    if any(ir.operand_kinds[operand] != CONSTANT for operand in operands):
+        return None
+    try:
+        value = evaluate(op, type_id, *[constant_value(ir.operand_values[operand]) for operand in operands])
+    except (ValueError, ZeroDivisionError):
+        return None
+    text = constant_text(value)
+    # Results like inf or 1e-05 have no ETAC literal
+    if constant_type(text) != type_id:
+        return None
+    return ir.constant(text)
+
+# Constant folding and copy propagation inside each basic block: reads of
+# an operand copied from a constant or another operand of the same type
+# read the source instead, operators on constants become copies of their
+# result and jumps on a constant condition become a goto or nothing.
+def propagate_constants(ir):
+    rows = rows_of(ir)
+    types = operand_types(rows)
+    changed = False
+    for block in build_cfg(ir):
+        copies = {}
+        for index in range(block.start, block.end):
+            row = rows[index]
+            op = row[0]
+            if op == LABEL or op == GOTO:
+                continue
+            for column in (3, 4):
+                source = copies.get(row[column])
+                if source is not None:
+                    row[column] = source
+                    changed = True
+
+            if op == OUT:
+                continue
+            if op in JUMPS:
+                if ir.operand_kinds[row[3]] == CONSTANT:
+                    try:
+                        condition = bool(constant_value(ir.operand_values[row[3]]))
+                    except ValueError:
+                        continue
+                    taken = condition if op == IF_TRUE else not condition
+                    rows[index] = [GOTO, row[1], row[2], NO_OPERAND, NO_OPERAND] if taken else None
+                    changed = True
+                continue
+            if op in OPERATORS:
+                folded = fold(ir, row)
+                if folded is not None:
+                    row[:] = [COPY, row[1], row[2], folded, NO_OPERAND]
+                    changed = True
+
+            # The write ends the copies of and from dest
+            dest = row[2]
+            copies.pop(dest, None)
+            for operand in [operand for operand, source in copies.items() if source == dest]:
+                del copies[operand]
+            if (row[0] == DECL or row[0] == COPY) and row[3] != dest \
+                    and value_type(ir, types, row[3]) == row[1]:
+                copies[dest] = row[3]
+    return [row for row in rows if row is not None] if changed else None
+
+# t = a op b; x = t becomes x = a op b when that copy is the only read of t
+def forward_temps(ir):
+    rows = rows_of(ir)
+    counts = use_counts(rows)
+    definitions = {}
+    for op, _, dest, _, _ in rows:
+        if writes(op):
+            definitions[dest] = definitions.get(dest, 0) + 1
+    changed = False
+    for index in range(len(rows) - 1):
+        row, following = rows[index], rows[index + 1]
+        if row is None or not writes(row[0]) or following[0] != COPY:
+            continue
+        temp = row[2]
+        if ir.operand_kinds[temp] == TEMP and following[3] == temp and following[1] == row[1] \
+                and counts.get(temp) == 1 and definitions[temp] == 1:
+            row[2] = following[2]
+            rows[index + 1] = None
+            changed = True
+    return [row for row in rows if row is not None] if changed else None
+
+# Operand a declaration can take as its value in place of the copy row: the
+# copy's source when it has the declared type already, a constant
+# converted to that type, or None when neither works
+def declared_value(ir, types, row):
+    _, type_id, _, source, _ = row
+    if ir.operand_kinds[source] != CONSTANT:
+        return source if value_type(ir, types, source) == type_id else None
+    try:
+        text = constant_text(convert(type_id, constant_value(ir.operand_values[source])))
+    except (ValueError, OverflowError):
+        return None
+    return ir.constant(text) if constant_type(text) == type_id else None
+
+# Removes temporaries nobody reads, and stores to a variable that the same
+# block overwrites before reading it, except for IN and divisions that may
+# trap. A declaration overwritten by a copy becomes that copy's
+# declaration, so every variable keeps one, unless the copied value cannot
+# be given the declared type.
+def remove_dead_code(ir):
+    rows = rows_of(ir)
+    counts = use_counts(rows)
+    types = operand_types(rows)
+    changed = False
+    for block in build_cfg(ir):
+        overwritten = {}             # Variable to the instruction writing it next
+        for index in range(block.end - 1, block.start - 1, -1):
+            row = rows[index]
+            op, _, dest, _, _ = row
+            if not writes(op):
+                for operand in reads(row):
+                    overwritten.pop(operand, None)
+                continue
+            kind = ir.operand_kinds[dest]
+            if has_effects(ir, row):
+                dead = False
+            elif kind == TEMP and not counts.get(dest) or op == COPY and row[3] == dest:
+                dead = True
+            elif kind == VARIABLE and dest in overwritten:
+                killer = rows[overwritten[dest]]
+                dead = op != DECL or killer[0] == DECL
+                if op == DECL and killer[0] == COPY:
+                    value = declared_value(ir, types, killer)
+                    if value is not None:
+                        killer[0] = DECL
+                        killer[3] = value
+                        dead = True
+            else:
+                dead = False
+            if dead:
+                rows[index] = None
+                changed = True
+                continue
+            if kind == VARIABLE:
+                overwritten[dest] = index
+            for operand in reads(row):
+                overwritten.pop(operand, None)
+    return [row for row in rows if row is not None] if changed else None
+
+# Drops unreachable blocks, gotos to the next instruction and labels no
+# jump targets
+def simplify_jumps(ir):
+    rows = rows_of(ir)
+    changed = False
+    blocks = build_cfg(ir)
+    live = reachable(blocks)
+    for block in blocks:
+        if block.index not in live:
+            rows[block.start:block.end] = [None] * len(block)
+            changed = True
+    kept = [row for row in rows if row is not None]
+    for index in range(len(kept) - 1):
+        if kept[index][0] == GOTO and kept[index + 1][0] == LABEL and kept[index][2] == kept[index + 1][2]:
+            kept[index] = None
+            changed = True
+    kept = [row for row in kept if row is not None]
+    targets = {row[2] for row in kept if row[0] in JUMPS}
+    for index, row in enumerate(kept):
+        if row[0] == LABEL and row[2] not in targets:
+            kept[index] = None
+            changed = True
+    return [row for row in kept if row is not None] if changed else None
+
+PASSES = [propagate_constants, forward_temps, remove_dead_code, simplify_jumps]
+
+# New EtacIR computing the same as ir, with every pass run until none of
+# them changes anything. Variables are all taken as read after the
+# program, so their last stores stay.
+def optimize(ir):
+    current = rebuild(ir, rows_of(ir))
+    changed = True
+    while changed:
+        changed = False
+        for optimization in PASSES:
+            rows = optimization(current)
+            if rows is not None:
+                current = rebuild(current, rows)
+                changed = True
+    return current
+
+# Print the optimized ETAC of a file
+if __name__ == "__main__":
+    from compiler import compile_source
+
+    result = compile_source(path=sys.argv[1], check=False)
+    for phase, line, message in result.diagnostics:
+        print(f"{phase} error at {line}: {message}")
+    if result.ir is not None and not result.diagnostics:
+        optimized = optimize(result.ir)
+        for line in render(optimized):
+            print(line)
+        print(f"{len(result.ir)} -> {len(optimized)} instructions", file=sys.stderr)
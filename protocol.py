@@ -0,0 +1,42 @@
+import json
+import os
+import struct
+
+# Kept to the standard library modules that import fast, the client pays
+# for every import on each compile.
+
+# Frames are a 4-byte big-endian payload length followed by a JSON payload
+HEADER = struct.Struct('>I')
+MAX_FRAME = 64 * 1024 * 1024
+
+# Per-user socket of the compile daemon
+def default_socket_path():
+    directory = os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp'
+    return os.path.join(directory, f"jald-{os.getuid()}.sock")
+
+def send_frame(sock, message):
+    payload = json.dumps(message).encode('utf-8')
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+# Next message on the socket, None once the peer has closed it
+def recv_frame(sock):
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise Exception(f"Frame of {size} bytes exceeds the {MAX_FRAME} byte limit")
+    payload = recv_exact(sock, size)
+    if payload is None:
+        raise Exception("Connection closed in the middle of a frame")
+    return json.loads(payload)
@@ -0,0 +1,344 @@
+import argparse
+import hashlib
+import io
+import os
+import sys
+import time
+from collections import OrderedDict
+
+from etac_ir import (AND, COPY, DECL, DIV, EQUAL, GOTO, HIGH, IF_FALSE, IF_TRUE, IN, LABEL, LOW, NOT, OR, OUT,
+                     CONSTANT, LABEL_OPERAND, NO_OPERAND, OPERATORS, REGISTER, SLOT, TEMP, TYPE_IDS,
+                     VARIABLE, constant_type, constant_value, convert, render, render_instruction, variable_name,
+                     wrap_i32)
+from vm import DEFAULT_BUFFER_SIZE, InputBuffer, OutputBuffer, int_div
+
+INT, FLOAT, BOOL = TYPE_IDS['int'], TYPE_IDS['float'], TYPE_IDS['bool']
+
+# Name of the generated function, and of the file its code claims to be from
+FUNCTION_NAME = 'jal_program'
+SOURCE_NAME = '<jal>'
+
+# Python name of a non-constant operand. Variables get a prefix so no JAL
+# name can clash with a Python keyword or a helper.
+def local_name(ir, operand):
+    kind = ir.operand_kinds[operand]
+    value = ir.operand_values[operand]
+    if kind == VARIABLE:
+        return f"v_{variable_name(ir, operand)}"
+    return {TEMP: 't', REGISTER: 'r', SLOT: 's'}[kind] + str(value)
+
+# Writes the Python source of a single function for an EtacIR. ETAC from
+# ETAC.SemanticAnalyzer, optimized or not, only jumps the way IF, ELSE,
+# WHILE and FOR are lowered: a conditional jump forward past a block, or a
+# loop from a label to the goto back to it, with its exit label right
+# after. Those become if and while statements, anything else raises.
+class PythonWriter:
+    def __init__(self, ir):
+        self.ir = ir
+        self.lines = []
+        self.origins = []            # IR index of each line, None for structure
+        self.labels = {}             # Label operand to its index
+        self.back_edges = {}         # Loop label to the index of the goto closing it
+        self.uses = {}
+        self.types = {}              # Operand to its single value type
+        ops = ir.ops
+        mixed = set()
+        for index in range(len(ir)):
+            op = ops[index]
+            if op == LABEL:
+                self.labels[ir.dests[index]] = index
+            elif op == GOTO and ir.dests[index] in self.labels:
+                self.back_edges[ir.dests[index]] = index
+            if op != LABEL and op != GOTO:
+                for operand in (ir.lefts[index], ir.rights[index]):
+                    if operand != NO_OPERAND:
+                        self.uses[operand] = self.uses.get(operand, 0) + 1
+            if op != LABEL and op != OUT and op not in (GOTO, IF_FALSE, IF_TRUE):
+                dest = ir.dests[index]
+                if self.types.get(dest, ir.types[index]) != ir.types[index]:
+                    mixed.add(dest)
+                self.types[dest] = ir.types[index]
+        # Registers and slots hold values of several types
+        for operand in mixed:
+            del self.types[operand]
+
+    def value(self, operand):
+        if self.ir.operand_kinds[operand] == CONSTANT:
+            return repr(constant_value(self.ir.operand_values[operand]))
+        return local_name(self.ir, operand)
+
+    def type_of(self, operand):
+        if self.ir.operand_kinds[operand] == CONSTANT:
+            return constant_type(self.ir.operand_values[operand])
+        return self.types.get(operand)
+
+    # Expression storing operand into a destination of type type_id
+    def converted(self, type_id, operand):
+        source_type = self.type_of(operand)
+        if source_type == type_id:
+            return self.value(operand)
+        if self.ir.operand_kinds[operand] == CONSTANT:
+            return repr(convert(type_id, constant_value(self.ir.operand_values[operand])))
+        if type_id == INT:
+            return f"wrap_i32(int({self.value(operand)}))"
+        return f"{'float' if type_id == FLOAT else 'bool'}({self.value(operand)})"
+
+    def emit(self, depth, text, origin=None):
+        self.lines.append('    ' * depth + text)
+        self.origins.append(origin)
+
+    # Python statement for instruction index
+    def statement(self, index):
+        ir = self.ir
+        op, type_id = ir.ops[index], ir.types[index]
+        left, right = ir.lefts[index], ir.rights[index]
+        if op == OUT:
+            if type_id == BOOL:
+                return f"write('true' if {self.value(left)} else 'false')"
+            return f"write({'str' if type_id == INT else 'repr'}({self.converted(type_id, left)}))"
+        dest = local_name(ir, ir.dests[index])
+        if op == IN:
+            return f"{dest} = read({type_id})"
+        if op == DECL or op == COPY:
+            return f"{dest} = {self.converted(type_id, left)}"
+        if op == NOT:
+            return f"{dest} = not {self.value(left)}"
+        a, b = self.value(left), self.value(right)
+        if op == AND or op == OR:
+            if self.type_of(left) == BOOL and self.type_of(right) == BOOL:
+                return f"{dest} = {a} {OPERATORS[op]} {b}"
+            return f"{dest} = bool({a} {OPERATORS[op]} {b})"
+        if op == LOW or op == HIGH or op == EQUAL:
+            return f"{dest} = {a} {OPERATORS[op]} {b}"
+        if type_id == INT:
+            if self.type_of(left) != INT:
+                a = f"int({a})"
+            if self.type_of(right) != INT:
+                b = f"int({b})"
+            if op == DIV:
+                return f"{dest} = int_div({a}, {b})"
+            return f"{dest} = ({a} {OPERATORS[op]} {b} + 2147483648 & 4294967295) - 2147483648"
+        if op != DIV and self.type_of(left) != FLOAT and self.type_of(right) != FLOAT:
+            a = f"float({a})"
+        return f"{dest} = {a} {OPERATORS[op]} {b}"
+
+    def condition(self, index):
+        test = self.value(self.ir.lefts[index])
+        return test if self.ir.ops[index] == IF_TRUE else f"not {test}"
+
+    # Jump at index as break or continue of the innermost loop, or None
+    def loop_jump(self, index, loops):
+        if not loops:
+            return None
+        target = self.ir.dests[index]
+        header, exit = loops[-1]
+        if target == exit:
+            return 'break'
+        if target == header:
+            return 'continue'
+        return None
+
+    # Statements for instructions start to end - 1, inside loops, a list
+    # of (header label, exit label) of the enclosing while statements
+    def block(self, start, end, depth, loops):
+        ir = self.ir
+        ops = ir.ops
+        first = len(self.lines)
+        index = start
+        while index < end:
+            op = ops[index]
+            if op == LABEL:
+                closing = self.back_edges.get(ir.dests[index])
+                if closing is not None and closing < end:
+                    self.loop(index, closing, depth, loops)
+                    index = closing + 1
+                    continue
+            elif op == IF_FALSE or op == IF_TRUE:
+                jump = self.loop_jump(index, loops)
+                if jump is not None:
+                    self.emit(depth, f"if {self.condition(index)}:", index)
+                    self.emit(depth + 1, jump, index)
+                else:
+                    target = self.labels.get(ir.dests[index])
+                    if target is None or not index < target <= end:
+                        raise Exception(f"Cannot lower '{render_instruction(ir, index)}' to Python")
+                    # The block runs when the jump is not taken
+                    test = self.value(ir.lefts[index])
+                    self.emit(depth, f"if {test if op == IF_FALSE else 'not ' + test}:", index)
+                    self.block(index + 1, target, depth + 1, loops)
+                    index = target
+                    continue
+            elif op == GOTO:
+                jump = self.loop_jump(index, loops)
+                if jump is not None:
+                    self.emit(depth, jump, index)
+                else:
+                    target = self.labels.get(ir.dests[index])
+                    if target is None or not index < target <= end:
+                        raise Exception(f"Cannot lower '{render_instruction(ir, index)}' to Python")
+                    # Nothing between a forward goto and its label can run
+                    index = target
+                    continue
+            else:
+                self.emit(depth, self.statement(index), index)
+            index += 1
+        if len(self.lines) == first:
+            self.emit(depth, 'pass')
+
+    # While statement for the loop from the label at header to the goto back
+    # to it at closing. A test of the exit condition right at the top
+    # becomes the while condition.
+    def loop(self, header, closing, depth, loops):
+        ir = self.ir
+        ops = ir.ops
+        exit = ir.dests[closing + 1] if closing + 1 < len(ir) and ops[closing + 1] == LABEL else None
+        body = header + 1
+        test = 'True'
+        if exit is not None and body < closing:
+            if ops[body] == IF_FALSE and ir.dests[body] == exit:
+                test = self.value(ir.lefts[body])
+                body += 1
+            elif ops[body] in (LOW, HIGH, EQUAL) and body + 1 < closing and ops[body + 1] == IF_FALSE \
+                    and ir.dests[body + 1] == exit and ir.lefts[body + 1] == ir.dests[body] \
+                    and ir.operand_kinds[ir.dests[body]] == TEMP and self.uses.get(ir.dests[body]) == 1:
+                test = f"{self.value(ir.lefts[body])} {OPERATORS[ops[body]]} {self.value(ir.rights[body])}"
+                body += 2
+        self.emit(depth, f"while {test}:", header)
+        self.block(body, closing, depth + 1, loops + [(ir.dests[header], exit)])
+
+    # Function source. The function takes read(type_id) and write(text) and
+    # returns the final values of the variables by name.
+    def source(self):
+        ir = self.ir
+        names = sorted({local_name(ir, operand) for operand, kind in enumerate(ir.operand_kinds)
+                        if kind != CONSTANT and kind != LABEL_OPERAND})
+        self.emit(0, f"def {FUNCTION_NAME}(read, write):")
+        if names:
+            self.emit(1, ' = '.join(names) + ' = 0')
+        self.block(0, len(ir), 1, [])
+        variables = ', '.join(f"{variable_name(ir, operand)!r}: {local_name(ir, operand)}"
+                              for operand, kind in enumerate(ir.operand_kinds) if kind == VARIABLE)
+        self.emit(1, f"return {{{variables}}}")
+        return '\n'.join(self.lines) + '\n'
+
+# A compiled program and the IR index each line of its source came from
+class PythonProgram:
+    def __init__(self, ir, function, source, origins):
+        self.ir = ir
+        self.function = function
+        self.source = source
+        self.origins = origins
+
+    # Run with buffered IN/OUT on the given streams (stdin and stdout by
+    # default), returns the final values of the variables
+    def run(self, input=None, output=None, buffer_size=DEFAULT_BUFFER_SIZE):
+        inputs = InputBuffer(input if input is not None else sys.stdin, buffer_size)
+        outputs = OutputBuffer(output if output is not None else sys.stdout, buffer_size)
+        try:
+            return self.function(inputs.read, outputs.write)
+        except ZeroDivisionError as error:
+            raise Exception(f"Division by zero in '{self.failed_instruction(error)}'")
+        except (OverflowError, ValueError) as error:
+            raise Exception(f"Cannot convert to int in '{self.failed_instruction(error)}'")
+        finally:
+            outputs.flush()
+
+    # Instruction of the generated line an error was raised from
+    def failed_instruction(self, error):
+        line = None
+        traceback = error.__traceback__
+        while traceback is not None:
+            if traceback.tb_frame.f_code.co_filename == SOURCE_NAME:
+                line = traceback.tb_lineno
+            traceback = traceback.tb_next
+        if line is None or self.origins[line - 1] is None:
+            return '?'
+        return render_instruction(self.ir, self.origins[line - 1])
+
+# Compiled programs by hash of their ETAC text, least recently used first.
+# Holds at most PROGRAM_CACHE_SIZE of them, a long-lived process that runs
+# many different programs only keeps the latest ones.
+PROGRAM_CACHE_SIZE = 64
+program_cache = OrderedDict()
+
+def program_hash(ir):
+    return hashlib.sha256('\n'.join(render(ir)).encode()).hexdigest()
+
+# The Python function of an EtacIR, compiled with compile() the first time
+# a program is seen and taken from program_cache after that
+def compile_program(ir):
+    key = program_hash(ir)
+    program = program_cache.get(key)
+    if program is not None:
+        program_cache.move_to_end(key)
+        return program
+    writer = PythonWriter(ir)
+    try:
+        source = writer.source()
+        code = compile(source, SOURCE_NAME, 'exec')
+    except (SyntaxError, RecursionError, MemoryError) as error:
+        raise Exception(f"Program too deeply nested for the Python backend: {error}")
+    namespace = {'wrap_i32': wrap_i32, 'int_div': int_div}
+    exec(code, namespace)
+    program = program_cache[key] = PythonProgram(ir, namespace[FUNCTION_NAME], source, writer.origins)
+    if len(program_cache) > PROGRAM_CACHE_SIZE:
+        program_cache.popitem(last=False)
+    return program
+
+def run_program(ir, input=None, output=None):
+    return compile_program(ir).run(input, output)
+
+# Main execution
+if __name__ == "__main__":
+    from compiler import compile_source
+
+    parser = argparse.ArgumentParser(description="Compile a JAL program to a Python function and run it")
+    parser.add_argument('file')
+    parser.add_argument('--no-check', action='store_true', help="skip the semantico checks")
+    parser.add_argument('-O', dest='optimize', action='store_true', help="optimize the ETAC")
+    parser.add_argument('--show', action='store_true', help="print the generated Python instead of running it")
+    parser.add_argument('--input', default=None, help="read IN values from this file (default: stdin)")
+    parser.add_argument('--output', default=None, help="write OUT values to this file (default: stdout)")
+    parser.add_argument('--bench', type=int, default=None, metavar='RUNS',
+                        help="run RUNS times with output discarded and report the best time")
+    args = parser.parse_args()
+
+    result = compile_source(path=args.file, check=not args.no_check, optimize=args.optimize)
+    for phase, line, message in result.diagnostics:
+        location = f"{args.file}:{line}" if line is not None else args.file
+        print(f"{location}: {phase} error: {message}", file=sys.stderr)
+    if not result.success:
+        sys.exit(1)
+
+    try:
+        start = time.perf_counter()
+        program = compile_program(result.ir)
+        compile_time = time.perf_counter() - start
+        if args.show:
+            print(program.source, end='')
+        elif args.bench is not None:
+            if args.input is not None:
+                with open(args.input, 'r') as file:
+                    input_text = file.read()
+            else:
+                input_text = '' if sys.stdin.isatty() else sys.stdin.read()
+            best = None
+            with open(os.devnull, 'w') as devnull:
+                for _ in range(max(1, args.bench)):
+                    start = time.perf_counter()
+                    program.run(io.StringIO(input_text), devnull)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+            print(f"compiled in {compile_time * 1000:.3f} ms, best run {best * 1000:.3f} ms", file=sys.stderr)
+        else:
+            input_file = open(args.input, 'r') if args.input is not None else None
+            output_file = open(args.output, 'w') if args.output is not None else None
+            try:
+                program.run(input_file, output_file)
+            finally:
+                for file in (input_file, output_file):
+                    if file is not None:
+                        file.close()
+    except Exception as error:
+        print(f"Runtime error: {error}", file=sys.stderr)
+        sys.exit(1)
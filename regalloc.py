@@ -0,0 +1,128 @@
+import argparse
+import sys
+
+from etac_ir import REGISTER, SLOT, TEMP, render
+from liveness import live_intervals, peak_pressure
+
+DEFAULT_REGISTERS = 8
+
+# Where each temporary of a program lives: locations maps temp operands to
+# (REGISTER or SLOT, number). Registers and spill slots are both reused
+# once the temporary holding them is dead.
+class Allocation:
+    def __init__(self, registers):
+        self.registers = registers
+        self.locations = {}
+        self.temps = 0
+        self.peak_pressure = 0       # Most temporaries live at once
+        self.registers_used = 0
+        self.spilled = 0
+        self.slots_used = 0
+
+    def stats(self):
+        return {
+            'registers': self.registers,
+            'temps': self.temps,
+            'peak_pressure': self.peak_pressure,
+            'registers_used': self.registers_used,
+            'spilled': self.spilled,
+            'slots': self.slots_used
+        }
+
+# Linear scan over the live intervals in start order. When all registers
+# are taken, whichever of the new interval and the active ones ends last
+# goes to a spill slot.
+def linear_scan(ir, registers=DEFAULT_REGISTERS):
+    intervals = live_intervals(ir)
+    allocation = Allocation(registers)
+    allocation.temps = len(intervals)
+    allocation.peak_pressure = peak_pressure(intervals)
+
+    free_registers = list(range(registers - 1, -1, -1))
+    free_slots = []
+    slot_count = 0
+    active = []                      # (end, temp) holding a register
+    active_slots = []                # (end, temp) holding a slot
+
+    def expire(entries, free, position):
+        kept = []
+        for end, temp in entries:
+            if end < position:
+                free.append(allocation.locations[temp][1])
+            else:
+                kept.append((end, temp))
+        entries[:] = kept
+
+    for temp, (start, end) in sorted(intervals.items(), key=lambda item: (item[1][0], item[0])):
+        expire(active, free_registers, start)
+        expire(active_slots, free_slots, start)
+
+        spill = None
+        if free_registers:
+            allocation.locations[temp] = (REGISTER, free_registers.pop())
+            active.append((end, temp))
+        elif active and max(active)[0] > end:
+            # The active interval ending last gives its register up
+            victim_end, victim = max(active)
+            active.remove((victim_end, victim))
+            allocation.locations[temp] = allocation.locations[victim]
+            active.append((end, temp))
+            spill = (victim_end, victim)
+        else:
+            spill = (end, temp)
+
+        if spill is not None:
+            if not free_slots:
+                free_slots.append(slot_count)
+                slot_count += 1
+            allocation.locations[spill[1]] = (SLOT, free_slots.pop())
+            active_slots.append(spill)
+            allocation.spilled += 1
+
+    allocation.registers_used = len({number for kind, number in allocation.locations.values() if kind == REGISTER})
+    allocation.slots_used = slot_count
+    return allocation
+
+# New EtacIR with every temporary replaced by its register or spill slot.
+# Spill slots are memory operands, so no loads or stores are added.
+def apply_allocation(ir, allocation):
+    allocated = ir.derive()
+    operands = {temp: allocated.register(kind, number) for temp, (kind, number) in allocation.locations.items()}
+    kinds = ir.operand_kinds
+
+    def location(operand):
+        return operands.get(operand, operand) if operand >= 0 and kinds[operand] == TEMP else operand
+
+    for index in range(len(ir)):
+        allocated.append(ir.ops[index], ir.types[index], location(ir.dests[index]),
+                         location(ir.lefts[index]), location(ir.rights[index]))
+    return allocated
+
+def allocate(ir, registers=DEFAULT_REGISTERS):
+    allocation = linear_scan(ir, registers)
+    return apply_allocation(ir, allocation), allocation
+
+def print_stats(stats, file=sys.stderr):
+    print(f"{stats['temps']} temporaries, at most {stats['peak_pressure']} live at once: "
+          f"{stats['registers_used']}/{stats['registers']} registers, "
+          f"{stats['spilled']} spilled to {stats['slots']} slots", file=file)
+
+# Print the ETAC of a file with its temporaries allocated
+if __name__ == "__main__":
+    from compiler import compile_source
+
+    parser = argparse.ArgumentParser(description="Allocate the ETAC temporaries of a JAL program to registers")
+    parser.add_argument('file')
+    parser.add_argument('-k', '--registers', type=int, default=DEFAULT_REGISTERS, help="registers available")
+    parser.add_argument('-O', dest='optimize', action='store_true', help="optimize the ETAC first")
+    args = parser.parse_args()
+
+    result = compile_source(path=args.file, check=False, optimize=args.optimize)
+    for phase, line, message in result.diagnostics:
+        print(f"{phase} error at {line}: {message}")
+    if result.ir is None or result.diagnostics:
+        sys.exit(1)
+    allocated, allocation = allocate(result.ir, args.registers)
+    for line in render(allocated):
+        print(line)
+    print_stats(allocation.stats())
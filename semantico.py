@@ -1,203 +1,70 @@
-from lexico import lexic
+from ll1 import load_table, stream_interner
+from symbol_table import SymbolTable
+from syntax_tree import Visitor, build_tree
+from token_store import Interner, MappedTokenStream, decode_error
 import sys
 
-# Get the contents of the file
-def read_file(filepath):
+# Map the file for streaming, its tokens are scanned while parsing
+def open_file(filepath):
     try:
-        with open(filepath, 'r') as file:
-            return file.readlines()
+        return MappedTokenStream(filepath)
     except FileNotFoundError:
         return None
 
-# Define the parsing table (from the previous step)
-parsing_table = {
-    'program_start': {
-        'start': ['start', 'char_esq', 'code', 'end', 'ponto-virgula', 'char_dir']
-    },
+# LL(1) table generated from gramatica.txt, loaded from its compiled artifact
+table = load_table()
+parsing_table = table.parsing_table
 
-    'code': {
-        'int': ['stmt', 'code'],
-        'float': ['stmt', 'code'],
-        'bool': ['stmt', 'code'],
-        'id': ['stmt', 'code'],
-        'if': ['stmt', 'code'],
-        'while': ['stmt', 'code'],
-        'for': ['stmt', 'code'],
-        'in': ['stmt', 'code'],
-        'out': ['stmt', 'code'],
-        'end': ['vazio'],
-        'char_dir': ['char_dir'],
-        'else': ['stmt', 'code']
-    },
-
-    'stmt': {
-        'int': ['declaration'],
-        'float': ['declaration'],
-        'bool': ['declaration'],
-        'id': ['command'],
-        'if': ['command'],
-        'else': ['command'],
-        'while': ['command'],
-        'for': ['command'],
-        'in': ['command'],
-        'out': ['command']
-    },
-
-    'declaration': {
-        'int': ['type', 'variable'],
-        'float': ['type', 'variable'],
-        'bool': ['type', 'variable']
-    },
-
-    'type': {
-        'int': ['int'],
-        'float': ['float'],
-        'bool': ['bool']
-    },
-
-    'variable': {
-        'id': ['identifier', 'ponto-virgula']
-    },
-
-    'command': {
-        'id': ['identifier_command'],
-        'if': ['control_command'],
-        'while': ['control_command'],
-        'for': ['control_command'],
-        'in': ['io_command', 'ponto-virgula'],
-        'out': ['io_command', 'ponto-virgula'],
-        'else': ['control_command']
-    },
-
-    'identifier_command': {
-        'id': ['identifier', 'associacao', 'expression', 'ponto-virgula']
-    },
-
-    'control_command': {
-        'if': ['if', 'par_esq', 'identifier', 'par_dir', 'char_esq', 'code'],
-        'while': ['while', 'par_esq', 'identifier', 'par_dir', 'char_esq', 'code'],
-        'for': ['for', 'par_esq', 'identifier', 'par_dir', 'char_esq', 'code'],
-        'else': ['else', 'char_esq', 'code']
-    },
-
-    'function': {
-        'high': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'low': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'equal': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'add': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'sub': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'div': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'mul': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'and': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'or': ['function_name', 'par_esq', 'argument_list', 'par_dir'],
-        'not': ['function_name', 'par_esq', 'argument_list', 'par_dir']
-    },
-
-    'argument_list': {
-        'num_int': ['expression', 'argument_tail'],
-        'num_float': ['expression', 'argument_tail'],
-        'nim_sin_int': ['expression', 'argument_tail'],
-        'nim_sin_float': ['expression', 'argument_tail'],
-        'true': ['expression', 'argument_tail'],
-        'false': ['expression', 'argument_tail'],
-        'id': ['expression', 'argument_tail'],
-        'high': ['expression', 'argument_tail'],
-        'low': ['expression', 'argument_tail'],
-        'equal': ['expression', 'argument_tail'],
-        'add': ['expression', 'argument_tail'],
-        'sub': ['expression', 'argument_tail'],
-        'div': ['expression', 'argument_tail'],
-        'mul': ['expression', 'argument_tail'],
-        'and': ['expression', 'argument_tail'],
-        'or': ['expression', 'argument_tail'],
-        'not': ['expression', 'argument_tail']
-    },
-
-    'argument_tail': {
-        'virgula': ['virgula', 'argument_list'],
-        'par_dir': ['vazio']
-    },
-
-    'expression': {
-        'num_int': ['num_int'],
-        'num_float': ['num_float'],
-        'nim_sin_int': ['nim_sin_int'],
-        'nim_sin_float': ['nim_sin_float'],
-        'true': ['true'],
-        'false': ['false'],
-        'id': ['identifier'],
-        'high': ['function'],
-        'low': ['function'],
-        'equal': ['function'],
-        'add': ['function'],
-        'sub': ['function'],
-        'div': ['function'],
-        'mul': ['function'],
-        'and': ['function'],
-        'or': ['function'],
-        'not': ['function']
-    },
-
-    'identifier': {
-        'id': ['id']
-    },
-
-    'function_name': {
-        'high': ['high'],
-        'low': ['low'],
-        'equal': ['equal'],
-        'add': ['add'],
-        'sub': ['sub'],
-        'div': ['div'],
-        'mul': ['mul'],
-        'and': ['and'],
-        'or': ['or'],
-        'not': ['not']
-    },
-
-    'io_command': {
-        'in': ['in', 'par_esq', 'identifier', 'par_dir'],
-        'out': ['out', 'par_esq', 'identifier', 'par_dir']
-    }
-}
-
-class SemanticAnalyzer:
+class SemanticAnalyzer(Visitor):
     FUNCTION_ARG_COUNTS = {
         'ADD': 2, 'SUB': 2, 'MUL': 2, 'DIV': 2,
         'AND': 2, 'OR': 2, 'NOT': 1,
         'HIGH': 2, 'LOW': 2, 'EQUAL': 2
     }
 
-    def __init__(self):
-        self.scope_stack = [{}]
-        self.current_decl_type = None
+    def __init__(self, interner=None):
+        self.interner = interner if interner is not None else Interner()
+        self.symbols = SymbolTable()        # Interned symbol ids to types, by scope
         self.type_stack = []                # Stores (type, is_variable) tuples
-        self.function_stack = []
-        self.assignment_target = None
-        self.in_assignment = False
-        self.control_stack = []             # Track loop/control structures
-        self.in_loop_init = False           # For FOR loop variable checking
-        self.expecting_control_condition = False
-        self.expecting_if_condition = False
-        self.control_stack_if_else = []
+        self.control_stack = []             # Loops the current statement is in
+        self.control_stack_if_else = []     # Last IF or ELSE seen
+        self.block_if = False               # The current block has an IF no ELSE took yet
+
+    # Copy of the analysis state between top-level statements, comparable
+    # with == and restorable, for resuming a parse from a checkpoint. The
+    # type stack is empty there (see visit_statement) and the symbols are
+    # stored as what was declared since the last snapshot.
+    def snapshot(self):
+        return (
+            self.symbols.snapshot(),
+            list(self.control_stack),
+            list(self.control_stack_if_else),
+            self.block_if
+        )
+
+    def restore(self, state):
+        symbols, control_stack, control_stack_if_else, self.block_if = state
+        self.symbols.restore(symbols)
+        self.type_stack = []
+        self.control_stack = list(control_stack)
+        self.control_stack_if_else = list(control_stack_if_else)
 
     def enter_scope(self):
-        self.scope_stack.append({})
+        self.symbols.enter_scope()
 
     def exit_scope(self):
-        if len(self.scope_stack) > 1:
-            self.scope_stack.pop()
+        self.symbols.exit_scope()
 
-    def declare_variable(self, name, var_type):
-        if name in self.scope_stack[-1]:
-            raise Exception(f"Variable '{name}' already declared")
-        self.scope_stack[-1][name] = var_type
+    def declare_variable(self, symbol, var_type):
+        if self.symbols.declared_here(symbol):
+            raise Exception(f"Variable '{self.interner.names[symbol]}' already declared")
+        self.symbols.declare(symbol, var_type)
 
-    def get_variable_type(self, name):
-        for scope in reversed(self.scope_stack):
-            if name in scope:
-                return scope[name]
-        raise Exception(f"Undefined variable '{name}'")
+    def get_variable_type(self, symbol):
+        entry = self.symbols.find(symbol)
+        if entry is not None:
+            return entry[1]
+        raise Exception(f"Undefined variable '{self.interner.names[symbol]}'")
 
     def check_function_args(self, function_name, arg_types):
         if function_name in ['ADD', 'SUB', 'MUL', 'DIV']:
@@ -249,176 +116,129 @@ class SemanticAnalyzer:
 
     def validate_control_structure(self, current_token):
         if current_token == 'if':
-            self.control_stack_if_else.append('if')
+            # Only the last IF or ELSE decides whether an ELSE is valid
+            self.control_stack_if_else[-1:] = ['if']
         elif current_token == 'else':
-            if not self.control_stack_if_else or self.control_stack_if_else[-1] != 'if':
+            # The IF must also be in the ELSE's own block: one in a nested
+            # block may never have run
+            if not self.control_stack_if_else or self.control_stack_if_else[-1] != 'if' or not self.block_if:
                 raise Exception("ELSE without matching IF")
             # Replace if with else in stack to prevent multiple else
             self.control_stack_if_else[-1] = 'else'
 
-# Define non-terminals
-non_terminals = set(parsing_table.keys())
-
-# Input tokens
-file_path = sys.argv[1]
-code = read_file(file_path)
-input_tokens = lexic(code)
-
-# Extract the terminals from the input tokens
-input_terminals = [token[1] for token in input_tokens] + ["$"]  # Add end marker
-
-# Initialize the stack
-stack = ["$", "program_start"]
-
-# Initialize the input pointer
-input_pointer = 0
-
-# LL(1) Parsing Algorithm
+    # Values a top-level statement leaves on the type stack, the conditions
+    # of IF, WHILE and FOR and the names of IN and OUT, are only there for
+    # calls short of arguments in the same statement to take
+    def visit_statement(self, node):
+        self.visit(node)
+        self.type_stack.clear()
+
+    # Semantic checks as a pass over the syntax tree, in source order
+    def visit_block(self, body):
+        block_if = self.block_if
+        self.block_if = False
+        self.enter_scope()
+        for statement in body:
+            yield statement
+        self.exit_scope()
+        self.block_if = block_if
+
+    def visit_Decl(self, node):
+        self.declare_variable(node.symbol, node.type)
+
+    # Variables used as values, their type stays on the type stack
+    def visit_Name(self, node):
+        var_type = self.get_variable_type(node.symbol)
+        self.type_stack.append((var_type, True))
+
+    def visit_Literal(self, node):
+        self.type_stack.append((node.type, False))
+
+    def visit_Assign(self, node):
+        self.visit(node.target)
+        target_type, _ = self.type_stack.pop()
+        yield node.value
+        self.check_conversion(target_type, self.type_stack.pop())
+
+    # Arguments are taken from the type stack, so a call with fewer
+    # arguments than its function takes uses values left there before
+    def visit_Call(self, node):
+        for argument in node.args:
+            yield argument
+        function_name = node.function
+        expected_args = self.FUNCTION_ARG_COUNTS.get(function_name, 0)
+        args = []
+        for _ in range(expected_args):
+            if not self.type_stack:
+                raise Exception(f"Not enough arguments for {function_name}")
+            arg_type, _ = self.type_stack.pop()
+            args.append(arg_type)
+        args.reverse()
+        return_type = self.check_function_args(function_name, args)
+        self.type_stack.append((return_type, False))
+
+    def visit_If(self, node):
+        self.validate_control_structure('if')
+        self.at(node.condition, self.validate_if_condition, node.condition.symbol)
+        self.visit(node.condition)
+        yield from self.visit_block(node.body)
+        self.block_if = True
+
+    def visit_Else(self, node):
+        self.validate_control_structure('else')
+        self.block_if = False
+        yield from self.visit_block(node.body)
+
+    def visit_While(self, node):
+        self.control_stack.append('while')
+        self.at(node.condition, self.validate_loop_condition, node.condition.symbol, 'while')
+        self.visit(node.condition)
+        yield from self.visit_block(node.body)
+        self.control_stack.pop()
+
+    def visit_For(self, node):
+        self.control_stack.append('for')
+        self.visit(node.variable)
+        yield from self.visit_block(node.body)
+        self.control_stack.pop()
+
+    def visit_In(self, node):
+        self.visit(node.name)
+
+    def visit_Out(self, node):
+        self.visit(node.name)
+
+# Parse the tokens into a syntax tree and check every statement as soon as
+# it is parsed, returns the analyzer of a successful run. The tree is only
+# kept, in analyzer.tree, with keep_tree; otherwise each statement is
+# dropped once checked. Errors are raised with the position (line, or source
+# offset for token stores) they were found at.
+def analyze(input_tokens, keep_tree=False):
+    analyzer = SemanticAnalyzer(stream_interner(input_tokens))
+    tree = build_tree(input_tokens, analyzer.interner, analyzer.visit_statement, keep_tree)
+    analyzer.tree = tree if keep_tree else None
+    return analyzer
+
+# Check the tokens and report the result
 def parse(input_tokens):
-    input_terminals = [token[1] for token in input_tokens] + ["$"]
-    input_pointer = 0
-    stack = ["$", "program_start"]
-    analyzer = SemanticAnalyzer()
-
-    while stack:
-        top = stack[-1]
-        current_input = input_terminals[input_pointer] if input_pointer < len(input_terminals) else "$"
-        current_lexeme = input_tokens[input_pointer][0] if input_pointer < len(input_tokens) else None
-
-        # Terminal handling
-        if top == current_input:
-            
-            # Track loop types
-            if top == 'while':
-                analyzer.control_stack.append('while')
-                analyzer.expecting_control_condition = True
-                
-            elif top == 'for':
-                analyzer.control_stack.append('for')
-                analyzer.in_loop_init = True
-                
-            elif top == 'id' and analyzer.control_stack:
-                current_loop = analyzer.control_stack[-1]
-                    
-                # Loop condition validation
-                if analyzer.expecting_control_condition:
-                    analyzer.validate_loop_condition(current_lexeme, current_loop)
-                    analyzer.expecting_control_condition = False
-                    
-            elif top == 'id' and analyzer.in_loop_init:
-                analyzer.validate_loop_variable(current_lexeme)
-                analyzer.in_loop_init = False
-
-            # Handle FOR loop range expressions
-            elif top in ['num_int', 'nim_sin_int'] and analyzer.control_stack == 'for':
-                analyzer.type_stack.append('int')
-                
-            elif top in ['num_float', 'nim_sin_float'] and analyzer.control_stack == 'for':
-                raise Exception("FOR loop range requires integer values")
-            
-            # Semantic action for if/else
-            elif top == 'if':
-                analyzer.validate_control_structure('if')
-                analyzer.expecting_if_condition = True
-            elif top == 'else':
-                analyzer.validate_control_structure('else')
-                
-            if top == 'id' and analyzer.expecting_if_condition:
-                analyzer.validate_if_condition(current_lexeme)
-                analyzer.expecting_if_condition = False
-            
-            # Semantic actions for scopes
-            if top == 'char_esq':
-                analyzer.enter_scope()
-            elif top == 'char_dir':
-                analyzer.exit_scope()
-                if analyzer.control_stack and analyzer.control_stack[-1] == 'else':
-                    analyzer.control_stack.pop()
-            elif top in ['int', 'float', 'bool']:
-                analyzer.current_decl_type = top
-            elif top == 'id':
-                if analyzer.current_decl_type:
-                    analyzer.declare_variable(current_lexeme, analyzer.current_decl_type)
-                    analyzer.current_decl_type = None
-                else:
-                    var_type = analyzer.get_variable_type(current_lexeme)
-                    analyzer.type_stack.append((var_type, True))
-            elif top == 'associacao':
-                analyzer.in_assignment = True
-                analyzer.assignment_target = None
-                if analyzer.type_stack:
-                    analyzer.assignment_target = analyzer.type_stack.pop()
-            elif top == 'ponto-virgula':
-                if analyzer.in_assignment and analyzer.assignment_target:
-                    if analyzer.type_stack:
-                        source_info = analyzer.type_stack.pop()
-                        target_type, _ = analyzer.assignment_target
-                        analyzer.check_conversion(target_type, source_info)
-                    analyzer.in_assignment = False
-            elif top in ['num_int', 'nim_sin_int']:
-                analyzer.type_stack.append(('int', False))
-            elif top in ['num_float', 'nim_sin_float']:
-                analyzer.type_stack.append(('float', False))
-            elif top in ['true', 'false']:
-                analyzer.type_stack.append(('bool', False))
-            elif top in ['add', 'sub', 'mul', 'div', 'and', 'or', 'not', 'high', 'low', 'equal']:
-                analyzer.function_stack.append(top.upper())
+    analyzer = analyze(input_tokens)
+    print("Compilation successful!")
+    return analyzer
 
-            # Handle function returns
-            if top == 'par_dir' and analyzer.function_stack:
-                function_name = analyzer.function_stack.pop()
-                expected_args = SemanticAnalyzer.FUNCTION_ARG_COUNTS.get(function_name, 0)
-                args = []
-                for _ in range(expected_args):
-                    if not analyzer.type_stack:
-                        raise Exception(f"Not enough arguments for {function_name}")
-                    arg_type, _ = analyzer.type_stack.pop()
-                    args.append(arg_type)
-                args.reverse()
-                return_type = analyzer.check_function_args(function_name, args)
-                analyzer.type_stack.append((return_type, False))
-
-            # Stack operations
-            stack.pop()
-            input_pointer += 1
-
-        # Non-terminal handling
-        elif top in parsing_table:
-            production = parsing_table[top].get(current_input, None)
-            if not production:
-                raise Exception(f"Syntax error: Unexpected {current_input}")
-            stack.pop()
-            for symbol in reversed(production):
-                if symbol != 'vazio':
-                    stack.append(symbol)
-                    
-        # Non-terminal handling for loop ranges
-        elif top == 'loop_range':
-            # Validate all range components are integers
-            while len(analyzer.type_stack) > 0:
-                expr_type = analyzer.type_stack.pop()
-                analyzer.check_loop_expression(expr_type, 'for')
-
-        # Error case
-        else:
-            raise Exception(f"Syntax error: Unexpected {current_input}")
-
-    # Final validation
-    if input_pointer == len(input_terminals) and not stack:
-        print("Compilation successful!")
-    else:
-        print("Compilation failed")
-        
 # Main execution
 if __name__ == "__main__":
     file_path = sys.argv[1]
-    code = read_file(file_path)
-    if not code:
+    try:
+        tokens = open_file(file_path)
+    except UnicodeDecodeError as e:
+        print(decode_error(file_path, e))
+        sys.exit(1)
+    if tokens is None:
         print("File not found")
         sys.exit(1)
-    input_tokens = lexic(code)
-    try:
-        parse(input_tokens)
-    except Exception as e:
-        print(f"Semantic Error: {e}")
-        sys.exit(1)
\ No newline at end of file
+    with tokens:
+        try:
+            parse(tokens)
+        except Exception as e:
+            print(f"Semantic Error: {e}")
+            sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,108 @@
+# Flat symbol table for nested scopes. Every symbol maps to the stack of
+# its visible declarations as (depth, type, operand) entries, innermost
+# last, operand being whatever the pass stores for the declaration, so a
+# lookup is one dict access whatever the nesting depth. Each open scope
+# keeps the symbols it declared, and closing it pops only their entries.
+# Depths count from 1, the outermost scope, which is never closed.
+class SymbolTable:
+    def __init__(self):
+        self.entries = {}
+        self.scopes = [[]]
+        self.base = None             # Last snapshot taken or restored
+
+    @property
+    def depth(self):
+        return len(self.scopes)
+
+    def enter_scope(self):
+        self.scopes.append([])
+
+    def exit_scope(self):
+        if len(self.scopes) > 1:
+            entries = self.entries
+            for symbol in self.scopes.pop():
+                stack = entries[symbol]
+                stack.pop()
+                if not stack:
+                    del entries[symbol]
+
+    # Whether symbol is already declared in the innermost scope
+    def declared_here(self, symbol):
+        stack = self.entries.get(symbol)
+        return stack is not None and stack[-1][0] == len(self.scopes)
+
+    def declare(self, symbol, var_type, operand=None):
+        stack = self.entries.get(symbol)
+        if stack is None:
+            self.entries[symbol] = [(len(self.scopes), var_type, operand)]
+        else:
+            stack.append((len(self.scopes), var_type, operand))
+        self.scopes[-1].append(symbol)
+
+    # (depth, type, operand) of the innermost declaration of symbol, or None
+    def find(self, symbol):
+        stack = self.entries.get(symbol)
+        return stack[-1] if stack else None
+
+    # State of the table between top-level statements, when the outermost
+    # scope is the only one open, comparable with == and restorable. It
+    # holds the declarations made since the last snapshot taken or restored
+    # and links to that one, so the snapshots taken through a file share
+    # their declarations instead of each copying all of them. With nothing
+    # declared since, the last snapshot is returned again.
+    def snapshot(self):
+        if len(self.scopes) > 1:
+            raise Exception("Symbol table snapshot inside a nested scope")
+        base = self.base
+        declared = self.scopes[0][base.count if base is not None else 0:]
+        if base is not None and not declared:
+            return base
+        entries = self.entries
+        self.base = Declarations(base, tuple((symbol,) + entries[symbol][0][1:] for symbol in declared))
+        return self.base
+
+    def restore(self, state):
+        chain = []
+        node = state
+        while node is not None:
+            chain.append(node.added)
+            node = node.previous
+        self.entries = {}
+        self.scopes = [[]]
+        for added in reversed(chain):
+            for symbol, var_type, operand in added:
+                self.declare(symbol, var_type, operand)
+        self.base = state
+
+# Snapshot of the outermost scope: the (symbol, type, operand) declarations
+# added after the previous snapshot. Two snapshots are equal when they hold
+# the same declarations in the same order, however they are split.
+class Declarations:
+    def __init__(self, previous, added):
+        self.previous = previous
+        self.added = added
+        self.count = (previous.count if previous is not None else 0) + len(added)
+
+    # Compare from the last declaration back, up to where both chains share
+    # a snapshot
+    def __eq__(self, other):
+        if not isinstance(other, Declarations):
+            return NotImplemented
+        if self.count != other.count:
+            return False
+        left, right = self, other
+        left_index, right_index = len(left.added), len(right.added)
+        for _ in range(self.count):
+            if left is right and left_index == right_index:
+                return True
+            while left_index == 0:
+                left = left.previous
+                left_index = len(left.added)
+            while right_index == 0:
+                right = right.previous
+                right_index = len(right.added)
+            left_index -= 1
+            right_index -= 1
+            if left.added[left_index] != right.added[right_index]:
+                return False
+        return True
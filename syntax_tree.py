@@ -0,0 +1,336 @@
+import sys
+from types import GeneratorType
+
+from lexico import lexic_stream
+from ll1 import drive, load_table, stream_interner
+
+# Value type of each literal kind
+LITERAL_TYPES = {
+    'num_int': 'int', 'nim_sin_int': 'int',
+    'num_float': 'float', 'nim_sin_float': 'float',
+    'true': 'bool', 'false': 'bool'
+}
+
+FUNCTION_KINDS = {'add', 'sub', 'mul', 'div', 'and', 'or', 'not', 'high', 'low', 'equal'}
+
+# Syntax tree nodes. line is the position (line, or source offset for
+# token stores) semantic errors about the node are reported at: the name for
+# declarations and variables, the closing ')' for calls, the ';' for
+# assignments and the keyword for everything else. Identifiers are kept as
+# interned symbol ids.
+class Node:
+    __slots__ = ('line',)
+
+    # Name of the Visitor method for the node class
+    def __init_subclass__(cls):
+        cls.visit_method = 'visit_' + cls.__name__
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+class Program(Node):
+    __slots__ = ('body',)
+
+    def __init__(self, line=None):
+        self.line = line
+        self.body = []
+
+class Decl(Node):
+    __slots__ = ('type', 'symbol')
+
+    def __init__(self, type, symbol=None, line=None):
+        self.type = type
+        self.symbol = symbol
+        self.line = line
+
+class Assign(Node):
+    __slots__ = ('target', 'value')
+
+    def __init__(self, target, value=None, line=None):
+        self.target = target
+        self.value = value
+        self.line = line
+
+class Call(Node):
+    __slots__ = ('function', 'args')
+
+    def __init__(self, function, line=None):
+        self.function = function     # Upper case name, as in ADD
+        self.args = []
+        self.line = line
+
+class Literal(Node):
+    __slots__ = ('type', 'value')
+
+    def __init__(self, type, value, line=None):
+        self.type = type
+        self.value = value           # Lexeme
+        self.line = line
+
+class Name(Node):
+    __slots__ = ('symbol',)
+
+    def __init__(self, symbol, line=None):
+        self.symbol = symbol
+        self.line = line
+
+class If(Node):
+    __slots__ = ('condition', 'body')
+
+    def __init__(self, line=None):
+        self.condition = None
+        self.body = []
+        self.line = line
+
+class Else(Node):
+    __slots__ = ('body',)
+
+    def __init__(self, line=None):
+        self.body = []
+        self.line = line
+
+class While(Node):
+    __slots__ = ('condition', 'body')
+
+    def __init__(self, line=None):
+        self.condition = None
+        self.body = []
+        self.line = line
+
+class For(Node):
+    __slots__ = ('variable', 'body')
+
+    def __init__(self, line=None):
+        self.variable = None
+        self.body = []
+        self.line = line
+
+class In(Node):
+    __slots__ = ('name',)
+
+    def __init__(self, line=None):
+        self.name = None
+        self.line = line
+
+class Out(Node):
+    __slots__ = ('name',)
+
+    def __init__(self, line=None):
+        self.name = None
+        self.line = line
+
+CONTROL_NODES = {'if': If, 'else': Else, 'while': While, 'for': For}
+
+# Base class of the passes over the tree: visit(node) calls
+# visit_<NodeClass>(node). Methods of nodes with children are generators
+# that yield each child when it is to be visited, and are resumed once it
+# has been. visit() runs them from its own work stack instead of the Python
+# one, so any nesting depth can be walked. Errors raised while visiting a
+# node are given the node's line as their position, unless a node below
+# already did.
+class Visitor:
+    def visit(self, node):
+        walkers = []                 # (generator, node) being visited, innermost last
+        current = node               # Node whose method is running
+        try:
+            result = getattr(self, node.visit_method)(node)
+            if type(result) is not GeneratorType:
+                return result
+            walkers.append((result, node))
+            while walkers:
+                walker, current = walkers[-1]
+                child = next(walker, None)
+                if child is None:
+                    walkers.pop()
+                    continue
+                current = child
+                result = getattr(self, child.visit_method)(child)
+                if type(result) is GeneratorType:
+                    walkers.append((result, child))
+        except Exception as error:
+            if not hasattr(error, 'position'):
+                error.position = current.line
+            raise
+
+    # Run check(*args) with its errors reported at the line of node
+    def at(self, node, check, *args):
+        try:
+            return check(*args)
+        except Exception as error:
+            if not hasattr(error, 'position'):
+                error.position = node.line
+            raise
+
+    # Visit a top-level statement, passes that keep state between
+    # statements reset there what one statement leaves for the next
+    def visit_statement(self, node):
+        self.visit(node)
+
+    def visit_Program(self, node):
+        for statement in node.body:
+            self.visit_statement(statement)
+
+# Semantic action that builds the tree from the terminals the LL(1) driver
+# matches. on_statement, when given, is called with every top-level
+# statement as soon as it is complete, so passes can run during the parse.
+# Without keep_tree the statement is dropped from the program body after
+# that, so only the statement being read is ever held in memory.
+class TreeBuilder:
+    def __init__(self, on_statement=None, keep_tree=True):
+        self.on_statement = on_statement
+        self.keep_tree = keep_tree
+        self.program = None
+        self.blocks = []             # Open statement lists, innermost last
+        self.statement = None        # Statement or control header being read
+        self.calls = []              # Calls whose arguments are being read
+        self.ended = False
+
+    # True between two top-level statements
+    def at_top_level(self):
+        return self.statement is None and not self.calls and len(self.blocks) <= 1
+
+    # State at a top-level boundary, restore() rebuilds a builder (without
+    # the statements already reported) from it
+    def snapshot(self):
+        return (self.program is not None, len(self.blocks), self.ended)
+
+    def restore(self, state):
+        started, depth, self.ended = state
+        self.program = Program() if started else None
+        self.blocks = [self.program.body] if depth else []
+        self.statement = None
+        self.calls = []
+
+    # Top-level statements are reported once complete, control statements
+    # when their block closes
+    def finish(self, node):
+        self.blocks[-1].append(node)
+        self.statement = None
+        if len(self.blocks) == 1:
+            self.report()
+
+    # Hand the last top-level statement to on_statement
+    def report(self):
+        body = self.blocks[0]
+        if self.on_statement is not None:
+            self.on_statement(body[-1])
+        if not self.keep_tree:
+            body.pop()
+
+    def open(self, node):
+        self.blocks[-1].append(node)
+        self.statement = node
+
+    # Literal, variable or call result used as a value
+    def operand(self, node):
+        if self.calls:
+            self.calls[-1].args.append(node)
+        else:
+            self.statement.value = node
+
+    def shift(self, top, current_lexeme, position):
+        handler = self.handlers.get(top)
+        if handler is not None:
+            handler(self, top, current_lexeme, position)
+
+    def shift_id(self, top, symbol, position):
+        statement = self.statement
+        if statement is None:
+            self.statement = Assign(Name(symbol, position))
+        elif isinstance(statement, Decl):
+            statement.symbol = symbol
+            statement.line = position
+        elif isinstance(statement, Assign):
+            self.operand(Name(symbol, position))
+        elif isinstance(statement, (If, While)):
+            statement.condition = Name(symbol, position)
+        elif isinstance(statement, For):
+            statement.variable = Name(symbol, position)
+        else:
+            statement.name = Name(symbol, position)
+
+    def shift_literal(self, top, lexeme, position):
+        self.operand(Literal(LITERAL_TYPES[top], lexeme, position))
+
+    def shift_function(self, top, lexeme, position):
+        self.calls.append(Call(top.upper()))
+
+    # Closes a call, or the parentheses of a condition or IN/OUT
+    def shift_par_dir(self, top, lexeme, position):
+        if self.calls:
+            call = self.calls.pop()
+            call.line = position
+            self.operand(call)
+
+    def shift_semicolon(self, top, lexeme, position):
+        statement = self.statement
+        if statement is not None:
+            if isinstance(statement, Assign):
+                statement.line = position
+            self.finish(statement)
+
+    def shift_type(self, top, lexeme, position):
+        self.statement = Decl(top)
+
+    def shift_control(self, top, lexeme, position):
+        self.open(CONTROL_NODES[top](position))
+
+    def shift_io(self, top, lexeme, position):
+        self.statement = In(position) if top == 'in' else Out(position)
+
+    # Blocks, the first one is the program body
+    def shift_char_esq(self, top, lexeme, position):
+        if self.program is not None and not self.blocks and not self.ended:
+            self.blocks.append(self.program.body)
+        elif self.statement is not None:
+            self.blocks.append(self.statement.body)
+            self.statement = None
+
+    def shift_char_dir(self, top, lexeme, position):
+        if self.blocks:
+            self.blocks.pop()
+            if len(self.blocks) == 1:
+                self.report()
+
+    def shift_start(self, top, lexeme, position):
+        self.program = Program(position)
+
+    # END also ends blocks left open
+    def shift_end(self, top, lexeme, position):
+        if len(self.blocks) > 1:
+            del self.blocks[1:]
+            self.report()
+        self.blocks = []
+        self.ended = True
+
+    # Terminal kind to its action, kinds without one only shape the tree
+    handlers = {
+        'id': shift_id,
+        'par_dir': shift_par_dir,
+        'ponto-virgula': shift_semicolon,
+        'int': shift_type, 'float': shift_type, 'bool': shift_type,
+        'if': shift_control, 'else': shift_control, 'while': shift_control, 'for': shift_control,
+        'in': shift_io, 'out': shift_io,
+        'char_esq': shift_char_esq,
+        'char_dir': shift_char_dir,
+        'start': shift_start,
+        'end': shift_end
+    }
+    handlers.update(dict.fromkeys(LITERAL_TYPES, shift_literal))
+    handlers.update(dict.fromkeys(FUNCTION_KINDS, shift_function))
+
+# Parse input_tokens into a Program, see TreeBuilder for on_statement and
+# keep_tree
+def build_tree(input_tokens, interner=None, on_statement=None, keep_tree=True):
+    interner = interner if interner is not None else stream_interner(input_tokens)
+    builder = TreeBuilder(on_statement, keep_tree)
+    drive(load_table(), input_tokens, [builder.shift], interner)
+    return builder.program
+
+# Print the tree of a file
+if __name__ == "__main__":
+    with open(sys.argv[1], 'r') as file:
+        program = build_tree(lexic_stream(file))
+    for statement in program.body:
+        print(statement)
@@ -0,0 +1,26 @@
+import batch
+
+PROGRAM = "START{\nINT x;\nOUT(x);\nEND;\n}\n"
+
+# A file that raises fails alone, the others still compile
+def test_job_failure_is_reported(tmp_path, monkeypatch):
+    paths = []
+    for name in ('a.j', 'b.j'):
+        path = tmp_path / name
+        path.write_text(PROGRAM)
+        paths.append(str(path))
+    compile_source = batch.compile_source
+
+    def failing(path, **options):
+        if path.endswith('a.j'):
+            raise RuntimeError("boom")
+        return compile_source(path=path, **options)
+    monkeypatch.setattr(batch, 'compile_source', failing)
+
+    report = batch.compile_batch(paths, workers=1, output=str(tmp_path / 'out'))
+    assert report['summary']['ok'] == 1
+    assert report['summary']['failed'] == 1
+    failed = report['files'][0]
+    assert failed['status'] == 'error'
+    assert failed['diagnostics'] == [{'phase': 'internal', 'line': None, 'message': "RuntimeError: boom"}]
+    assert report['files'][1]['etac'] is not None
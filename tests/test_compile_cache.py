@@ -0,0 +1,13 @@
+import os
+
+from compile_cache import CompileCache
+from compiler import compile_source
+
+def test_invalid_utf8_not_cached(tmp_path):
+    path = tmp_path / 'latin1.j'
+    path.write_bytes("START{\nINT caf\xe9;\nEND;\n}\n".encode('latin-1'))
+    cache = CompileCache(str(tmp_path / 'cache'))
+    result = cache.compile(path=str(path))
+    assert result.diagnostics == compile_source(path=str(path)).diagnostics
+    assert result.diagnostics[0][0] == 'input'
+    assert not os.path.exists(tmp_path / 'cache')
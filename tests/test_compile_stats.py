@@ -0,0 +1,27 @@
+from compiler import compile_source
+
+def program(statements):
+    return "START{\nINT x;\n" + "".join(statements) + "END;\n}\n"
+
+# A failed parse is only counted up to where it stopped
+def test_parse_counts_stop_at_error():
+    short = compile_source(source=program(["x = y;\n"]), stats=True)
+    long = compile_source(source=program(["x = y;\n"] + ["x = 1;\n"] * 100), stats=True)
+    assert short.diagnostics == long.diagnostics == [('semantic', 3, "Undefined variable 'y'")]
+    assert long.stats['parse'] == short.stats['parse']
+    assert long.stats['lex']['tokens'] > short.stats['lex']['tokens']
+
+    valid = compile_source(source=program(["x = 1;\n"] * 100), stats=True)
+    assert valid.stats['parse']['table_lookups'] > long.stats['parse']['table_lookups']
+
+def test_skipped_phases_not_timed():
+    result = compile_source(source=program(["x = 1;\n"]), check=False, stats=True)
+    assert list(result.stats['timings']) == ['lex', 'parse', 'etac']
+    assert 'check' not in result.stats
+
+def test_hooks_per_call():
+    seen = []
+    result = compile_source(source=program(["x = 1;\n"]), hooks=[seen.append])
+    assert seen == [result.stats]
+    assert compile_source(source=program(["x = 1;\n"])).stats is None
+    assert len(seen) == 1
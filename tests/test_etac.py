@@ -0,0 +1,100 @@
+import io
+
+import pytest
+
+import ETAC
+import semantico
+from compiler import compile_source
+from lexico import lexic_regex
+from vm import VM
+
+def program(body):
+    return "START{\nBOOL a;\nBOOL b;\nINT x;\n" + body + "\nOUT(x);\nEND;\n}\n"
+
+def accepted(module, source):
+    try:
+        module.analyze(lexic_regex(source.splitlines(True), []))
+    except Exception:
+        return False
+    return True
+
+def run(source, values):
+    result = compile_source(source=source, check=False)
+    assert result.success, result.diagnostics
+    output = io.StringIO()
+    VM(result.ir, io.StringIO(values), output).run()
+    return output.getvalue().split()
+
+ELSE_PLACEMENTS = [
+    "IF(a){ x = 1; } ELSE{ x = 2; }",
+    "IF(a){ x = 1; } x = 3; ELSE{ x = 2; }",
+    "IF(a){ ELSE{ x = 2; } }",
+    "IF(a){ IF(b){ x = 1; } } ELSE{ x = 2; }",
+    "IF(a){ x = 1; } WHILE(b){ IF(b){ x = 1; } b = FALSE; } ELSE{ x = 2; }",
+    "WHILE(b){ IF(a){ x = 1; } b = FALSE; } ELSE{ x = 2; }",
+    "IF(a){ IF(b){ x = 1; } ELSE{ x = 3; } } ELSE{ x = 2; }",
+    "IF(a){ x = 1; } ELSE{ x = 2; } ELSE{ x = 3; }",
+    "ELSE{ x = 2; }",
+]
+
+# The checker and the generator take the same ELSEs
+@pytest.mark.parametrize('body', ELSE_PLACEMENTS)
+def test_else_agrees(body):
+    source = program(body)
+    assert accepted(ETAC, source) == accepted(semantico, source)
+
+# An ELSE pairs with the IF of its own block, even when an IF in a loop
+# body ran after it or never ran at all. Without an IF of its own block it
+# is rejected: the IF it would take may be in a loop that ran zero times.
+def test_else_pairing():
+    source = program("IN(a);\nIN(b);\nIF(a){ x = 1; } WHILE(b){ IF(b){ x = 1; } b = FALSE; } ELSE{ x = 2; }")
+    assert run(source, "true true") == ['1']
+    assert run(source, "false true") == ['2']
+    assert run(source, "true false") == ['1']
+    assert run(source, "false false") == ['2']
+    source = program("IN(a);\nIN(b);\nWHILE(b){ IF(a){ x = 1; } b = FALSE; } ELSE{ x = 2; }")
+    assert not accepted(semantico, source)
+    assert not accepted(ETAC, source)
+    assert compile_source(source=source, check=False).diagnostics == [('semantic', 7, "ELSE without matching IF")]
+
+SHADOWING = """START{
+    INT x;
+    BOOL c;
+    x = 5;
+    c = TRUE;
+    IF(c){
+        FLOAT x;
+        x = 1.5;
+        OUT(x);
+    }
+    OUT(x);
+    END;
+}
+"""
+
+# An inner declaration has its own storage, the outer variable keeps its value
+@pytest.mark.parametrize('optimize', [False, True])
+def test_shadowing(optimize):
+    import pycodegen
+    import vectorized
+
+    result = compile_source(source=SHADOWING, optimize=optimize)
+    assert result.success, result.diagnostics
+    output = io.StringIO()
+    vm = VM(result.ir, io.StringIO(), output)
+    vm.run()
+    assert output.getvalue().split() == ['1.5', '5']
+    if not optimize:
+        assert vm.variables() == {'x': 5, 'c': True, 'x_1': 1.5}
+
+    output = io.StringIO()
+    pycodegen.run_program(result.ir, io.StringIO(), output)
+    assert output.getvalue().split() == ['1.5', '5']
+
+    batch = vectorized.run_batch(result.ir, lanes=1)
+    assert batch.lane_output(0) == ['1.5', '5']
+
+def test_shadowing_etac():
+    result = compile_source(source=SHADOWING)
+    assert 'x_1: float = 0.0' in result.etac_code
+    assert result.etac_code[-1] == 'out x'
@@ -0,0 +1,46 @@
+from incremental import CheckedDocument, LexedDocument
+from lexico import lexic_regex
+
+PROGRAM = """START{
+    INT x;
+    x = ADD(x, 1);
+    OUT(x);
+    END;
+}
+"""
+
+def test_document_from_text():
+    document = LexedDocument(PROGRAM)
+    assert document.lines == PROGRAM.splitlines(True)
+    assert document.text() == PROGRAM
+    assert list(document.tokens()) == list(lexic_regex(PROGRAM.splitlines(True), []))
+    assert document.errors() == []
+
+def test_text_and_lines_agree():
+    from_text = CheckedDocument(PROGRAM)
+    from_lines = CheckedDocument(PROGRAM.splitlines(True))
+    assert from_text.lines == from_lines.lines
+    assert from_text.error is None and from_lines.error is None
+
+    from_text.edit([(3, 4, "    x = y;\n")])
+    from_lines.edit([(3, 4, ["    x = y;\n"])])
+    assert from_text.error == from_lines.error
+    assert from_text.error[0] == 3
+
+# An IF added near the top leaves the state of the following statements as
+# it was, so the parse stops at the next checkpoint past it
+def test_inserted_if_resyncs():
+    body = ["    INT x;\n", "    BOOL b;\n"]
+    for index in range(500):
+        body.append(f"    x = ADD(x, {index});\n")
+        if index % 5 == 0:
+            body += ["    IF(b){\n", "        OUT(x);\n", "    }\n"]
+    document = CheckedDocument(["START{\n"] + body + ["    END;\n", "}\n"])
+    assert document.error is None
+
+    document.edit([(5, 5, ["    IF(b){\n", "    }\n"])])
+    assert document.error is None
+    assert document.reparsed <= 2 * document.interval
+    document.edit([(5, 7, [])])
+    assert document.error is None
+    assert document.reparsed <= 2 * document.interval
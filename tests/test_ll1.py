@@ -0,0 +1,26 @@
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+
+import ll1
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The artifact written by running ll1.py is the one load_table reads back
+def test_script_artifact_loads(tmp_path, monkeypatch):
+    grammar = tmp_path / 'gramatica.txt'
+    shutil.copy(ll1.GRAMMAR_PATH, grammar)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'll1.py'), str(grammar)], check=True,
+                   capture_output=True, cwd=tmp_path)
+
+    artifact = ll1.artifact_path(str(grammar), ll1.grammar_key(grammar.read_text()))
+    with open(artifact, 'rb') as file:
+        table = pickle.load(file)
+    assert type(table) is ll1.ParseTable
+
+    def rebuilt(text):
+        raise AssertionError("load_table rebuilt the table")
+    monkeypatch.setattr(ll1, 'generate_table', rebuilt)
+    assert ll1.load_table(str(grammar)).rows == table.rows
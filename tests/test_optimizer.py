@@ -0,0 +1,46 @@
+import io
+
+from compiler import compile_source
+from etac_ir import CONSTANT, DECL, constant_type
+from optimizer import optimize, operand_types
+from vm import VM
+
+SOURCE = """START{
+    INT x;
+    FLOAT f;
+    BOOL b;
+    IN(f);
+    x = 2.75;
+    OUT(x);
+    INT y;
+    y = f;
+    OUT(y);
+    b = FALSE;
+    WHILE(b){
+        OUT(x);
+    }
+    END;
+}
+"""
+
+def run(ir, values):
+    output = io.StringIO()
+    VM(ir, io.StringIO(values), output).run()
+    return output.getvalue().split()
+
+# Declarations taking over a copy keep the declared type
+def test_declarations_keep_their_type():
+    ir = compile_source(source=SOURCE, check=False).ir
+    optimized = optimize(ir)
+    types = operand_types([[optimized.ops[index], optimized.types[index], optimized.dests[index], 0, 0]
+                           for index in range(len(optimized))])
+    for index in range(len(optimized)):
+        if optimized.ops[index] != DECL:
+            continue
+        value = optimized.lefts[index]
+        if optimized.operand_kinds[value] == CONSTANT:
+            assert constant_type(optimized.operand_values[value]) == optimized.types[index]
+        else:
+            assert types.get(value) == optimized.types[index]
+    assert run(optimized, "2.5") == run(ir, "2.5") == ['2', '2']
+    assert len(optimized) < len(ir)
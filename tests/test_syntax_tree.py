@@ -0,0 +1,40 @@
+import pytest
+
+import ETAC
+import semantico
+from compiler import compile_source
+from lexico import lexic_regex
+
+def nested_ifs(depth, statement="x = 1;"):
+    return ("START{\nBOOL b;\nINT x;\n" + "IF(b){\n" * depth + statement + "\n" + "}\n" * depth
+            + "OUT(x);\nEND;\n}\n")
+
+def nested_calls(depth):
+    return "START{\nINT x;\nx = " + "ADD(x, " * depth + "1" + ")" * depth + ";\nOUT(x);\nEND;\n}\n"
+
+def tokens(source):
+    return lexic_regex(source.splitlines(True), [])
+
+@pytest.mark.parametrize('depth', [400, 5000])
+def test_deep_nesting(depth):
+    for source in (nested_ifs(depth), nested_calls(depth)):
+        semantico.analyze(tokens(source))
+        assert ETAC.analyze(tokens(source)).etac_code[-1] == 'out x'
+        result = compile_source(source=source)
+        assert result.success, result.diagnostics
+
+# Errors deep down are still reported at the innermost node
+def test_deep_error_position():
+    source = nested_ifs(2000, "x = TRUE;")
+    with pytest.raises(Exception) as error:
+        semantico.analyze(tokens(source))
+    assert error.value.position == 2004
+    result = compile_source(source=source)
+    assert result.diagnostics == [('semantic', 2004, "Cannot convert bool to int")]
+
+def test_keep_tree():
+    source = nested_ifs(3)
+    assert semantico.analyze(tokens(source)).tree is None
+    tree = semantico.analyze(tokens(source), keep_tree=True).tree
+    assert [type(statement).__name__ for statement in tree.body] == ['Decl', 'Decl', 'If', 'Out']
+    assert len(compile_source(source=source).tree.body) == 4
@@ -0,0 +1,60 @@
+import pytest
+
+import semantico
+from compiler import compile_source
+from lexico import lexic_regex
+from token_store import MappedTokenStore, MappedTokenStream, TokenStore
+
+PROGRAM = """START{
+    INT x;
+    FLOAT café;
+    x = ADD(x, -2.5) @;
+    IF(TRUE){
+    }
+    END;
+}
+"""
+
+@pytest.fixture
+def program(tmp_path):
+    path = tmp_path / 'program.j'
+    path.write_text(PROGRAM, encoding='utf-8')
+    return str(path)
+
+# Non-ASCII files are scanned as text, so every scan agrees with the lexer
+@pytest.mark.parametrize('source', [PROGRAM, PROGRAM.replace('café', 'cafe')])
+def test_stores_match_lexer(tmp_path, source):
+    path = tmp_path / 'program.j'
+    path.write_text(source, encoding='utf-8')
+    expected_errors = []
+    expected = lexic_regex(source.splitlines(True), expected_errors)
+    assert expected_errors == [(4, '@')]
+    for build, argument in ((TokenStore, source), (MappedTokenStore, str(path))):
+        errors = []
+        store = build(argument, errors=errors)
+        assert list(store.tokens()) == expected
+        assert errors == expected_errors
+        assert store.line_count() == len(source.splitlines())
+        with MappedTokenStream(str(path), errors=[]) as stream:
+            assert list(stream) == list(store)
+
+def test_stream_error_line(program):
+    with MappedTokenStream(program, errors=[]) as tokens:
+        with pytest.raises(Exception) as error:
+            semantico.analyze(tokens)
+        assert tokens.line(error.value.position) == 4
+
+# Files compile like their text, with diagnostics at the same lines
+def test_compile_path(program):
+    source = compile_source(source=PROGRAM)
+    path = compile_source(path=program)
+    assert path.diagnostics == source.diagnostics
+    assert ('semantic', 4, "Cannot convert float to int") in path.diagnostics
+
+def test_invalid_utf8(tmp_path):
+    path = tmp_path / 'latin1.j'
+    path.write_bytes(PROGRAM.encode('latin-1'))
+    with pytest.raises(UnicodeDecodeError):
+        MappedTokenStore(str(path))
+    result = compile_source(path=str(path))
+    assert result.diagnostics == [('input', None, f"Cannot read {path}: invalid UTF-8 at byte 31")]
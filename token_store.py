@@ -0,0 +1,288 @@
+import mmap
+import re
+from array import array
+from bisect import bisect_right
+
+from lexico import master_pattern, master_pattern_bytes, terminal_ids, terminals, token_dict
+
+# Kinds whose lexeme is needed by the parser
+LITERAL_KINDS = {'num_int', 'num_float', 'nim_sin_int', 'nim_sin_float', 'true', 'false'}
+
+ID_KIND = terminal_ids['id']
+LITERAL_IDS = {terminal_ids[kind] for kind in LITERAL_KINDS}
+NUM_INT = terminal_ids['num_int']
+NUM_FLOAT = terminal_ids['num_float']
+SIGNED_FLOAT = terminal_ids['nim_sin_float']
+
+# Keyword and symbol lexemes straight to terminal ids
+WORD_IDS = {lexeme: terminal_ids[kind] for lexeme, kind in token_dict.items()}
+WORD_IDS_BYTES = {lexeme.encode(): kind for lexeme, kind in WORD_IDS.items()}
+# and back, each of those kinds has a single lexeme
+WORD_LEXEMES = {kind: lexeme for lexeme, kind in WORD_IDS.items()}
+
+# Line breaks of files, as open() reads them, and of text, as
+# str.splitlines() splits it
+NEWLINE = re.compile(b'\r\n?|\n')
+NEWLINE_TEXT = re.compile(NEWLINE.pattern.decode())
+LINE_BREAKS = re.compile('\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]')
+
+# Tokens buffered in plain lists before being moved into the arrays
+CHUNK_SIZE = 65536
+
+# Maps identifier names to small integer symbol ids and back
+class Interner:
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, name):
+        symbol = self.ids.get(name)
+        if symbol is None:
+            symbol = len(self.names)
+            self.ids[name] = symbol
+            self.names.append(name)
+        return symbol
+
+    def name(self, symbol):
+        return self.names[symbol]
+
+    def __len__(self):
+        return len(self.names)
+
+# Bytes outside ASCII: the byte pattern only knows ASCII letters, so such
+# files are decoded and scanned as text like the other lexers do
+NON_ASCII = re.compile(b'[\x80-\xff]')
+
+# Source text for scan(). Positions are offsets into it, turned into line
+# numbers by a newline index built the first time one is needed.
+class Source:
+    def __init__(self, text, interner=None):
+        self.source = text
+        self.interner = interner if interner is not None else Interner()
+        self.newlines = None
+        self.pattern, self.words, self.newline, self.decode = master_pattern, WORD_IDS, LINE_BREAKS, str
+
+    # Line of a source offset, from the newline index
+    def offset_line(self, offset):
+        if self.newlines is None:
+            self.newlines = array('I', (match.start() for match in self.newline.finditer(self.source)))
+        return bisect_right(self.newlines, offset) + 1
+
+    # Line of a token position, which is its source offset
+    def line(self, position):
+        return self.offset_line(position)
+
+    # Lines of the source, counted like str.splitlines does
+    def line_count(self):
+        size = len(self.source)
+        if not size:
+            return 0
+        self.offset_line(0)
+        return len(self.newlines) + (self.newline.match(self.source, size - 1) is None)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# A memory-mapped source file. ASCII files are scanned in place as bytes,
+# others from their decoded text.
+class MappedSource(Source):
+    def __init__(self, filepath, interner=None):
+        with open(filepath, 'rb') as file:
+            try:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                self.map = None
+        data = memoryview(self.map if self.map is not None else b'')
+        if NON_ASCII.search(data) is None:
+            Source.__init__(self, data, interner)
+            self.pattern, self.words, self.newline, self.decode = master_pattern_bytes, WORD_IDS_BYTES, NEWLINE, bytes.decode
+        else:
+            # Closed whether or not the file decodes
+            self.source = data
+            try:
+                text = str(data, 'utf-8')
+            finally:
+                MappedSource.close(self)
+            Source.__init__(self, text, interner)
+            self.newline = NEWLINE_TEXT
+
+    def close(self):
+        if isinstance(self.source, memoryview):
+            self.source.release()
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+# Message for a file MappedSource could not decode
+def decode_error(path, error):
+    return f"Cannot read {path}: invalid UTF-8 at byte {error.start}"
+
+# Parser view of the tokens of a Source, scanned as they are pulled:
+# terminal ids, with identifiers as their symbol id, literals as their
+# lexeme and every other token without one. The last item is the token's
+# source offset, source.offset_line() gives its line. Unknown characters
+# are reported as lexic_stream does.
+def scan(source, errors=None):
+    words = source.words
+    literals = LITERAL_IDS
+    decode = source.decode
+    intern = source.interner.intern
+    known = {}                       # Identifier lexemes already interned
+
+    for match in source.pattern.finditer(source.source):
+        kind = match.lastgroup
+        if kind == 'space' or kind == 'comment' or kind == 'dash':
+            continue
+
+        # Keyword, variable or symbol
+        if kind == 'word' or kind == 'symbol':
+            lexeme = match.group()
+            terminal = words.get(lexeme)
+            if terminal is not None:
+                yield (WORD_LEXEMES[terminal] if terminal in literals else None, terminal, match.start())
+                continue
+            symbol = known.get(lexeme)
+            if symbol is None:
+                symbol = known[lexeme] = intern(decode(lexeme))
+            yield (symbol, ID_KIND, match.start())
+
+        # Number, float if it has a dot
+        elif kind == 'number':
+            lexeme = decode(match.group())
+            yield (lexeme, NUM_FLOAT if '.' in lexeme else NUM_INT, match.start())
+
+        # Signalized number (lexic tags both forms as nim_sin_float)
+        elif kind == 'signed':
+            yield (decode(match.group()), SIGNED_FLOAT, match.start())
+
+        elif errors is None:
+            print("Erro encontrado na linha", source.offset_line(match.start()))
+        else:
+            errors.append((source.offset_line(match.start()), decode(match.group())))
+
+# Tokens of a mapped file, scanned while the parser pulls them so that
+# nothing but the source mapping is held for a whole-file parse
+class MappedTokenStream(MappedSource):
+    def __init__(self, filepath, interner=None, errors=None):
+        MappedSource.__init__(self, filepath, interner)
+        self.errors = errors
+        self.scans = []
+
+    def __iter__(self):
+        scanner = scan(self, self.errors)
+        self.scans.append(scanner)
+        return scanner
+
+    # A scan left unfinished, by a parse error, still holds the buffer
+    def close(self):
+        for scanner in self.scans:
+            scanner.close()
+        self.scans.clear()
+        MappedSource.close(self)
+
+# Tokens of a source text stored column-wise: one array entry per token
+# instead of a tuple of strings. values holds the symbol id of an
+# identifier, the index in literals of a literal's lexeme (each distinct
+# lexeme is kept once) and -1 for any other token, positions the source
+# offset of each token. Only the newline index is kept of the source, for
+# line(). drive() reads the columns directly.
+class TokenStore:
+    def __init__(self, text, interner=None, errors=None):
+        self.fill(Source(text, interner), errors)
+
+    def fill(self, source, errors=None):
+        self.interner = source.interner
+        self.kinds = array('B')      # Terminal ids
+        self.values = array('i')
+        self.positions = array('I')
+        self.literals = []
+        literal_ids = {}
+        kinds, values, positions = [], [], []
+        columns = [(self.kinds, kinds), (self.values, values), (self.positions, positions)]
+
+        for value, kind, position in scan(source, errors):
+            kinds.append(kind)
+            positions.append(position)
+            if kind == ID_KIND:
+                values.append(value)
+            elif value is None:
+                values.append(-1)
+            else:
+                literal = literal_ids.get(value)
+                if literal is None:
+                    literal = literal_ids[value] = len(self.literals)
+                    self.literals.append(value)
+                values.append(literal)
+
+            # Move full chunks into the compact columns
+            if len(kinds) == CHUNK_SIZE:
+                for column, chunk in columns:
+                    column.extend(chunk)
+                    chunk.clear()
+
+        for column, chunk in columns:
+            column.extend(chunk)
+
+        self.lines = source.line_count()
+        source.offset_line(0)
+        self.newlines = source.newlines
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def lexeme(self, index):
+        kind = self.kinds[index]
+        value = self.values[index]
+        if kind == ID_KIND:
+            return self.interner.names[value]
+        if value >= 0:
+            return self.literals[value]
+        return WORD_LEXEMES[kind]
+
+    # Line of a token position, which is its source offset
+    def line(self, position):
+        return bisect_right(self.newlines, position) + 1
+
+    def line_count(self):
+        return self.lines
+
+    # Same (lexeme, kind, line) tuple the lexers produce
+    def token(self, index):
+        return (self.lexeme(index), terminals[self.kinds[index]], self.line(self.positions[index]))
+
+    # All of them, lines counted in one pass over the newline index
+    def tokens(self):
+        newlines = self.newlines
+        count = len(newlines)
+        line = 0                     # Newlines before the token
+        lexeme = self.lexeme
+        kinds = self.kinds
+        for index, position in enumerate(self.positions):
+            while line < count and newlines[line] < position:
+                line += 1
+            yield (lexeme(index), terminals[kinds[index]], line + 1)
+
+    # Same parser view as scan(), without scanning again
+    def __iter__(self):
+        literals = self.literals
+        for kind, value, position in zip(self.kinds, self.values, self.positions):
+            if kind == ID_KIND:
+                yield (value, kind, position)
+            elif value >= 0:
+                yield (literals[value], kind, position)
+            else:
+                yield (None, kind, position)
+
+# Token store of a file, scanned from its memory mapping. The mapping is
+# closed once the file is scanned.
+class MappedTokenStore(TokenStore):
+    def __init__(self, filepath, interner=None, errors=None):
+        with MappedSource(filepath, interner) as source:
+            self.fill(source, errors)
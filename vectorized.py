@@ -0,0 +1,391 @@
+import argparse
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from etac_ir import (ADD, AND, COPY, DECL, DIV, EQUAL, GOTO, HIGH, IF_FALSE, IF_TRUE, IN, LABEL, LOW, NOT, OR, OUT,
+                     SUB, CONSTANT, REGISTER, SLOT, TYPE_IDS, VARIABLE, constant_text, constant_value, convert,
+                     render_instruction, variable_name)
+
+INT, FLOAT, BOOL = TYPE_IDS['int'], TYPE_IDS['float'], TYPE_IDS['bool']
+
+# Outcome of a batch, one lane per record. outputs[k] holds the k-th OUT
+# value of every lane, written[k] which lanes wrote one and types[k] the
+# type id of each lane's value (a column only turns float64 when lanes
+# wrote values of different types to it). errors is the
+# IR index of the instruction each lane failed at, -1 for lanes that ran
+# to the end.
+class BatchResult:
+    def __init__(self, lanes):
+        self.lanes = lanes
+        self.outputs = []
+        self.written = []
+        self.types = []
+        self.variables = {}
+        self.errors = np.full(lanes, -1, dtype=np.int64)
+        self.steps = 0
+
+    # OUT values of one lane, as the VM would print them
+    def lane_output(self, lane):
+        return [constant_text(convert(int(types[lane]), column[lane].item()))
+                for column, written, types in zip(self.outputs, self.written, self.types) if written[lane]]
+
+# Runs an EtacIR over a batch of records at once: every variable and
+# temporary is an array with one lane per record (int32, float64 or bool,
+# as the instruction writing it says) and each instruction is one NumPy
+# operation over all lanes. Every lane has its own program counter; the
+# instruction run next is the lowest one any unfinished lane is at, and it
+# only writes the lanes at it. Lanes that went different ways on an IF or
+# WHILE so wait for each other and are back in step after the branch or
+# loop, and while all lanes are in step no mask is needed.
+class BatchVM:
+    def __init__(self, ir, inputs=(), lanes=None, booleans=None):
+        if np is None:
+            raise Exception("Vectorized execution needs NumPy")
+        if any(kind == REGISTER or kind == SLOT for kind in ir.operand_kinds):
+            raise Exception("Vectorized execution runs ETAC before register allocation")
+        self.dtypes = [np.int32, np.float64, np.bool_]
+        self.ir = ir
+        self.inputs = [np.asarray(column, dtype=np.float64) for column in inputs]
+        if lanes is None:
+            if not self.inputs:
+                raise Exception("A batch without inputs needs a lane count")
+            lanes = len(self.inputs[0])
+        if any(len(column) != lanes for column in self.inputs):
+            raise Exception("Every input column needs one value per lane")
+        # Which input values were written true or false: only those are read
+        # into a BOOL and they are not numbers, as for the VM's text input.
+        # Without booleans, the values of bool columns are.
+        if booleans is None:
+            booleans = [np.full(lanes, np.asarray(column).dtype == np.bool_) for column in inputs]
+        self.booleans = [np.asarray(column, dtype=np.bool_) for column in booleans]
+        if len(self.booleans) != len(self.inputs) or any(len(column) != lanes for column in self.booleans):
+            raise Exception("booleans needs one value per input value")
+        self.lanes = lanes
+        self.stacked = None          # 2D inputs and booleans, for lanes at different reads
+
+        # Jump targets as instruction indexes, labels stay as no-ops
+        self.targets = {ir.dests[index]: index for index in range(len(ir)) if ir.ops[index] == LABEL}
+        self.memory = {}
+        self.constants = {}
+        for operand, kind in enumerate(ir.operand_kinds):
+            if kind == CONSTANT:
+                try:
+                    value = constant_value(ir.operand_values[operand])
+                except ValueError:
+                    raise Exception(f"Malformed constant '{ir.operand_values[operand]}'")
+                dtype = np.bool_ if isinstance(value, bool) else np.float64 if isinstance(value, float) else np.int32
+                self.constants[operand] = dtype(value)
+
+    def read(self, operand):
+        value = self.constants.get(operand)
+        if value is not None:
+            return value
+        value = self.memory.get(operand)
+        if value is None:
+            value = self.memory[operand] = np.zeros(self.lanes, dtype=np.int32)
+        return value
+
+    # Store values (an array or a scalar) into the lanes of mask, or all
+    # lanes when mask is None. Arrays are never changed in place, so
+    # operands can share them.
+    def write(self, operand, values, type_id, mask):
+        dtype = self.dtypes[type_id]
+        if mask is None:
+            if np.ndim(values) == 0:
+                values = np.full(self.lanes, values, dtype=dtype)
+            self.memory[operand] = values.astype(dtype, copy=False)
+        else:
+            self.memory[operand] = np.where(mask, values, self.read(operand)).astype(dtype, copy=False)
+
+    # Lanes in mask (all when None) where bad is true stop with an error
+    def fail(self, bad, mask, index, pcs):
+        if mask is not None:
+            bad = bad & mask
+        if np.ndim(bad) == 0:
+            bad = np.full(self.lanes, bool(bad))
+        if bad.any():
+            self.result.errors[bad] = index
+            pcs[bad] = len(self.ir)
+        return bad
+
+    # values converted for a destination of type type_id; lanes that cannot
+    # be converted are flagged in the returned mask
+    def convert(self, type_id, values):
+        if type_id == FLOAT:
+            return np.asarray(values, dtype=np.float64), False
+        if type_id == BOOL:
+            return np.asarray(values).astype(np.bool_), False
+        values = np.asarray(values)
+        if values.dtype == np.int32:
+            return values, False
+        if values.dtype == np.bool_:
+            return values.astype(np.int32), False
+        bad = ~np.isfinite(values)
+        truncated = np.trunc(np.where(bad, 0, values))
+        # Wrap around like the other backends
+        wrapped = ((truncated.astype(np.int64) + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+        return wrapped.astype(np.int32), bad
+
+    def binary(self, op, type_id, left, right):
+        if op == LOW:
+            return np.less(left, right), False
+        if op == HIGH:
+            return np.greater(left, right), False
+        if op == EQUAL:
+            return np.equal(left, right), False
+        if op == AND:
+            return np.logical_and(left, right), False
+        if op == OR:
+            return np.logical_or(left, right), False
+        if type_id == INT:
+            if op != DIV and np.asarray(left).dtype == np.int32 and np.asarray(right).dtype == np.int32:
+                # int32 arithmetic wraps around by itself
+                if op == ADD:
+                    return np.add(left, right), False
+                if op == SUB:
+                    return np.subtract(left, right), False
+                return np.multiply(left, right), False
+            left = np.asarray(left).astype(np.int64)
+            right = np.asarray(right).astype(np.int64)
+            if op == DIV:
+                bad = right == 0
+                safe = np.where(bad, 1, right)
+                quotient = np.abs(left) // np.abs(safe)
+                result = np.where((left < 0) != (safe < 0), -quotient, quotient)
+            elif op == ADD:
+                result, bad = left + right, False
+            elif op == SUB:
+                result, bad = left - right, False
+            else:
+                result, bad = left * right, False
+            return (((result + 0x80000000) & 0xFFFFFFFF) - 0x80000000).astype(np.int32), bad
+        left = np.asarray(left, dtype=np.float64)
+        if op == DIV:
+            bad = np.equal(right, 0)
+            return left / np.where(bad, 1.0, right), bad
+        if op == ADD:
+            return left + right, False
+        if op == SUB:
+            return left - right, False
+        return left * right, False
+
+    # IN for the lanes of mask: lane j reads input column cursors[j]. Returns
+    # the values, which of them were true or false and the lanes past the
+    # last column.
+    def read_input(self, mask, cursors):
+        active = cursors if mask is None else cursors[mask]
+        first = int(active[0]) if len(active) else 0
+        if len(active) and (active == first).all():
+            if first >= len(self.inputs):
+                return None, None, True
+            return self.inputs[first], self.booleans[first], False
+        if not self.inputs:
+            return np.zeros(self.lanes), np.zeros(self.lanes, dtype=np.bool_), np.ones(self.lanes, dtype=np.bool_)
+        if self.stacked is None:
+            self.stacked = np.stack(self.inputs), np.stack(self.booleans)
+        missing = cursors >= len(self.inputs)
+        rows = np.where(missing, 0, cursors)
+        lanes = np.arange(self.lanes)
+        return self.stacked[0][rows, lanes], self.stacked[1][rows, lanes], missing
+
+    # OUT for the lanes of mask into each lane's next output column
+    def write_output(self, type_id, values, mask, cursors):
+        result = self.result
+        active = cursors if mask is None else cursors[mask]
+        dtype = self.dtypes[type_id]
+        values = np.broadcast_to(np.asarray(values), (self.lanes,))
+        lanes = np.ones(self.lanes, dtype=np.bool_) if mask is None else mask
+        for column in np.unique(active):
+            column = int(column)
+            while len(result.outputs) <= column:
+                result.outputs.append(np.zeros(self.lanes, dtype=dtype))
+                result.written.append(np.zeros(self.lanes, dtype=np.bool_))
+                result.types.append(np.full(self.lanes, type_id, dtype=np.int8))
+            target = lanes & (cursors == column)
+            if result.outputs[column].dtype != dtype:
+                result.outputs[column] = result.outputs[column].astype(np.float64)
+            result.outputs[column] = np.where(target, values, result.outputs[column]).astype(
+                result.outputs[column].dtype, copy=False)
+            result.written[column] = result.written[column] | target
+            result.types[column] = np.where(target, type_id, result.types[column]).astype(np.int8)
+        if mask is None:
+            cursors += 1
+        else:
+            cursors[mask] += 1
+
+    # Run every lane to the end of the program, or fail after max_steps
+    # instructions
+    def run(self, max_steps=None):
+        ir = self.ir
+        ops, types, dests, lefts, rights = ir.ops, ir.types, ir.dests, ir.lefts, ir.rights
+        end = len(ir)
+        result = self.result = BatchResult(self.lanes)
+        pcs = np.zeros(self.lanes, dtype=np.int64)
+        in_cursors = np.zeros(self.lanes, dtype=np.int64)
+        out_cursors = np.zeros(self.lanes, dtype=np.int64)
+        steps = 0
+        pc = 0
+        mask = None                  # None while every lane is at pc
+
+        with np.errstate(all='ignore'):
+            while True:
+                if mask is None:
+                    if pc >= end:
+                        break
+                else:
+                    # Lowest instruction an unfinished lane is at
+                    pc = int(pcs.min())
+                    if pc >= end:
+                        break
+                    mask = pcs == pc
+                    if mask.all():
+                        mask = None
+                if steps == max_steps:
+                    raise Exception(f"Stopped after {steps} instructions")
+                steps += 1
+
+                op = ops[pc]
+                next_pc = pc + 1
+                if op == LABEL:
+                    pass
+                elif op == GOTO:
+                    next_pc = self.targets[dests[pc]]
+                elif op == IF_FALSE or op == IF_TRUE:
+                    condition = np.asarray(self.read(lefts[pc])).astype(np.bool_)
+                    taken = ~condition if op == IF_FALSE else condition
+                    target = self.targets[dests[pc]]
+                    if np.ndim(taken) == 0:
+                        next_pc = target if taken else next_pc
+                    elif mask is None and (taken.all() or not taken.any()):
+                        next_pc = target if taken[0] else next_pc
+                    else:
+                        # Lanes go different ways
+                        lanes = np.ones(self.lanes, dtype=np.bool_) if mask is None else mask
+                        pcs[lanes & taken] = target
+                        pcs[lanes & ~taken] = next_pc
+                        mask = lanes
+                        continue
+                else:
+                    type_id = types[pc]
+                    bad = False
+                    if op == DECL or op == COPY:
+                        values, bad = self.convert(type_id, self.read(lefts[pc]))
+                    elif op == NOT:
+                        values = np.logical_not(self.read(lefts[pc]))
+                    elif op == IN:
+                        values, booleans, bad = self.read_input(mask, in_cursors)
+                        if values is not None:
+                            # Like the text input of the other backends, a
+                            # bool must be true or false, ints whole numbers
+                            # and neither number true or false
+                            if type_id == BOOL:
+                                wrong = ~booleans
+                            else:
+                                wrong = booleans | (type_id == INT and values != np.trunc(values))
+                            values, unconverted = self.convert(type_id, values)
+                            bad = bad | unconverted | wrong
+                        if mask is None:
+                            in_cursors += 1
+                        else:
+                            in_cursors[mask] += 1
+                    elif op == OUT:
+                        values, bad = self.convert(type_id, self.read(lefts[pc]))
+                    else:
+                        values, bad = self.binary(op, type_id, self.read(lefts[pc]), self.read(rights[pc]))
+
+                    if bad is not False and np.any(bad):
+                        failed = self.fail(bad, mask, pc, pcs)
+                        if mask is None:
+                            mask = ~failed
+                            pcs[mask] = pc
+                        else:
+                            mask = mask & ~failed
+                        if values is None or not mask.any():
+                            continue
+                    if op == OUT:
+                        self.write_output(type_id, values, mask, out_cursors)
+                    else:
+                        self.write(dests[pc], values, type_id, mask)
+
+                if mask is None:
+                    pc = next_pc
+                else:
+                    pcs[mask] = next_pc
+
+        result.steps = steps
+        result.variables = {variable_name(ir, operand): self.read(operand)
+                            for operand, kind in enumerate(ir.operand_kinds) if kind == VARIABLE}
+        return result
+
+# Run ir once over a batch: inputs holds one column per IN read, the k-th
+# IN a lane runs reads column k
+def run_batch(ir, inputs=(), lanes=None, max_steps=None, booleans=None):
+    return BatchVM(ir, inputs, lanes, booleans).run(max_steps)
+
+# Records of a text file, one per line, as input columns and the matching
+# booleans. Values are numbers, or true and false.
+def read_records(file):
+    records = [line.split() for line in file]
+    records = [words for words in records if words]
+    width = max((len(words) for words in records), default=0)
+    # Missing values make the lane fail at the IN that reads them
+    columns = np.full((width, len(records)), np.nan)
+    booleans = np.zeros((width, len(records)), dtype=np.bool_)
+    for lane, words in enumerate(records):
+        for index, word in enumerate(words):
+            word = word.lower()
+            if word == 'true' or word == 'false':
+                columns[index, lane] = word == 'true'
+                booleans[index, lane] = True
+            else:
+                columns[index, lane] = float(word)
+    return columns, booleans
+
+# Main execution
+if __name__ == "__main__":
+    from compiler import compile_source
+
+    parser = argparse.ArgumentParser(description="Run a JAL program over a batch of input records with NumPy")
+    parser.add_argument('file')
+    parser.add_argument('records', help="file with the IN values of one record per line")
+    parser.add_argument('--no-check', action='store_true', help="skip the semantico checks")
+    parser.add_argument('-O', dest='optimize', action='store_true', help="optimize the ETAC")
+    parser.add_argument('--max-steps', type=int, default=None, help="stop after this many instructions")
+    parser.add_argument('--bench', type=int, default=None, metavar='RUNS',
+                        help="run RUNS times without printing and report records/sec")
+    args = parser.parse_args()
+
+    result = compile_source(path=args.file, check=not args.no_check, optimize=args.optimize)
+    for phase, line, message in result.diagnostics:
+        location = f"{args.file}:{line}" if line is not None else args.file
+        print(f"{location}: {phase} error: {message}", file=sys.stderr)
+    if not result.success:
+        sys.exit(1)
+
+    try:
+        with open(args.records, 'r') as file:
+            columns, booleans = read_records(file)
+        if args.bench is not None:
+            best = None
+            for _ in range(max(1, args.bench)):
+                start = time.perf_counter()
+                batch = run_batch(result.ir, columns, columns.shape[1], args.max_steps, booleans)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{batch.lanes} records, {batch.steps} instruction steps in {best * 1000:.3f} ms: "
+                  f"{batch.lanes / best:.0f} records/sec", file=sys.stderr)
+        else:
+            batch = run_batch(result.ir, columns, columns.shape[1], args.max_steps, booleans)
+            for lane in range(batch.lanes):
+                if batch.errors[lane] >= 0:
+                    print(f"error: {render_instruction(result.ir, int(batch.errors[lane]))}")
+                else:
+                    print(' '.join(batch.lane_output(lane)))
+    except Exception as error:
+        print(f"Runtime error: {error}", file=sys.stderr)
+        sys.exit(1)
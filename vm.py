@@ -0,0 +1,337 @@
+import argparse
+import io
+import os
+import sys
+import time
+
+from etac_ir import (ADD, AND, COPY, DECL, DIV, EQUAL, GOTO, HIGH, IF_FALSE, IF_TRUE, IN, LABEL, LOW, MUL, NOT, OR,
+                     OUT, SUB, CONSTANT, TYPE_IDS, VARIABLE, constant_text, constant_value, convert,
+                     render_instruction, variable_name, wrap_i32)
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+INT, FLOAT, BOOL = TYPE_IDS['int'], TYPE_IDS['float'], TYPE_IDS['bool']
+
+# Whitespace separated words read from a text stream a buffer at a time
+class InputBuffer:
+    def __init__(self, stream, size=DEFAULT_BUFFER_SIZE):
+        self.stream = stream
+        self.size = size
+        self.words = []
+        self.position = 0
+        self.partial = ''            # Word that may go on in the next buffer
+
+    def word(self):
+        while self.position == len(self.words):
+            chunk = self.stream.read(self.size)
+            if not chunk:
+                if not self.partial:
+                    raise Exception("IN: no more input")
+                self.words = [self.partial]
+                self.partial = ''
+            else:
+                text = self.partial + chunk
+                self.words = text.split()
+                self.partial = self.words.pop() if self.words and not text[-1].isspace() else ''
+            self.position = 0
+        word = self.words[self.position]
+        self.position += 1
+        return word
+
+    # Next value of type type_id. Booleans are written true or false.
+    def read(self, type_id):
+        word = self.word()
+        try:
+            if type_id == BOOL:
+                if word.lower() not in ('true', 'false'):
+                    raise ValueError(word)
+                return word.lower() == 'true'
+            return wrap_i32(int(word)) if type_id == INT else float(word)
+        except ValueError:
+            raise Exception(f"IN: {word!r} is not a valid {['int', 'float', 'bool'][type_id]}")
+
+# One line per value, written to the stream once size characters are held
+class OutputBuffer:
+    def __init__(self, stream, size=DEFAULT_BUFFER_SIZE):
+        self.stream = stream
+        self.size = size
+        self.lines = []
+        self.held = 0
+
+    def write(self, text):
+        self.lines.append(text)
+        self.held += len(text) + 1
+        if self.held >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.stream.write('\n'.join(self.lines) + '\n')
+            self.lines = []
+            self.held = 0
+        self.stream.flush()
+
+def int_div(left, right):
+    quotient = abs(left) // abs(right)
+    return wrap_i32(quotient if (left < 0) == (right < 0) else -quotient)
+
+# Interpreter for an EtacIR. Storage is one cell per operand, constants are
+# stored once when the program is loaded and every write stores a value of
+# the instruction's type: a 32 bit int, a float or a bool. The
+# instructions are loaded, without their labels, into an array of
+# closures that each run one instruction and return the index of the next
+# one, so the dispatch loop is a single indexed call.
+class VM:
+    def __init__(self, ir, input=None, output=None, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.ir = ir
+        self.input = InputBuffer(input if input is not None else sys.stdin, buffer_size)
+        self.output = OutputBuffer(output if output is not None else sys.stdout, buffer_size)
+        self.memory = [0] * len(ir.operand_kinds)
+        for operand, kind in enumerate(ir.operand_kinds):
+            if kind == CONSTANT:
+                try:
+                    self.memory[operand] = constant_value(ir.operand_values[operand])
+                except ValueError:
+                    raise Exception(f"Malformed constant '{ir.operand_values[operand]}'")
+        self.initial = list(self.memory)
+        self.code, self.origins = self.load()
+        self.steps = 0
+
+    # Back to the state before the first instruction
+    def reset(self):
+        self.memory[:] = self.initial
+        self.steps = 0
+
+    # Instruction closures and the IR index each one came from
+    def load(self):
+        ir = self.ir
+        targets = {}
+        count = 0
+        for index in range(len(ir)):
+            if ir.ops[index] == LABEL:
+                targets[ir.dests[index]] = count
+            else:
+                count += 1
+
+        code = []
+        origins = []
+        for index in range(len(ir)):
+            if ir.ops[index] != LABEL:
+                code.append(self.compile_instruction(index, len(code) + 1, targets))
+                origins.append(index)
+        return code, origins
+
+    def compile_instruction(self, index, next_pc, targets):
+        ir = self.ir
+        m = self.memory
+        op, type_id = ir.ops[index], ir.types[index]
+        d, a, b = ir.dests[index], ir.lefts[index], ir.rights[index]
+
+        if op == GOTO:
+            target = targets[d]
+            return lambda: target
+        if op == IF_FALSE:
+            target = targets[d]
+            return lambda: next_pc if m[a] else target
+        if op == IF_TRUE:
+            target = targets[d]
+            return lambda: target if m[a] else next_pc
+
+        if op == DECL or op == COPY:
+            if ir.operand_kinds[a] == CONSTANT:
+                value = convert(type_id, m[a])
+
+                def store():
+                    m[d] = value
+                    return next_pc
+            elif type_id == INT:
+                def store():
+                    value = m[a]
+                    m[d] = value if type(value) is int else wrap_i32(int(value))
+                    return next_pc
+            elif type_id == FLOAT:
+                def store():
+                    m[d] = float(m[a])
+                    return next_pc
+            else:
+                def store():
+                    m[d] = bool(m[a])
+                    return next_pc
+            return store
+
+        if op == IN:
+            def read_value():
+                m[d] = self.input.read(type_id)
+                return next_pc
+            return read_value
+        if op == OUT:
+            write = self.output.write
+
+            def write_value():
+                write(constant_text(convert(type_id, m[a])))
+                return next_pc
+            return write_value
+
+        if type_id == INT and op in (ADD, SUB, MUL):
+            if op == ADD:
+                def run():
+                    m[d] = ((m[a] + m[b] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+                    return next_pc
+            elif op == SUB:
+                def run():
+                    m[d] = ((m[a] - m[b] + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+                    return next_pc
+            else:
+                def run():
+                    m[d] = ((int(m[a]) * int(m[b]) + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+                    return next_pc
+            return run
+        if op == DIV:
+            if type_id == INT:
+                def run():
+                    m[d] = int_div(int(m[a]), int(m[b]))
+                    return next_pc
+            else:
+                def run():
+                    m[d] = float(m[a]) / m[b]
+                    return next_pc
+            return run
+        if op == ADD:
+            def run():
+                m[d] = float(m[a]) + m[b]
+                return next_pc
+        elif op == SUB:
+            def run():
+                m[d] = float(m[a]) - m[b]
+                return next_pc
+        elif op == MUL:
+            def run():
+                m[d] = float(m[a]) * m[b]
+                return next_pc
+        elif op == LOW:
+            def run():
+                m[d] = m[a] < m[b]
+                return next_pc
+        elif op == HIGH:
+            def run():
+                m[d] = m[a] > m[b]
+                return next_pc
+        elif op == EQUAL:
+            def run():
+                m[d] = m[a] == m[b]
+                return next_pc
+        elif op == AND:
+            def run():
+                m[d] = bool(m[a] and m[b])
+                return next_pc
+        elif op == OR:
+            def run():
+                m[d] = bool(m[a] or m[b])
+                return next_pc
+        elif op == NOT:
+            def run():
+                m[d] = not m[a]
+                return next_pc
+        else:
+            raise Exception(f"Cannot run {render_instruction(ir, index)}")
+        return run
+
+    # Run the program to its end. Counting executed instructions, or
+    # stopping after max_steps of them, takes a slower loop. Errors are
+    # raised with the instruction that failed.
+    def run(self, max_steps=None, count=False):
+        code = self.code
+        end = len(code)
+        pc = 0
+        try:
+            if max_steps is None and not count:
+                while pc < end:
+                    pc = code[pc]()
+            else:
+                limit = max_steps if max_steps is not None else -1
+                steps = 0
+                while pc < end:
+                    if steps == limit:
+                        raise Exception(f"Stopped after {steps} instructions")
+                    pc = code[pc]()
+                    steps += 1
+                self.steps = steps
+        except ZeroDivisionError:
+            raise Exception(f"Division by zero in '{self.instruction(pc)}'")
+        except (OverflowError, ValueError):
+            raise Exception(f"Cannot convert to int in '{self.instruction(pc)}'")
+        finally:
+            self.output.flush()
+
+    def instruction(self, pc):
+        return render_instruction(self.ir, self.origins[pc])
+
+    # Final value of every variable, by name
+    def variables(self):
+        ir = self.ir
+        return {variable_name(ir, operand): self.memory[operand]
+                for operand, kind in enumerate(ir.operand_kinds) if kind == VARIABLE}
+
+# Run the program n times on the same input with output discarded, returns
+# (instructions per run, best seconds per run)
+def benchmark(ir, input_text='', runs=5):
+    best = None
+    with open(os.devnull, 'w') as devnull:
+        vm = VM(ir, io.StringIO(input_text), devnull)
+        for _ in range(runs):
+            vm.reset()
+            vm.input = InputBuffer(io.StringIO(input_text))
+            start = time.perf_counter()
+            vm.run(count=True)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return vm.steps, best
+
+# Main execution
+if __name__ == "__main__":
+    from compiler import compile_source
+
+    parser = argparse.ArgumentParser(description="Compile a JAL program and run its ETAC")
+    parser.add_argument('file')
+    parser.add_argument('--no-check', action='store_true', help="skip the semantico checks")
+    parser.add_argument('-O', dest='optimize', action='store_true', help="optimize the ETAC")
+    parser.add_argument('--registers', type=int, default=None, metavar='K',
+                        help="allocate the temporaries to K registers")
+    parser.add_argument('--input', default=None, help="read IN values from this file (default: stdin)")
+    parser.add_argument('--output', default=None, help="write OUT values to this file (default: stdout)")
+    parser.add_argument('--max-steps', type=int, default=None, help="stop after this many instructions")
+    parser.add_argument('--bench', type=int, default=None, metavar='RUNS',
+                        help="run RUNS times with output discarded and report instructions/sec")
+    args = parser.parse_args()
+
+    result = compile_source(path=args.file, check=not args.no_check, optimize=args.optimize,
+                            registers=args.registers)
+    for phase, line, message in result.diagnostics:
+        location = f"{args.file}:{line}" if line is not None else args.file
+        print(f"{location}: {phase} error: {message}", file=sys.stderr)
+    if not result.success:
+        sys.exit(1)
+
+    try:
+        if args.bench is not None:
+            if args.input is not None:
+                with open(args.input, 'r') as file:
+                    input_text = file.read()
+            else:
+                input_text = '' if sys.stdin.isatty() else sys.stdin.read()
+            steps, seconds = benchmark(result.ir, input_text, max(1, args.bench))
+            rate = steps / seconds if seconds else float('inf')
+            print(f"{len(result.ir)} instructions, {steps} executed in {seconds * 1000:.3f} ms: "
+                  f"{rate / 1e6:.2f} M instructions/sec", file=sys.stderr)
+        else:
+            input_file = open(args.input, 'r') if args.input is not None else None
+            output_file = open(args.output, 'w') if args.output is not None else None
+            try:
+                VM(result.ir, input_file, output_file).run(args.max_steps)
+            finally:
+                for file in (input_file, output_file):
+                    if file is not None:
+                        file.close()
+    except Exception as error:
+        print(f"Runtime error: {error}", file=sys.stderr)
+        sys.exit(1)